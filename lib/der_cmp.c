@@ -40,7 +40,7 @@ int der_cmp(dercursor c1, dercursor c2)
 
 	while (shortest_len--)
 	{
-		uint8_t d = *(c2.derptr++) - *(c1.derptr++);
+		int d = (int) *(c1.derptr++) - (int) *(c2.derptr++);
 		if (d)
 		{
 			return d;
@@ -14,7 +14,8 @@
  * caller should check this condition.  It is an error if the crs->derlen
  * spans less than the DER header, so *lenp.
  *
- * For BIT STRINGS, this routine validates that remainder bits are cleared.
+ * For BIT STRINGS, this routine validates that remainder bits are cleared,
+ * provided that crs->derlen spans the contents.
  * Note that this is a difference between BER and DER; DER requires that
  * the bits are 0 whereas BER welcomes arbitrary values.  In the interest
  * of security (bit buffer overflows) and reproducability of signatures on
@@ -84,10 +85,19 @@ int der_header (dercursor *crs, uint8_t *tagp, size_t *lenp, uint8_t *hlenp) {
 	}
 #endif
 	// Special treatment for BIT STRING (one additional header byte)
-	if (tag == DER_TAG_BITSTRING) {
+	// when its contents are available, as they are not for stream framing
+	if ((tag == DER_TAG_BITSTRING) && (len <= crs->derlen)) {
+		if (len == 0) {
+			errno = EBADMSG;
+			return -1;
+		}
 		rembits = *crs->derptr;
+		if (rembits > 7) {
+			errno = EBADMSG;
+			return -1;
+		}
 		rembyte = crs->derptr [len-1] & (0xff >> (8 - rembits));
-		if ((len == 0) || (*crs->derptr > 7) || (rembyte != 0x00)) {
+		if (rembyte != 0x00) {
 			errno = EBADMSG;
 			return -1;
 		}
@@ -33,6 +33,7 @@ int der_walk (dercursor *crs, const derwalk *path) {
 	uint8_t hlen;
 	uint8_t tag;
 	dercursor intcrs = *crs;
+	dercursor precrs;
 	int retval;
 	int optional = 0;
 	int choice = 0;
@@ -69,6 +70,7 @@ int der_walk (dercursor *crs, const derwalk *path) {
 			errno = EBADMSG;
 			return -1;
 		}
+		precrs = intcrs;
 		if (der_header (&intcrs, &tag, &len, &hlen)) {
 			return -1;
 		}
@@ -108,17 +110,18 @@ int der_walk (dercursor *crs, const derwalk *path) {
 			// and so this applies in that case too.
 			path++;
 		} else if (optional) {
-			// not matched the optional part: skip the data
-			// and try the path element after the optional
-			intcrs.derptr += len;
-			intcrs.derlen -= len;
-			// if the optional part was a choice, then we
-			// are already at the next part and we are
-			// now skipping the choice, for which we
-			// already advanced path.  if the optional
-			// part was not a choice, then path is at the
-			// optional part, and we do need to skip that
-			if (!choice) {
+			// not matched the optional part.  if the optional
+			// part was a choice, then we are already at the
+			// next part and the data is the choice, which we
+			// skip.  if the optional part was not a choice,
+			// then it is absent; the data belongs to the
+			// path element after the optional, so we leave
+			// it in place and only skip the optional part
+			if (choice) {
+				intcrs.derptr += len;
+				intcrs.derlen -= len;
+			} else {
+				intcrs = precrs;
 				path++;
 			}
 		} else {
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+#
+# Converting the serial numbers and revocation dates of CRL entries.
+#
+# Lazy objects build an object for each entry and each of its fields.
+# DERColumns unpacks all entries in one call to unpack_batch() and then
+# converts a column in one call to der_column().  Run as
+#
+#     python bench_columns.py [numentries...]
+#
+# and compare the timings per entry.
+
+import sys
+import time
+
+import _quickder
+
+from quick_der import api
+from quick_der.packstx import *
+
+
+# Entry ::= SEQUENCE { serial INTEGER, date UTCTime }
+entry_packer = bytes(bytearray([
+    DER_PACK_ENTER | DER_TAG_SEQUENCE,
+    DER_PACK_STORE | DER_TAG_INTEGER,
+    DER_PACK_STORE | DER_TAG_UTCTIME,
+    DER_PACK_LEAVE,
+    DER_PACK_END]))
+
+
+# Entries ::= SEQUENCE { name OCTET STRING, entries SEQUENCE OF Entry }
+class Entries(api.ASN1ConstructedType):
+    __slots__ = ()
+    _der_packer = bytes(bytearray([
+        DER_PACK_ENTER | DER_TAG_SEQUENCE,
+        DER_PACK_STORE | DER_TAG_OCTETSTRING,
+        DER_PACK_STORE | DER_TAG_SEQUENCE,
+        DER_PACK_LEAVE,
+        DER_PACK_END]))
+    _recipe = ('_NAMED', {
+        'name': 0,
+        'entries': ('_SEQOF', 1, entry_packer, 2, ('_NAMED', {'serial': 0, 'date': 1}))})
+    _context = {'_api': api}
+    _numcursori = 2
+
+
+def record(numentries):
+    entries = b''.join([_quickder.der_pack(entry_packer, [bytes(bytearray([n & 0x7f])), b'250101000000Z'])
+                        for n in range(numentries)])
+    return _quickder.der_pack(Entries._der_packer, [b'entries', entries])
+
+
+def with_objects(derblob):
+    rec = Entries(derblob=derblob, lazy=True)
+    return [(api.der_parse_INTEGER(entry.serial), api.der_epoch_UTCTIME(entry.date)) for entry in rec.entries]
+
+
+def with_columns(derblob):
+    (entries,) = api.der_project(Entries, ['entries'], derblob)
+    cols = api.DERColumns(Entries, entries, 'entries')
+    return (cols.integers('serial'), cols.epochs('date'))
+
+
+def timed(name, numentries, fun, repeat=100):
+    start = time.time()
+    for _ in range(repeat):
+        fun()
+    print('%-12s %6d entries %10.3f us/entry' % (name, numentries, (time.time() - start) * 1e6 / repeat / numentries))
+
+
+def main(sizes):
+    for numentries in sizes:
+        derblob = record(numentries)
+        timed('objects', numentries, lambda: with_objects(derblob))
+        timed('columns', numentries, lambda: with_columns(derblob))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10, 100, 10000])
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#
+# Packing nested SEQUENCE OF structures.
+#
+# With der_pack(), the contents of every SEQUENCE OF are packed on their
+# own and then copied into the enclosing level, so each byte is copied
+# once per level of nesting.  der_encode() takes the whole tree of values
+# and writes each byte once.  Run as
+#
+#     python bench_encode.py [depth...]
+#
+# and compare how the timings grow with the depth.
+
+import sys
+import time
+
+import _quickder
+
+from quick_der.packstx import *
+
+
+# Each level is a SEQUENCE OF two elements of the level below it
+SEQOF = bytes(bytearray([DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END]))
+LEAF = bytes(bytearray([DER_PACK_STORE | DER_TAG_OCTETSTRING, DER_PACK_END]))
+LEAFSIZE = 64 * 1024
+
+
+def tree(depth):
+    """Return the values for der_encode() of a structure of the given depth."""
+    if depth == 0:
+        return (LEAF, [b'x' * LEAFSIZE])
+    sub = tree(depth - 1)
+    return (SEQOF, [[sub, sub]])
+
+
+def pack_per_level(node):
+    """Pack like the classes did before, one level at a time."""
+    (pck, [value]) = node
+    if type(value) == list:
+        value = b''.join([pack_per_level(sub) for sub in value])
+    return _quickder.der_pack(pck, [value])
+
+
+def timed(name, depth, fun, repeat=10):
+    start = time.time()
+    for _ in range(repeat):
+        fun()
+    print('%-16s depth %2d %10.2f ms' % (name, depth, (time.time() - start) * 1e3 / repeat))
+
+
+def main(depths):
+    for depth in depths:
+        node = tree(depth)
+        (pck, values) = node
+        assert _quickder.der_encode(pck, values) == pack_per_level(node)
+        timed('der_pack', depth, lambda: pack_per_level(node))
+        timed('der_encode', depth, lambda: _quickder.der_encode(pck, values))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [2, 4, 6, 8])
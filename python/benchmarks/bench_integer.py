@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+#
+# Parsing and formatting INTEGER and BIT STRING contents of RSA size.
+#
+# The loops that primitive.py used to run shift the value by one byte at
+# a time, which takes quadratic time in the number of bytes.  The codecs
+# now convert in a single native call.  Run as
+#
+#     python bench_integer.py [bits...]
+#
+# and compare the timings as the number of bits grows.
+
+import random
+import sys
+import time
+
+from quick_der import primitive
+
+
+def loop_parse_INTEGER(derblob):
+    retval = 0
+    derblob = bytearray(derblob)
+    if derblob[0] & 0x80:
+        retval = -1
+    for byt in derblob:
+        retval = (retval << 8) + byt
+    return retval
+
+
+def loop_format_INTEGER(ival):
+    retval = bytearray()
+    byt = ival & 0xff
+    while ival not in [0, -1]:
+        byt = ival & 0xff
+        ival = ival >> 8
+        retval.append(byt)
+    if ival == 0:
+        if len(retval) > 0 and byt & 0x80 == 0x80:
+            retval.append(0x00)
+    else:
+        if len(retval) == 0 or byt & 0x80 == 0x00:
+            retval.append(0xff)
+    retval.reverse()
+    return bytes(retval)
+
+
+def timed(name, bits, fun, values, repeat=100):
+    start = time.time()
+    for _ in range(repeat):
+        for value in values:
+            fun(value)
+    usec = (time.time() - start) * 1e6 / (repeat * len(values))
+    print('%-26s %6d bits %10.2f us' % (name, bits, usec))
+
+
+def main(sizes):
+    for bits in sizes:
+        # Moduli have their top bit set, like those of RSA keys
+        moduli = [random.getrandbits(bits) | (1 << (bits - 1)) | 1 for _ in range(100)]
+        blobs = [primitive.der_format_INTEGER(n) for n in moduli]
+        keybits = [primitive.der_format_BITSTRING(n) for n in moduli]
+        assert [primitive.der_parse_INTEGER(blob) for blob in blobs] == moduli
+        assert [loop_format_INTEGER(n) for n in moduli] == blobs
+        timed('loop der_parse_INTEGER', bits, loop_parse_INTEGER, blobs)
+        timed('der_parse_INTEGER', bits, primitive.der_parse_INTEGER, blobs)
+        timed('loop der_format_INTEGER', bits, loop_format_INTEGER, moduli)
+        timed('der_format_INTEGER', bits, primitive.der_format_INTEGER, moduli)
+        timed('der_parse_BITSTRING', bits, primitive.der_parse_BITSTRING, keybits)
+        timed('der_format_BITSTRING', bits, primitive.der_format_BITSTRING, moduli)
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1024, 2048, 4096])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# Decoding a large file of certificates in worker processes.
+#
+# der_load_parallel() splits the file into shards and has a pool of
+# processes decode them, returning only the serial number, subject,
+# issuer and notAfter time of each certificate.  Run as
+#
+#     python bench_parallel.py certificate.der [numcerts]
+#
+# which writes numcerts copies of the certificate to a temporary file,
+# default 1000000, and compares the rate of a single process with that
+# of pools of 1, 2, 4 and so on workers, up to the number of cores.
+#
+# The rate is meant to grow with the number of workers, but that claim
+# has NOT been tested: this benchmark has only run on a single core,
+# where the one row of workers is all it can show.  With 20000 copies
+# of test/verisign.der, one worker reached 9748 certificates per second
+# against 9974 in a single process; the difference is the pickling of
+# the results.
+
+import os
+import sys
+import tempfile
+import time
+
+from multiprocessing import cpu_count
+
+from quick_der.loader import der_load
+from quick_der.parallel import _compact, der_load_parallel
+
+try:
+    from quick_der.rfc5280 import Certificate
+except ImportError:
+    # Modules generated outside of the package
+    from rfc5280 import Certificate
+
+
+def projection(crt):
+    tbs = crt.tbsCertificate
+    notafter = tbs.validity.notAfter
+    return (tbs.serialNumber, tbs.subject, tbs.issuer, notafter.utcTime or notafter.generalTime)
+
+
+def timed(name, numcerts, fun):
+    start = time.time()
+    count = sum(1 for _ in fun())
+    elapsed = time.time() - start
+    assert count == numcerts
+    print('%-12s %10.0f certs/s %8.2f s' % (name, numcerts / elapsed, elapsed))
+    return elapsed
+
+
+def main(certfile, numcerts):
+    with open(certfile, 'rb') as fileobj:
+        derblob = fileobj.read()
+    (fd, corpus) = tempfile.mkstemp(suffix='.der')
+    try:
+        with os.fdopen(fd, 'wb') as fileobj:
+            for _ in range(numcerts):
+                fileobj.write(derblob)
+        single = timed('serial', numcerts,
+                       lambda: (_compact(projection(crt)) for crt in der_load(Certificate, corpus, lazy=True)))
+        if cpu_count() == 1:
+            print('Only one core is available, so scaling cannot be measured')
+        workers = 1
+        while workers <= cpu_count():
+            elapsed = timed('%d workers' % workers, numcerts,
+                            lambda: der_load_parallel(Certificate, corpus, projection, workers=workers))
+            print('%-12s %10.2f x' % ('speedup', single / elapsed))
+            workers *= 2
+    finally:
+        os.remove(corpus)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1000000)
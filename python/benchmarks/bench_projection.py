@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+#
+# Picking a few fields from records with a SEQUENCE OF.
+#
+# Building lazy objects and reading the fields creates a Python object
+# for every structure on the way to them.  A projection compiles the
+# paths to cursor indexes once, and then takes the values from a single
+# der_unpack(), plus one unpack_each() for the SEQUENCE OF.  Run as
+#
+#     python bench_projection.py [numentries...]
+#
+# and compare the timings per record.
+
+import sys
+import time
+
+import _quickder
+
+from quick_der import api
+from quick_der.packstx import *
+
+
+# Entry ::= SEQUENCE { serial INTEGER, date UTCTime }
+entry_packer = bytes(bytearray([
+    DER_PACK_ENTER | DER_TAG_SEQUENCE,
+    DER_PACK_STORE | DER_TAG_INTEGER,
+    DER_PACK_STORE | DER_TAG_UTCTIME,
+    DER_PACK_LEAVE,
+    DER_PACK_END]))
+
+
+# Entries ::= SEQUENCE { name OCTET STRING, entries SEQUENCE OF Entry }
+class Entries(api.ASN1ConstructedType):
+    __slots__ = ()
+    _der_packer = bytes(bytearray([
+        DER_PACK_ENTER | DER_TAG_SEQUENCE,
+        DER_PACK_STORE | DER_TAG_OCTETSTRING,
+        DER_PACK_STORE | DER_TAG_SEQUENCE,
+        DER_PACK_LEAVE,
+        DER_PACK_END]))
+    _recipe = ('_NAMED', {
+        'name': 0,
+        'entries': ('_SEQOF', 1, entry_packer, 2, ('_NAMED', {'serial': 0, 'date': 1}))})
+    _context = {'_api': api}
+    _numcursori = 2
+
+
+def record(numentries):
+    entries = b''.join([_quickder.der_pack(entry_packer, [bytes(bytearray([n & 0x7f])), b'250101000000Z'])
+                        for n in range(numentries)])
+    return _quickder.der_pack(Entries._der_packer, [b'entries', entries])
+
+
+def with_objects(derblob):
+    rec = Entries(derblob=derblob, lazy=True)
+    return (rec.name, [(entry.serial, entry.date) for entry in rec.entries])
+
+
+def timed(name, numentries, fun, repeat=1000):
+    start = time.time()
+    for _ in range(repeat):
+        fun()
+    print('%-12s %6d entries %10.2f us' % (name, numentries, (time.time() - start) * 1e6 / repeat))
+
+
+def main(sizes):
+    projection = api.der_compile_projection(Entries, ['name', 'entries.serial', 'entries.date'])
+    for numentries in sizes:
+        derblob = record(numentries)
+        timed('objects', numentries, lambda: with_objects(derblob))
+        timed('projection', numentries, lambda: projection(derblob))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1, 10, 100])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+#
+# Splitting the contents of a large SEQUENCE OF into its elements.
+#
+# The loop that classes.py used to run slices the remaining input after
+# every element, which copies it over and over and takes quadratic time.
+# Packer.unpack_each() splits and unpacks all elements in a single call.
+# Run as
+#
+#     python bench_seqof.py [numelements...]
+#
+# and compare the timings as the number of elements grows.
+
+import sys
+import time
+
+import _quickder
+
+from quick_der.packstx import *
+
+
+# A revokedCertificates entry: SEQUENCE { INTEGER, UTCTime }
+packer = bytes(bytearray([
+    DER_PACK_ENTER | DER_TAG_SEQUENCE,
+    DER_PACK_STORE | DER_TAG_INTEGER,
+    DER_PACK_STORE | DER_TAG_UTCTIME,
+    DER_PACK_LEAVE,
+    DER_PACK_END]))
+compiled = _quickder.Packer(packer)
+
+
+def python_split(derblob):
+    retval = []
+    while len(derblob) > 0:
+        (tag, ilen, hlen) = _quickder.der_header(derblob)
+        retval.append(_quickder.der_unpack(packer, derblob[:hlen + ilen], 2))
+        derblob = derblob[hlen + ilen:]
+    return retval
+
+
+def native_split(derblob):
+    return compiled.unpack_each(derblob)
+
+
+def main(counts):
+    for count in counts:
+        derblob = b''.join([compiled.pack([bytes(bytearray([0x01, n >> 16 & 0xff, n >> 8 & 0xff, n & 0xff])),
+                                           b'200207235959Z']) for n in range(count)])
+        for (name, split) in [('python', python_split), ('unpack_each', native_split)]:
+            start = time.time()
+            assert len(split(derblob)) == count
+            print('%-12s %8d elements %8.3f s' % (name, count, time.time() - start))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 50000, 100000])
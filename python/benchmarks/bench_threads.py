@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+# Threaded throughput of _quickder.der_pack() and der_unpack().
+#
+# Certificates are processed without holding the GIL, so the number of
+# operations per second should grow with the number of threads, up to
+# the number of cores.  Run as
+#
+#     python bench_threads.py certificate.der [seconds-per-run]
+#
+# The first rows show the cost of a single call when the GIL is always
+# released and when it is never released, which is the price of the
+# threshold set with _quickder.der_nogil_minsize().  The other rows
+# compare the ops/s between thread counts at the default threshold.  On
+# a single core machine, all of these show about the same throughput.
+
+import sys
+import threading
+import time
+import timeit
+
+from multiprocessing import cpu_count
+
+import _quickder
+
+try:
+    from quick_der.rfc5280 import Certificate
+except ImportError:
+    # Modules generated outside of the package
+    from rfc5280 import Certificate
+
+
+def operations(derblob):
+    packer = Certificate._der_packer
+    numcursori = Certificate._numcursori
+    values = _quickder.der_unpack(packer, derblob, numcursori)
+
+    def pack_once():
+        _quickder.der_pack(packer, values)
+
+    def unpack_once():
+        _quickder.der_unpack(packer, derblob, numcursori, _quickder.UNPACK_VIEW)
+
+    return [('der_pack', pack_once), ('der_unpack', unpack_once)]
+
+
+def single(operation, minsize, number=20000):
+    """Return the time of one call in microseconds, with the GIL
+       released from minsize bytes.
+    """
+    saved = _quickder.der_nogil_minsize(minsize)
+    try:
+        return min(timeit.repeat(operation, number=number, repeat=5)) * 1e6 / number
+    finally:
+        _quickder.der_nogil_minsize(saved)
+
+
+def run(operation, numthreads, duration):
+    """Run the operation from numthreads threads during the given
+       duration and return the total number of operations per second.
+    """
+    counts = [0] * numthreads
+    stop = [False]
+
+    def worker(idx):
+        while not stop[0]:
+            operation()
+            counts[idx] += 1
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(numthreads)]
+    start = time.time()
+    for thr in threads:
+        thr.start()
+    time.sleep(duration)
+    stop[0] = True
+    for thr in threads:
+        thr.join()
+    return sum(counts) / (time.time() - start)
+
+
+def main(certfile, duration):
+    with open(certfile, 'rb') as fileobj:
+        derblob = fileobj.read()
+    print('Certificate of %d bytes, %d cores, GIL released from %d bytes' % (
+        len(derblob), cpu_count(), _quickder.der_nogil_minsize()))
+    for (name, operation) in operations(derblob):
+        print('%-10s %10.2f us with GIL %10.2f us without' % (
+            name, single(operation, sys.maxsize), single(operation, 0)))
+    threadcounts = sorted(set([1, 2, 4, cpu_count()]))
+    for (name, operation) in operations(derblob):
+        base = None
+        for numthreads in threadcounts:
+            ops = run(operation, numthreads, duration)
+            base = base or ops
+            print('%-10s %3d threads %10.1f ops/s  %5.2fx' % (name, numthreads, ops, ops / base))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 2.0)
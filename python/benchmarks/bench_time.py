@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+#
+# Parsing UTCTime and GeneralizedTime contents, as in certificate validity
+# checks and scans over the revocationDate of every entry in a CRL.
+#
+# The parsers used to match a format with time.strptime(); they now pick
+# the fields from their fixed positions, and der_epochs_UTCTIME() converts
+# a whole column in one call into the C extension.  Run as
+#
+#     python bench_time.py [count]
+#
+# and compare the time per value of each row.
+
+import random
+import sys
+import time
+
+from quick_der import primitive
+
+
+def strptime_UTCTIME(derblob):
+    return time.strptime(derblob.decode('ascii'), '%y%m%d%H%M%SZ')
+
+
+def timed(name, fun, column, percolumn=False):
+    start = time.time()
+    if percolumn:
+        fun(column)
+    else:
+        for value in column:
+            fun(value)
+    usec = (time.time() - start) * 1e6 / len(column)
+    print('%-26s %10.3f us' % (name, usec))
+
+
+def main(count):
+    epochs = [random.randint(0, 2524607999) for _ in range(count)]
+    column = [time.strftime('%y%m%d%H%M%SZ', time.gmtime(epoch)).encode('ascii') for epoch in epochs]
+    assert list(primitive.der_epochs_UTCTIME(column)) == epochs
+    print('%d UTCTime values' % count)
+    timed('time.strptime', strptime_UTCTIME, column)
+    timed('der_parse_UTCTIME', primitive.der_parse_UTCTIME, column)
+    timed('der_epoch_UTCTIME', primitive.der_epoch_UTCTIME, column)
+    timed('der_datetime_UTCTIME', primitive.der_datetime_UTCTIME, column)
+    timed('der_epochs_UTCTIME', primitive.der_epochs_UTCTIME, column, percolumn=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,234 @@
+# aio.py -- Exchange DER messages over asyncio connections
+#
+# Protocols such as LDAP and Kerberos send DER messages of one generated
+# class back to back over a connection.  DERProtocol is an asyncio.Protocol
+# base class that frames the incoming data with a DERFramer, decodes each
+# message into the generated class and passes it to message_received().
+# DERStream does the same on top of an asyncio StreamReader and
+# StreamWriter pair.  Replies are packed with _der_pack() and written
+# with the flow control of asyncio.
+#
+# Large messages may be decoded by an executor, off the event loop; they
+# are still delivered in the order in which they arrived.  This module
+# needs Python 3, so it is not included in quick_der.api.
+
+
+import asyncio
+import collections
+import functools
+
+from quick_der.stream import DERFramer
+
+
+# Messages of this size and up are decoded off the event loop, if an
+# executor is given
+der_offload_size = 64 * 1024
+
+
+def _decode(cls, derblob):
+    return cls(derblob=derblob)
+
+
+def _encode(msg):
+    if isinstance(msg, (bytes, bytearray, memoryview)):
+        return msg
+    return msg._der_pack()
+
+
+class DERProtocol(asyncio.Protocol):
+    """Base class for asyncio protocols that receive DER messages of the
+       generated class cls.  Subclasses implement message_received(),
+       which is called with each decoded message in the order of arrival,
+       and reply with send().
+
+       Incoming messages larger than maxsize bytes are refused, see
+       DERFramer.  When an executor is given, messages of offload_size
+       bytes and up are decoded by it.  At most max_backlog messages wait
+       for their decoding to finish, or for an earlier one to finish;
+       reading from the transport is paused while the backlog is full.
+       Framing and decoding errors are passed to der_error(), which
+       closes the connection by default.
+    """
+
+    cls = None
+
+    def __init__(self, cls=None, maxsize=None, executor=None, offload_size=None, max_backlog=64):
+        if cls is not None:
+            self.cls = cls
+        self.executor = executor
+        self.offload_size = der_offload_size if offload_size is None else offload_size
+        self.max_backlog = max_backlog
+        self.transport = None
+        self._framer = DERFramer(maxsize)
+        self._backlog = collections.deque()
+        self._reading_paused = False
+        self._writing_paused = False
+        self._drain_waiters = []
+        self._closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self._closed = True
+        self._wake_drain_waiters(exc)
+
+    def data_received(self, data):
+        if self._closed:
+            return
+        try:
+            derblobs = self._framer.feed(data)
+        except ValueError as exc:
+            self.der_error(exc)
+            return
+        for derblob in derblobs:
+            if self._backlog or (self.executor is not None and len(derblob) >= self.offload_size):
+                self._queue(derblob)
+            else:
+                self._deliver(functools.partial(_decode, self.cls, derblob))
+
+    def eof_received(self):
+        try:
+            self._framer.close()
+        except ValueError as exc:
+            self.der_error(exc)
+
+    def _queue(self, derblob):
+        """Decode a message in the order of the backlog."""
+        loop = asyncio.get_event_loop()
+        if self.executor is not None and len(derblob) >= self.offload_size:
+            fut = loop.run_in_executor(self.executor, _decode, self.cls, derblob)
+        else:
+            fut = loop.create_future()
+            try:
+                fut.set_result(_decode(self.cls, derblob))
+            except Exception as exc:
+                fut.set_exception(exc)
+        self._backlog.append(fut)
+        fut.add_done_callback(self._flush_backlog)
+        if len(self._backlog) >= self.max_backlog and not self._reading_paused:
+            self._reading_paused = True
+            self.transport.pause_reading()
+
+    def _flush_backlog(self, fut=None):
+        """Deliver the messages at the front of the backlog that are done."""
+        while self._backlog and self._backlog[0].done():
+            fut = self._backlog.popleft()
+            self._deliver(fut.result)
+        if self._reading_paused and len(self._backlog) < self.max_backlog and not self._closed:
+            self._reading_paused = False
+            self.transport.resume_reading()
+
+    def _deliver(self, decode):
+        if self._closed:
+            return
+        try:
+            msg = decode()
+        except Exception as exc:
+            self.der_error(exc)
+            return
+        self.message_received(msg)
+
+    def message_received(self, msg):
+        """Handle an incoming message, an instance of cls."""
+        raise NotImplementedError('DERProtocol subclasses must implement message_received()')
+
+    def der_error(self, exc):
+        """Handle a message that could not be framed or decoded.  The
+           stream cannot continue after such an error, so the default is
+           to close the transport.
+        """
+        self._closed = True
+        if self.transport is not None:
+            self.transport.close()
+
+    def send(self, msg):
+        """Send a message, which is an ASN1Object or DER bytes.  Use drain()
+           to wait while the transport buffers too much outgoing data.
+        """
+        self.transport.write(_encode(msg))
+
+    def pause_writing(self):
+        self._writing_paused = True
+
+    def resume_writing(self):
+        self._writing_paused = False
+        self._wake_drain_waiters(None)
+
+    def _wake_drain_waiters(self, exc):
+        waiters = self._drain_waiters
+        self._drain_waiters = []
+        for waiter in waiters:
+            if not waiter.done():
+                if exc is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(exc)
+
+    async def drain(self):
+        """Wait until the transport accepts more outgoing data."""
+        if self._closed:
+            raise ConnectionResetError('Connection lost')
+        if not self._writing_paused:
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._drain_waiters.append(waiter)
+        await waiter
+
+
+class DERStream(object):
+    """Exchange DER messages of the generated class cls over an asyncio
+       StreamReader and StreamWriter, such as those that open_connection()
+       returns.  Iterate over it with `async for` to receive the messages,
+       or call read(); write() sends a message and waits for the flow
+       control of the writer.
+
+       Incoming messages larger than maxsize bytes are refused, see
+       DERFramer.  When an executor is given, messages of offload_size
+       bytes and up are decoded by it.  Data is read in chunks of
+       chunksize bytes.
+    """
+
+    def __init__(self, reader, writer, cls, maxsize=None, executor=None, offload_size=None, chunksize=65536):
+        self.reader = reader
+        self.writer = writer
+        self.cls = cls
+        self.executor = executor
+        self.offload_size = der_offload_size if offload_size is None else offload_size
+        self.chunksize = chunksize
+        self._framer = DERFramer(maxsize)
+        self._ready = collections.deque()
+
+    async def read(self):
+        """Return the next message, or None at the end of the stream."""
+        while not self._ready:
+            chunk = await self.reader.read(self.chunksize)
+            if not chunk:
+                self._framer.close()
+                return None
+            self._ready.extend(self._framer.feed(chunk))
+        derblob = self._ready.popleft()
+        if self.executor is not None and len(derblob) >= self.offload_size:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(self.executor, _decode, self.cls, derblob)
+        return _decode(self.cls, derblob)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        msg = await self.read()
+        if msg is None:
+            raise StopAsyncIteration
+        return msg
+
+    async def write(self, msg):
+        """Send a message, which is an ASN1Object or DER bytes."""
+        self.writer.write(_encode(msg))
+        await self.writer.drain()
+
+    async def close(self):
+        """Close the writer and wait until it is closed."""
+        self.writer.close()
+        if hasattr(self.writer, 'wait_closed'):
+            await self.writer.wait_closed()
@@ -0,0 +1,32 @@
+# Stubs for quick_der.aio (Python 3.6)
+
+import asyncio
+from typing import Any, AsyncIterator, Optional
+
+der_offload_size: int
+
+class DERProtocol(asyncio.Protocol):
+    cls: Any
+    executor: Any
+    offload_size: int
+    max_backlog: int
+    transport: Any
+    def __init__(self, cls: Optional[Any] = ..., maxsize: Optional[int] = ..., executor: Optional[Any] = ..., offload_size: Optional[int] = ..., max_backlog: int = ...) -> None: ...
+    def message_received(self, msg: Any) -> None: ...
+    def der_error(self, exc: Exception) -> None: ...
+    def send(self, msg: Any) -> None: ...
+    async def drain(self) -> None: ...
+
+class DERStream:
+    reader: asyncio.StreamReader
+    writer: asyncio.StreamWriter
+    cls: Any
+    executor: Any
+    offload_size: int
+    chunksize: int
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, cls: Any, maxsize: Optional[int] = ..., executor: Optional[Any] = ..., offload_size: Optional[int] = ..., chunksize: int = ...) -> None: ...
+    async def read(self) -> Optional[Any]: ...
+    def __aiter__(self) -> AsyncIterator[Any]: ...
+    async def __anext__(self) -> Any: ...
+    async def write(self, msg: Any) -> None: ...
+    async def close(self) -> None: ...
@@ -22,3 +22,18 @@ from .classes import *
 # Import the build_asn1() routine
 from .builder import *
 
+# Import the der_walk() path compiler
+from .walk import *
+
+# Import der_project() and the Projection of dotted paths
+from .projection import *
+
+# Import the DERFramer for streams of DER elements
+from .stream import *
+
+# Import der_map() and der_load() for memory-mapped files
+from .loader import *
+
+# Import DERColumns for batches of records in columns
+from .columns import *
+
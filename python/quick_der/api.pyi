@@ -7,3 +7,8 @@ from quick_der.primitive import *
 from quick_der.format import *
 from quick_der.classes import *
 from quick_der.builder import *
+from quick_der.walk import *
+from quick_der.projection import *
+from quick_der.stream import *
+from quick_der.loader import *
+from quick_der.columns import *
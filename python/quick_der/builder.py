@@ -3,76 +3,90 @@
 # Future versions may also host der_pack(), der_unpack() or similar
 
 
+from six.moves import intern
+
 from quick_der import classes
-from quick_der.packstx import DER_PACK_END
+from quick_der.packstx import *
 
 
-def build_asn1(context, recipe, bindata=None, ofs=0, outer_class=None):
-    """Construct an ASN.1 structural element from a recipe and bindata.
-       with ofset.  The result can either be an ASN1Object subclass
-       instance or an offset into bindata.  The context is used to lookup
-       identifiers during lazy binding, normally it is set to self._context
-       for a generated class, and it would reference the globals() context
-       of that class definition.
+# Plans are cached by the identity of their recipe and context, and
+# they hold on to both so that the identities are not reused
+_plans = {}
+_field_plans = {}
+
+
+def _link_packer(context, subpck):
+    """Link a SEQUENCE OF or SET OF element packer that has been
+       generated as a list of fragments with None up front.  The result
+       is memorised in subpck[0] and returned.
     """
-    if not bindata:
-        bindata = []
+    packer = subpck[0]
+    if packer is None:
+        # Lazy linking:
+        packer = bytearray()
+        for idx in range(1, len(subpck)):
+            if subpck[idx][:1] == '?':
+                packer += context[subpck[idx][1:]]
+            else:
+                new = 0x00
+                for elm in subpck[idx].split('|'):
+                    elm = elm.strip()
+                    new = new | globals()[elm]
+                packer.append(new)
+        packer.append(DER_PACK_END)
+        # Memorise linking result:
+        packer = subpck[0] = bytes(packer)
+        del subpck[1:]
+    return packer
+
 
+def _compile_recipe(context, recipe):
+    """Compile a recipe into a function build(bindata, ofs, lazy,
+       outer_class) that constructs its ASN.1 structural element.  All
+       references to classes and packers are resolved here, and the
+       classes are specialised to the typing data, so that the function
+       does no lookups of its own.
+    """
     if type(recipe) == int:
         # Numbers refer to a dercursor index number
-        offset = recipe
-        return ofs + offset
+        def build(bindata, ofs, lazy, outer_class=None):
+            return ofs + recipe
+        return build
     elif recipe[0] == '_NAMED':
         # dictionaries are ASN.1 constructed types
-        # TODO:OLD# (_NAMED,pck,map) = recipe
-        _NAMED, map_ = recipe
-
-        return classes.ASN1ConstructedType(
-            recipe=recipe,
-            # TODO:OLD# der_packer = pck,
-            bindata=bindata,
-            offset=ofs,
-            context=context)
+        eager = classes._specialise(classes.ASN1ConstructedType, None, recipe, context)
+        lazyme = classes._specialise(eager, lazy=True)
 
+        def build(bindata, ofs, lazy, outer_class=None):
+            return (lazyme if lazy else eager)(bindata=bindata, offset=ofs)
+        return build
     elif recipe[0] in ['_SEQOF', '_SETOF']:
         _STHOF, allidx, subpck, subnum, subrcp = recipe
-        if outer_class:
-            cls = outer_class
-        elif _STHOF == '_SEQOF':
-            cls = classes.ASN1SequenceOf
+        if _STHOF == '_SEQOF':
+            (eager, lazyme) = (classes.ASN1SequenceOf, classes.ASN1LazySequenceOf)
         else:
-            cls = classes.ASN1SetOf
-        packer = subpck[0]
-        if packer is None:
-            # Lazy linking:
-            packer = ''
-            for idx in range(1, len(subpck)):
-                if subpck[idx][:1] == '?':
-                    new = context[subpck[idx][1:]]
-                else:
-                    new = 0x00
-                    for elm in subpck[idx].split('|'):
-                        elm = elm.strip()
-                        new = new | globals()[elm]
-                    new = chr(new)
-                packer += new
-            packer += chr(DER_PACK_END)
-            # Memorise linking result:
-            subpck[0] = packer
-            del subpck[1:]
-
-        return cls(recipe=recipe,
-                   der_packer=subpck[0],
-                   bindata=bindata,
-                   offset=allidx,
-                   context=context)
+            (eager, lazyme) = (classes.ASN1SetOf, classes.ASN1LazySetOf)
+        packer = _link_packer(context, subpck)
+        eager = classes._specialise(eager, packer, recipe, context)
+        lazyme = classes._specialise(lazyme, packer, recipe, context, True)
 
+        def build(bindata, ofs, lazy, outer_class=None):
+            if outer_class:
+                return outer_class(recipe=recipe,
+                                   der_packer=packer,
+                                   bindata=bindata,
+                                   offset=allidx,
+                                   context=context,
+                                   lazy=lazy)
+            return (lazyme if lazy else eager)(bindata=bindata, offset=allidx)
+        return build
     elif recipe[0] == '_TYPTR':
         # Reference to an ASN1Object subclass
         instme = None
+        typofs = 0
         while type(recipe) == tuple and recipe[0] == '_TYPTR':
             _TYPTR, [subcls], subofs = recipe
-            ofs += subofs
+            typofs += subofs
             if type(subcls) == str:
                 # TODO# Try to remove these, since we now generate it?
                 if subcls[:5] == '_api.':
@@ -88,11 +102,82 @@ def build_asn1(context, recipe, bindata=None, ofs=0, outer_class=None):
             if instme is None:
                 instme = subcls
             recipe = subcls._recipe
+        if issubclass(instme, classes.ASN1SequenceOf):
+            lazyme = classes.ASN1LazySequenceOf
+        elif issubclass(instme, classes.ASN1SetOf):
+            lazyme = classes.ASN1LazySetOf
+        else:
+            lazyme = instme
+        eager = classes._specialise(instme, subcls._der_packer, subcls._recipe, context)
+        lazyme = classes._specialise(lazyme, subcls._der_packer, subcls._recipe, context, True)
 
-        return instme(recipe=subcls._recipe,
-                      der_packer=subcls._der_packer,
-                      bindata=bindata,
-                      offset=ofs,
-                      context=context)
+        def build(bindata, ofs, lazy, outer_class=None):
+            return (lazyme if lazy else eager)(bindata=bindata, offset=ofs + typofs)
+        return build
     else:
         assert False, 'Unknown recipe tag ' + str(recipe[0])
+
+
+def recipe_plan(context, recipe):
+    """Return the compiled form of a recipe, which is a function
+       build(bindata, ofs, lazy, outer_class=None) that behaves like
+       build_asn1() for that recipe and context.  The recipe is compiled
+       on first use and cached, so lookups of classes by name and the
+       linking of packers are done only once.
+    """
+    try:
+        (_, _, build) = _plans[(id(recipe), id(context))]
+    except KeyError:
+        build = _compile_recipe(context, recipe)
+        _plans[(id(recipe), id(context))] = (recipe, context, build)
+    return build
+
+
+def field_plan(context, recipe):
+    """Return the fields of a '_NAMED' recipe as a tuple of entries
+       (name, index, build) in recipe order, along with a dictionary
+       that maps each name to its entry.  The name is the interned
+       Python attribute name, with dashes replaced by underscores.
+       For a field with an integer recipe, index is its dercursor index
+       relative to the offset of the instance and build is None;
+       otherwise index is None and build is the recipe_plan() of the
+       field.  The result is cached like that of recipe_plan().
+    """
+    try:
+        (_, _, plan) = _field_plans[(id(recipe), id(context))]
+    except KeyError:
+        assert recipe[0] == '_NAMED', 'Field plans can only be made for a dictionary in a _recipe'
+        entries = []
+        for (subfld, subrcp) in recipe[1].items():
+            if type(subfld) != str:
+                raise Exception("ASN.1 recipe keys can only be strings")
+            # Interned strings yield faster dictionary lookups
+            # Field names in Python are always interned
+            name = intern(subfld.replace('-', '_'))
+            if type(subrcp) == int:
+                entries.append((name, subrcp, None))
+            else:
+                entries.append((name, None, recipe_plan(context, subrcp)))
+        entries = tuple(entries)
+        plan = (entries, dict([(entry[0], entry) for entry in entries]))
+        _field_plans[(id(recipe), id(context))] = (recipe, context, plan)
+    return plan
+
+
+def build_asn1(context, recipe, bindata=None, ofs=0, outer_class=None, lazy=None):
+    """Construct an ASN.1 structural element from a recipe and bindata.
+       with ofset.  The result can either be an ASN1Object subclass
+       instance or an offset into bindata.  The context is used to lookup
+       identifiers during lazy binding, normally it is set to self._context
+       for a generated class, and it would reference the globals() context
+       of that class definition.  The lazy flag is passed on to the
+       constructed instance, to defer building its fields until access.
+       The recipe is compiled into a cached recipe_plan() on first use.
+    """
+    if not bindata:
+        bindata = []
+
+    if type(recipe) == int:
+        # Numbers refer to a dercursor index number
+        return ofs + recipe
+    return recipe_plan(context, recipe)(bindata, ofs, lazy, outer_class)
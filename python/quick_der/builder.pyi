@@ -2,6 +2,8 @@
 #
 # NOTE: This dynamically typed stub was automatically generated by stubgen.
 
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
-def build_asn1(context, recipe, bindata: Optional[Any] = ..., ofs: int = ..., outer_class: Optional[Any] = ...): ...
+def recipe_plan(context, recipe) -> Callable[..., Any]: ...
+def field_plan(context, recipe) -> Tuple[Tuple[Tuple[str, Optional[int], Optional[Callable[..., Any]]], ...], Dict[str, Tuple[str, Optional[int], Optional[Callable[..., Any]]]]]: ...
+def build_asn1(context, recipe, bindata: Optional[Any] = ..., ofs: int = ..., outer_class: Optional[Any] = ..., lazy: Optional[bool] = ...): ...
@@ -1,11 +1,125 @@
 # classes.py -- The various classes in the ASN.1 supportive hierarchy
 
 import _quickder
+import array
+import binascii
+from collections import OrderedDict
 
+import six
 from six.moves import intern
 
+try:
+    from collections.abc import Sequence
+except ImportError:
+    from collections import Sequence
+
 from quick_der import primitive
 from quick_der.packstx import *
+from quick_der.walk import _packer_elements
+
+
+# Write the values of a list one after another, without a DER header
+_concat_packer = bytes(bytearray([DER_PACK_ANY, DER_PACK_END]))
+
+
+def _printable(value):
+    """Render binary content as a native str for printing; under
+       Python 3 this decodes the bytes, replacing what is not UTF-8.
+       Views and bytearrays, as left by UNPACK_VIEW, are copied first.
+    """
+    if isinstance(value, memoryview):
+        value = value.tobytes()
+    elif isinstance(value, bytearray):
+        value = bytes(value)
+    if isinstance(value, six.binary_type) and not isinstance(value, str):
+        value = value.decode('utf-8', 'replace')
+    return value
+
+
+_compiled_packers = {}
+
+
+def der_compile(der_packer):
+    """Return a `_quickder.Packer` for the given DER_PACK_ sequence.
+       The packer is validated when it is first seen, and the result
+       is cached so that later calls with the same sequence share the
+       compiled form.  A malformed sequence raises ValueError.
+    """
+    try:
+        return _compiled_packers[der_packer]
+    except KeyError:
+        packer = _quickder.Packer(der_packer)
+        _compiled_packers[der_packer] = packer
+        return packer
+
+
+def der_unpack_batch(der_packer, records):
+    """Unpack a batch of records that all follow the same DER_PACK_
+       sequence, in a single call into the C extension.  The records
+       are either one buffer holding back-to-back DER records, or a
+       sequence of buffers that each hold one record.
+
+       The result is a flat table with an offset and a length for each
+       cursor of each record, so record `r` has cursor `c` at offset
+       `table[2 * (r * numcursori + c)]`.  Offsets count from the start
+       of the concatenated buffer, or from the start of the record's own
+       buffer; absent values have offset -1.  Under Python 3 the table
+       is a memoryview with format 'q'; Python 2 receives the bytearray
+       of native 64-bit integers that it is built on.
+    """
+    table = der_compile(der_packer).unpack_batch(records)
+    if six.PY3:
+        table = memoryview(table).cast('q')
+    return table
+
+
+def _unpack_mode(derblob):
+    """Return the unpack mode for the cursors in derblob.  Data that
+       arrives as a memoryview, such as a memory-mapped file, is unpacked
+       into views that share its memory; anything else is copied.
+    """
+    if isinstance(derblob, memoryview):
+        return _quickder.UNPACK_VIEW
+    return _quickder.UNPACK_COPY
+
+
+# Specialised classes are cached by their generic class and the identity
+# of their typing data, which they hold on to so the identities are not
+# reused.  Generated classes normally need no specialisation, but the
+# generic classes below are instantiated with the typing data from a
+# _recipe, and so are the ASN1Atom subclasses referenced from it.
+_specialised = {}
+
+
+def _specialise(cls, der_packer=None, recipe=None, context=None, lazy=None):
+    """Return a subclass of cls that holds the given typing data as its
+       class attributes, or cls itself when the typing data is either
+       absent or the same as that of cls.  Instances are slotted, so
+       they only hold their instance data; the subclass carries the
+       name of cls and is created once for each combination.
+    """
+    typing = {}
+    if der_packer is not None and der_packer is not cls._der_packer:
+        typing['_der_packer'] = der_packer
+    if recipe is not None and recipe is not cls._recipe:
+        typing['_recipe'] = recipe
+    if context is not None and context is not cls._context:
+        typing['_context'] = context
+    if lazy is not None and bool(lazy) != cls._lazy:
+        typing['_lazy'] = bool(lazy)
+    if not typing:
+        return cls
+    key = (cls,) + tuple([id(typing.get(attr)) for attr in ['_der_packer', '_recipe', '_context', '_lazy']])
+    try:
+        return _specialised[key][0]
+    except KeyError:
+        if '_recipe' in typing and issubclass(cls, ASN1ConstructedType):
+            typing.update(_field_descriptors(recipe))
+        typing['__slots__'] = ()
+        typing['__module__'] = cls.__module__
+        spec = type(cls)(cls.__name__, (cls,), typing)
+        _specialised[key] = (spec, der_packer, recipe, context)
+        return spec
 
 
 class ASN1Object(object):
@@ -22,11 +136,26 @@ class ASN1Object(object):
        data are indirect subclasses of `ASN1Obejct`.
     """
 
+    # Instance data lives in the slots _bindata and _offset, which are
+    # declared by the subclasses because list and set cannot share them
+    __slots__ = ()
+
     _der_packer = None
     _recipe = None
     _numcursori = None
+    _context = None
+    _lazy = False
 
-    def __init__(self, derblob=None, bindata=None, offset=0, der_packer=None, recipe=None, context=None):
+    def __new__(cls, derblob=None, bindata=None, offset=0, der_packer=None, recipe=None, context=None, lazy=None):
+        """Create the instance from a specialised class when typing
+           data is supplied that differs from that of cls, so that
+           the typing data is held by the class and not the instance.
+        """
+        if der_packer is not None or recipe is not None or context is not None or lazy is not None:
+            cls = _specialise(cls, der_packer, recipe, context, lazy)
+        return super(ASN1Object, cls).__new__(cls)
+
+    def __init__(self, derblob=None, bindata=None, offset=0, der_packer=None, recipe=None, context=None, lazy=None):
         """Initialise the current object; abstract classes require
            parameters with typing information (der_packer, recipe,
            numcursori).  Instance data may be supplied through bindata
@@ -35,24 +164,19 @@ class ASN1Object(object):
            _bindata values.  If neither bindata nor derblob are
            supplied, then an empty instance is delivered.  The optional
            context defines the globals() map in which type references
-           should be resolved.
+           should be resolved.  When lazy is set, fields of constructed
+           types are only built when they are first accessed; it
+           defaults to the _lazy setting of the class.
         """
         # TODO:OLD# assert der_packer is not None or self._der_packer is not None, 'You or a class from asn2quickder must supply a DER_PACK_ sequence for use with Quick DER'
         assert (
-               bindata is not None and recipe is not None) or der_packer is not None or self._der_packer is not None, 'You or a class from asn2quickder must supply a DER_PACK_ sequence for use with Quick DER'
+               bindata is not None and self._recipe is not None) or der_packer is not None or self._der_packer is not None, 'You or a class from asn2quickder must supply a DER_PACK_ sequence for use with Quick DER'
         assert recipe is not None or self._recipe is not None, 'You or a class from asn2quickder must supply a recipe for instantiating object structures'
         # TODO:OLD# assert bindata is not None or derblob is not None or self._numcursori is not None, 'When no binary data is supplied, you or a class from asn2quickder must supply how many DER cursors are used'
         # TODO:NEW:MAYBENOTNEEDED# assert self._numcursori is not None, 'You should always indicate how many values will be stored'
         assert context is not None or getattr(self, "_context",
                                               None) is not None, 'You or a subclass definition should provide a context for symbol resolution'
-        # Construct the type if so desired
-        if der_packer is not None:
-            self._der_packer = der_packer
-        if recipe is not None:
-            self._recipe = recipe
-        if context is not None:
-            self._context = context
-
+        # The type was constructed in __new__() if so desired
         # Ensure presence of all typing data
         # Fill the instance data as supplied, or else make it empty
         if bindata:
@@ -60,7 +184,7 @@ class ASN1Object(object):
             self._offset = offset
             self.__init_bindata__()
         elif derblob:
-            self._bindata = _quickder.der_unpack(self._der_packer, derblob, self._numcursori)
+            self._bindata = der_compile(self._der_packer).unpack(derblob)
             self._offset = 0
             assert len(self._bindata) == self._numcursori, 'Wrong number of values returned from der_unpack()'
             assert offset == 0, 'You supplied a derblob, so you cannot request any offset but 0'
@@ -74,6 +198,33 @@ class ASN1Object(object):
     def __init_bindata__(self):
         assert False, 'Expected __init_bindata__() method not found in ' + self.__class__.__name__
 
+    def _der_clean(self):
+        """Return True if the object and everything in it still hold
+           the values that were unpacked, so that their original binary
+           data may be used for packing.
+        """
+        return False
+
+    def _der_content(self):
+        """Return what _der_format() returns, but take it from the
+           original binary data if the object is _der_clean().
+        """
+        return self._der_format()
+
+    def _der_value(self):
+        """Return the value for this object in the values of the
+           _der_packer that holds it; see _der_values().
+        """
+        return self._der_content()
+
+    def _der_values(self, numcursori=None):
+        """Return the list of values for the _der_packer of this object,
+           in the form that _quickder.der_encode() accepts.  Nested
+           objects are not packed on their own, so the whole structure
+           is written in one pass.
+        """
+        return [self._der_content()]
+
 
 # The ASN1ConstructedType is a nested structure of named fields.
 # Nesting instances share the bindata list structures, which they modify
@@ -83,6 +234,142 @@ class ASN1Object(object):
 # SHARED IN LOWEST CLASS: ._recipe and ._der_packer
 # STORED IN OBJECTS: ._fields, ._offset, ._bindata, ._numcursori
 
+# A structure that is unpacked from its own DER blob keeps that blob.
+# When it is packed after a change, every constructed part that holds no
+# change is written as its original slice of the blob, through a copy of
+# the _der_packer in which that part is replaced by DER_PACK_ANY.
+
+def _der_regions(elements, derblob, offsets, pos, regions):
+    """Find the slice of derblob, starting at pos, that each constructed
+       element in a list of _der_packer elements was unpacked from, and
+       store it in regions by the cursor range of the element.  The
+       cursor offsets from UNPACK_OFFSET tell which elements are present.
+       Returns the position after the elements, or None if an element
+       stores no cursors, so its presence is unknown.
+    """
+    for (cmd, optional, first, last, children) in elements:
+        if first == last:
+            return None
+        if all(offsets[crs] is None for crs in range(first, last)):
+            continue
+        if cmd == DER_PACK_CHOICE_BEGIN:
+            pos = _der_regions(children, derblob, offsets, pos, regions)
+            if pos is None:
+                return None
+            continue
+        (tag, ilen, hlen) = _quickder.der_header(memoryview(derblob)[pos:])
+        if children is not None:
+            if _der_regions(children, derblob, offsets, pos + hlen, regions) is None:
+                return None
+            # Outer elements with the same cursors replace inner ones
+            regions[(first, last)] = (pos, pos + hlen + ilen)
+        pos += hlen + ilen
+    return pos
+
+
+def _der_cursor_value(bd):
+    """Return the value for a _bindata entry in the form that
+       _quickder.der_encode() accepts.
+    """
+    if bd is None or isinstance(bd, (six.binary_type, bytearray, memoryview)):
+        return bd
+    elif isinstance(bd, ASN1Object):
+        # Unchanged objects deliver their original binary data
+        return bd._der_value()
+    else:
+        # Hope to map the value to DER without hints
+        from quick_der import format
+        return format.der_format(bd)
+
+
+def _der_passthrough(elements, dirty, derblob, regions, cmds, sources, choice=False):
+    """Build the DER_PACK_ commands to pack the elements of a _der_packer,
+       where constructed elements whose cursors are not in dirty are
+       written as their regions of derblob with DER_PACK_ANY.  The value
+       for each command is added to sources, as a cursor index or as
+       the region.  Alternatives of a CHOICE are written as before,
+       because they are told apart by their tags.
+    """
+    for (cmd, optional, first, last, children) in elements:
+        region = regions.get((first, last))
+        if children is not None and cmd != DER_PACK_CHOICE_BEGIN and not choice and \
+                region is not None and dirty.isdisjoint(range(first, last)):
+            cmds.append(DER_PACK_ANY)
+            sources.append(memoryview(derblob)[region[0]:region[1]])
+            continue
+        if optional:
+            cmds.append(DER_PACK_OPTIONAL)
+        cmds.append(cmd)
+        if children is None:
+            sources.append(first)
+        elif cmd == DER_PACK_CHOICE_BEGIN:
+            _der_passthrough(children, dirty, derblob, regions, cmds, sources, True)
+            cmds.append(DER_PACK_CHOICE_END)
+        else:
+            _der_passthrough(children, dirty, derblob, regions, cmds, sources)
+            cmds.append(DER_PACK_LEAVE)
+
+
+# Fields of constructed types are normally found through __getattr__(),
+# but the classes generated by asn2quickder define a descriptor for each
+# field, which reads it directly.  The same is done for the subclasses
+# made by _specialise() for a '_NAMED' recipe without a class of its own.
+
+class ASN1FieldIndex(object):
+    """A descriptor for a field of an `ASN1ConstructedType` with an
+       integer recipe.  It reads the value from `_bindata` at the given
+       index from the `_offset` of the instance.
+    """
+
+    __slots__ = ('_index',)
+
+    def __init__(self, index):
+        self._index = index
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        return obj._bindata[obj._offset + self._index]
+
+
+class ASN1FieldObject(object):
+    """A descriptor for a field of an `ASN1ConstructedType` that holds
+       an `ASN1Object`.  It returns the object from `_fields`, and falls
+       back to `__getattr__()` when a lazy instance has not built it yet.
+    """
+
+    __slots__ = ('_name',)
+
+    def __init__(self, name):
+        self._name = intern(name)
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self
+        try:
+            return obj._fields[self._name]
+        except KeyError:
+            return obj.__getattr__(self._name)
+
+
+def _field_descriptors(recipe):
+    """Return a dictionary with the field descriptors for a '_NAMED'
+       recipe.  Fields that are not plain identifiers, that would hide
+       an attribute of `ASN1ConstructedType`, or that refer to a bare
+       `ASN1Atom` are left to `__getattr__()`.
+    """
+    descriptors = {}
+    for (subfld, subrcp) in recipe[1].items():
+        name = subfld.replace('-', '_')
+        if name[:1] == '_' or hasattr(ASN1ConstructedType, name):
+            continue
+        if type(subrcp) == int:
+            descriptors[name] = ASN1FieldIndex(subrcp)
+        elif subrcp[0] != '_TYPTR' or subrcp[1][0] not in ['ASN1Atom', '_api.ASN1Atom', ASN1Atom]:
+            descriptors[name] = ASN1FieldObject(name)
+    return descriptors
+
+
 class ASN1ConstructedType(ASN1Object):
     """The ASN.1 constructed types are `SEQUENCE`, `SET` and `CHOICE`.
        Note that `SEQUENCE OF` and `SET OF` are not considered
@@ -104,6 +391,14 @@ class ASN1ConstructedType(ASN1Object):
        These recipes are also built by the `asn2quickder` compiler.
     """
 
+    __slots__ = ('_bindata', '_offset', '_fields', '_dirty', '_der', '_regions')
+
+    def __init__(self, derblob=None, bindata=None, offset=0, der_packer=None, recipe=None, context=None, lazy=None):
+        super(ASN1ConstructedType, self).__init__(derblob, bindata, offset, der_packer, recipe, context, lazy)
+        # Nested instances are packed as part of the outermost one
+        self._der = derblob if derblob and not bindata else None
+        self._regions = None
+
     def __init_bindata__(self):
         """The object has been setup with structural information in
            _der_packer and _recipe, as well as instance data in
@@ -118,33 +413,62 @@ class ASN1ConstructedType(ASN1Object):
             import sys
             sys.exit(1)
         assert self._recipe[0] == '_NAMED', 'ASN1ConstructedType instances must have a dictionary in their _recipe'
-        (_NAMED, recp) = self._recipe
+        from quick_der import builder
         self._fields = {}
+        self._dirty = False
+        if self._lazy:
+            # Fields are built by _name2idx() when first accessed
+            return
         # Static recipe is generated from the ASN.1 grammar
-        # Iterate over this recipe to form the instance data
-        from quick_der import builder
-        for (subfld, subrcp) in recp.items():
-            if type(subfld) != str:
-                raise Exception("ASN.1 recipe keys can only be strings")
-            # Interned strings yield faster dictionary lookups
-            # Field names in Python are always interned
-            subfld = intern(subfld.replace('-', '_'))
+        # Its compiled field plan forms the instance data
+        (entries, _) = builder.field_plan(self._context, self._recipe)
+        for entry in entries:
+            self._build_field(entry)
+
+    def _build_field(self, entry):
+        """Build a field from its entry in the field_plan() of the
+           _recipe, and register it in _fields.  Lazy instances build
+           their fields one at a time, on their first access.
+        """
+        (subfld, subidx, build) = entry
+        if build is None:
+            # Primitive: Index into _bindata; set in _fields
+            self._fields[subfld] = self._offset + subidx
+            return
+        subval = build(self._bindata, self._offset, self._lazy or None)
+        if subval.__class__ == ASN1Atom:
+            # The following moved into __init_bindata__():
+            # self._bindata [self._offset] = subval
+            # Native types may be assigned instead of subval
             self._fields[subfld] = self._offset  # fallback
-            subval = builder.build_asn1(self._context, subrcp, self._bindata, self._offset)
-            if type(subval) == int:
-                # Primitive: Index into _bindata; set in _fields
-                self._fields[subfld] += subval
-            elif subval.__class__ == ASN1Atom:
-                # The following moved into __init_bindata__():
-                # self._bindata [self._offset] = subval
-                # Native types may be assigned instead of subval
-                pass
-                print('Not placing field {} subvalue :: {}'.format(subfld, type(subval)))
-            elif isinstance(subval, ASN1Object):
-                self._fields[subfld] = subval
+            print('Not placing field {} subvalue :: {}'.format(subfld, type(subval)))
+        elif isinstance(subval, ASN1Object):
+            self._fields[subfld] = subval
+
+    def _build_lazy(self, name):
+        """Build the field with the given name for a lazy instance,
+           returning False if the _recipe has no such field.
+        """
+        from quick_der import builder
+        (_, byname) = builder.field_plan(self._context, self._recipe)
+        if name not in byname:
+            return False
+        self._build_field(byname[name])
+        return True
+
+    def _build_all(self):
+        """Build all fields that a lazy instance has not built yet."""
+        if self._lazy and len(self._fields) < len(self._recipe[1]):
+            from quick_der import builder
+            (entries, _) = builder.field_plan(self._context, self._recipe)
+            for entry in entries:
+                if entry[0] not in self._fields:
+                    self._build_field(entry)
 
     def _name2idx(self, name):
         while not name in self._fields:
+            if self._lazy and self._build_lazy(name):
+                break
             if name[:1] == '_':
                 name = name[1:]
                 continue
@@ -156,14 +480,16 @@ class ASN1ConstructedType(ASN1Object):
             idx = self._name2idx(name)
             if type(idx) == int:
                 self._bindata[idx] = val
+                self._dirty = True
             else:
                 idx.set(val)
         else:
-            self.__dict__[name] = val
+            object.__setattr__(self, name, val)
 
     def __delattr__(self, name):
         idx = self._name2idx(name)
         self._bindata[idx] = None
+        self._dirty = True
 
     def __getattr__(self, name):
         idx = self._name2idx(name)
@@ -178,18 +504,73 @@ class ASN1ConstructedType(ASN1Object):
            was created, usually after a der_unpack() operation
            or a der_unpack(ClassName, derblob) or empty(ClassName)
            call.  Return the bytes with the packed data.
+
+           A structure that was unpacked from its own DER blob writes
+           the parts that were not changed as their original bytes.
+        """
+        if self._der is None:
+            return _quickder.der_encode(self._der_packer, self._der_values())
+        if self._der_clean():
+            (tag, ilen, hlen) = _quickder.der_header(self._der)
+            return memoryview(self._der)[:hlen + ilen].tobytes()
+        if self._regions is None:
+            # Locate the constructed parts of the original DER blob once
+            elements = _packer_elements(self._der_packer)[0]
+            offsets = der_compile(self._der_packer).unpack(self._der, _quickder.UNPACK_OFFSET)
+            regions = {}
+            if _der_regions(elements, self._der, offsets, 0, regions) is None:
+                regions = {}
+            self._regions = (elements, regions, {})
+        (elements, regions, plans) = self._regions
+        dirty = set()
+        self._der_dirty(dirty)
+        # The packer and its sources only depend on the changed cursors
+        key = frozenset(dirty)
+        if key not in plans:
+            if len(plans) >= 8:
+                plans.clear()
+            cmds = []
+            sources = []
+            _der_passthrough(elements, dirty, self._der, regions, cmds, sources)
+            cmds.append(DER_PACK_END)
+            plans[key] = (bytes(bytearray(cmds)), sources)
+        (der_packer, sources) = plans[key]
+        cursors = self._bindata[self._offset:self._offset + self._numcursori]
+        return _quickder.der_encode(der_packer, [_der_cursor_value(cursors[src]) if type(src) == int else src
+                                                 for src in sources])
+
+    def _der_dirty(self, dirty):
+        """Add the cursor indexes that may have changed in this object,
+           or in the objects that it holds, to the set dirty.
         """
-        bindata = []
-        for bd in self._bindata[self._offset:self._offset + self._numcursori]:
-            # TODO# set, list, atomic...
-            print('bindata[] element is a {}'.format(type(bd)))
-            if bd is not None and type(bd) != str:
-                # Hope to map the value to DER without hints
-                # TODO# Currently fails on ASN1Objects
-                from quick_der import format
-                bd = format.der_format(bd)
-            bindata.append(bd)
-        return _quickder.der_pack(self._der_packer, bindata)
+        for value in self._fields.values():
+            if type(value) == int:
+                if self._dirty:
+                    dirty.add(value)
+            elif isinstance(value, ASN1ConstructedType):
+                value._der_dirty(dirty)
+            elif isinstance(value, ASN1Object) and not value._der_clean():
+                dirty.add(value._offset)
+
+    def _der_values(self, numcursori=None):
+        """Return the list of values for the _der_packer, which covers
+           numcursori entries of _bindata, by default _numcursori.  A
+           `SEQUENCE OF` or `SET OF` contributes its elements as a list,
+           which _quickder.der_encode() writes in the same pass.
+        """
+        return [_der_cursor_value(bd) for bd in self._bindata[self._offset:self._offset + (numcursori or self._numcursori)]]
+
+    def _der_clean(self):
+        """Return True if no field was assigned or deleted in this
+           object or in the objects that it holds.  Fields that a lazy
+           instance did not build cannot have been changed.
+        """
+        if self._dirty:
+            return False
+        for value in self._fields.values():
+            if isinstance(value, ASN1Object) and not value._der_clean():
+                return False
+        return True
 
     def _der_format(self):
         """Format the current ASN1ConstructedType using DER notation,
@@ -204,9 +585,13 @@ class ASN1ConstructedType(ASN1Object):
         return packed[hlen: hlen + ilen]
 
     def __str__(self):
+        self._build_all()
         retval = '{\n    '
         comma = ''
-        for (name, value) in self._fields.items():
+        # Follow the _recipe order, which lazy building may not have kept
+        from quick_der import builder
+        for (name, _, _) in builder.field_plan(self._context, self._recipe)[0]:
+            value = self._fields[name]
             if type(value) == int:
                 value = self._bindata[value]
             if value is None:
@@ -229,7 +614,10 @@ class ASN1SequenceOf(ASN1Object, list):
        TODO: Need to _der_pack() and get the result back into a context.
     """
 
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_SEQUENCE) + chr(DER_PACK_END)
+    __slots__ = ('_bindata', '_offset', '_der')
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END]))
+    _header_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END]))
     _numcursori = 1
 
     def __init_bindata__(self):
@@ -246,27 +634,22 @@ class ASN1SequenceOf(ASN1Object, list):
         (_SEQOF, allidx, subpck, subnum, subrcp) = self._recipe
         # TODO:DEBUG# print 'SEQUENCE OF from', self._offset, 'to', allidx, 'element recipe =', subrcp
         # TODO:DEBUG# print 'len(_bindata) =', len(self._bindata), '_offset =', self._offset, 'allidx =', allidx
-        derblob = self._bindata[self._offset] or ''
+        derblob = self._bindata[self._offset] or b''
         from quick_der import builder
-        while len(derblob) > 0:
-            # TODO:DEBUG# print 'Getting the header from ' + ' '.join(map(lambda x: x.encode('hex'), derblob [:5])) + '...'
-            (tag, ilen, hlen) = _quickder.der_header(derblob)
-            if len(derblob) < hlen + ilen:
-                raise Exception('SEQUENCE OF elements must line up to a neat whole')
-            subdta = derblob[:hlen + ilen]
-            subcrs = _quickder.der_unpack(subpck, subdta, subnum)
-            # TODO:ALLIDX# subval = builder.build_asn1(self._context, subrcp, subcrs, allidx)
-            subval = builder.build_asn1(self._context, subrcp, subcrs, 0)
-            self.append(subval)
-            derblob = derblob[hlen + ilen:]
+        # Elements are split and unpacked in one pass by the C extension
+        build = builder.recipe_plan(self._context, subrcp)
+        lazy = self._lazy or None
+        # TODO:ALLIDX# subval = builder.build_asn1(self._context, subrcp, subcrs, allidx)
+        list.extend(self, [build(subcrs, 0, lazy) for subcrs in der_compile(subpck).unpack_each(derblob, _unpack_mode(derblob))])
+        # Keep the original binary data until the list is changed
+        self._der = self._bindata[self._offset]
         self._bindata[self._offset] = self
 
     def _der_pack(self):
         """Return the result of the `der_pack()` operation on this
            element.
         """
-        return primitive.der_prefixhead(DER_PACK_ENTER | DER_TAG_SEQUENCE,
-                                        self._der_format())
+        return _quickder.der_encode(self._header_packer, [self._der_value()])
 
     def _der_format(self):
         """Format the current ASN1SequenceOf using DER notation,
@@ -276,7 +659,38 @@ class ASN1SequenceOf(ASN1Object, list):
            DER, it needs some contextual information (specifically,
            the tag to prefix before the body).
         """
-        return ''.join([elem._der_pack() for elem in self])
+        return _quickder.der_encode(_concat_packer, [self._der_elements()])
+
+    def _der_elements(self):
+        """Return the elements in the form that _quickder.der_encode()
+           accepts in a list, as the element packer with its values.
+        """
+        (_, _, subpck, subnum, _) = self._recipe
+        return [(subpck, elem._der_values(subnum)) for elem in self]
+
+    def _der_clean(self):
+        """Return True if the elements were not changed since they
+           were unpacked, and neither was anything in them.
+        """
+        if self._der is None:
+            return False
+        for elem in self:
+            if isinstance(elem, ASN1Object) and not elem._der_clean():
+                return False
+        return True
+
+    def _der_content(self):
+        if self._der_clean():
+            return self._der
+        return self._der_format()
+
+    def _der_value(self):
+        if self._der_clean():
+            return self._der
+        return self._der_elements()
+
+    def _der_values(self, numcursori=None):
+        return [self._der_value()]
 
     def __str__(self):
         entries = ',\n'.join([str(x) for x in self])
@@ -288,12 +702,17 @@ class ASN1SetOf(ASN1Object, set):
     """An ASN.1 representation for a SET OF other ASN1Object values.
 
        The instances of this class can be manipulated just like Python's
-       native set type.
+       native set type.  When packed, the elements are written in the
+       order of their DER encodings, as DER requires for a SET OF, so
+       the output does not depend on the order of the Python set.
 
        TODO: Need to _der_pack() and get the result back into a context.
     """
 
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_SET) + chr(DER_PACK_END)
+    __slots__ = ('_bindata', '_offset', '_der')
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SET, DER_PACK_END]))
+    _header_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SET, DER_PACK_END]))
     _numcursori = 1
 
     def __init_bindata__(self):
@@ -310,26 +729,22 @@ class ASN1SetOf(ASN1Object, set):
         (_SETOF, allidx, subpck, subnum, subrcp) = self._recipe
         # TODO:DEBUG# print 'SET OF from', self._offset, 'to', allidx, 'element recipe =', subrcp
         # TODO:DEBUG# print 'len(_bindata) =', len(self._bindata), '_offset =', self._offset, 'allidx =', allidx
-        derblob = self._bindata[self._offset] or ''
+        derblob = self._bindata[self._offset] or b''
         from quick_der import builder
-        while len(derblob) > 0:
-            (tag, ilen, hlen) = _quickder.der_header(derblob)
-            if len(derblob) < hlen + ilen:
-                raise Exception('SET OF elements must line up to a neat whole')
-            subdta = derblob[:hlen + ilen]
-            subcrs = _quickder.der_unpack(subpck, subdta, subnum)
-            # TODO:ALLIDX# subval = builder.build_asn1(self._context, subrcp, subcrs, allidx)
-            subval = builder.build_asn1(self._context, subrcp, subcrs, 0)
-            self.add(subval)
-            derblob = derblob[hlen + ilen:]
+        # Elements are split and unpacked in one pass by the C extension
+        build = builder.recipe_plan(self._context, subrcp)
+        lazy = self._lazy or None
+        # TODO:ALLIDX# subval = builder.build_asn1(self._context, subrcp, subcrs, allidx)
+        set.update(self, [build(subcrs, 0, lazy) for subcrs in der_compile(subpck).unpack_each(derblob, _unpack_mode(derblob))])
+        # Keep the original binary data until the set is changed
+        self._der = self._bindata[self._offset]
         self._bindata[self._offset] = self
 
     def _der_pack(self):
         """Return the result of the `der_pack()` operation on this
            element.
         """
-        return primitive.der_prefixhead(DER_PACK_ENTER | DER_TAG_SET,
-                                        self._der_format())
+        return _quickder.der_encode(self._header_packer, [self._der_value()])
 
     def _der_format(self):
         """Format the current ASN1SetOf using DER notation,
@@ -339,7 +754,41 @@ class ASN1SetOf(ASN1Object, set):
            DER, it needs some contextual information (specifically,
            the tag to prefix before the body).
         """
-        return ''.join([elem._der_pack() for elem in self])
+        return _quickder.der_encode(_concat_packer, [self._der_elements()])
+
+    def _der_elements(self):
+        """Return the elements in the form that _quickder.der_encode()
+           accepts in a list, as their DER encodings.  DER requires the
+           elements of a SET OF to be ordered by their encodings, so each
+           element is encoded once, reusing the binary data of unchanged
+           elements, and the encodings are sorted by the C extension.
+        """
+        (_, _, subpck, subnum, _) = self._recipe
+        return _quickder.der_sort([_quickder.der_encode(subpck, elem._der_values(subnum)) for elem in self])
+
+    def _der_clean(self):
+        """Return True if the elements were not changed since they
+           were unpacked, and neither was anything in them.
+        """
+        if self._der is None:
+            return False
+        for elem in self:
+            if isinstance(elem, ASN1Object) and not elem._der_clean():
+                return False
+        return True
+
+    def _der_content(self):
+        if self._der_clean():
+            return self._der
+        return self._der_format()
+
+    def _der_value(self):
+        if self._der_clean():
+            return self._der
+        return self._der_elements()
+
+    def _der_values(self, numcursori=None):
+        return [self._der_value()]
 
     def __str__(self):
         entries = ',\n'.join([str(x) for x in self])
@@ -347,6 +796,223 @@ class ASN1SetOf(ASN1Object, set):
         return 'SET { ' + entries + ' }'
 
 
+# Element offsets into memory-mapped files may exceed 32 bits, which is
+# the size of array('L') on some platforms; Python 2 lacks array('Q')
+try:
+    array.array('Q')
+    _offset_array = lambda: array.array('Q')
+except ValueError:
+    _offset_array = list
+
+
+def _dirtying(method):
+    """Wrap a method of list or set that changes its elements, so that
+       it drops the original binary data of the instance.
+    """
+    def dirtying(self, *args, **kwargs):
+        self._der = None
+        return method(self, *args, **kwargs)
+    dirtying.__name__ = method.__name__
+    dirtying.__doc__ = method.__doc__
+    return dirtying
+
+
+for _name in ['__setitem__', '__delitem__', '__setslice__', '__delslice__', '__iadd__', '__imul__',
+              'append', 'extend', 'insert', 'pop', 'remove', 'reverse', 'sort', 'clear']:
+    if hasattr(list, _name):
+        setattr(ASN1SequenceOf, _name, _dirtying(getattr(list, _name)))
+for _name in ['__ior__', '__iand__', '__isub__', '__ixor__', 'add', 'discard', 'remove', 'pop', 'clear',
+              'update', 'intersection_update', 'difference_update', 'symmetric_difference_update']:
+    setattr(ASN1SetOf, _name, _dirtying(getattr(set, _name)))
+
+
+class ASN1LazySequenceOf(ASN1Object, Sequence):
+    """A read-only ASN.1 representation for a SEQUENCE OF other
+       ASN1Object values, which decodes elements only when they are
+       accessed.  This is used instead of `ASN1SequenceOf` for lazy
+       instances.
+
+       The element boundaries are found once, when the instance is
+       set up, after which `len()`, indexing and slicing work without
+       decoding anything.  A slice is another lazy container that
+       shares the binary data.  Decoded elements are kept in a cache of
+       at most `_cachesize` entries, from which the least recently used
+       are dropped; set it to 0 to disable caching or to None to keep
+       all decoded elements.  It starts at `_defaultcachesize`, which
+       may be set on a class.
+
+       Elements that are changed while they are in the cache are packed
+       into the container, and they are never dropped from the cache, so
+       indexing returns the changed element again.  Slices share their
+       elements and the cache with the container they were taken from.
+       An element that is changed after it was dropped from the cache,
+       or that was never cached because `_cachesize` is 0, is a copy
+       that is not packed.  The number of elements cannot be changed;
+       the eager classes `ASN1SequenceOf` and `ASN1SetOf` support that.
+    """
+
+    __slots__ = ('_bindata', '_offset', '_derblob', '_starts', '_ends', '_whole', '_cache', '_cachesize',
+                 '_base', '_indexes', '_pinned')
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END]))
+    _numcursori = 1
+    _defaultcachesize = 128
+    _header_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END]))
+    _header_name = 'SEQUENCE'
+    _sorted = False
+
+    def __init_bindata__(self):
+        """The object has been setup with structural information in
+           _der_packer and _recipe, as well as instance data in
+           _bindata [_offset].  We now find the element boundaries
+           in the instance data, without decoding the elements.
+           The last step of this procedure is to self-register into
+           _bindata [_offset], so as to support future _der_pack()
+           calls.
+        """
+        assert self._recipe[0] in ['_SEQOF', '_SETOF'], 'ASN1LazySequenceOf instances must have a _recipe tuple(\'_SEQOF\',...)'
+        self._derblob = self._bindata[self._offset] or b''
+        self._starts = _offset_array()
+        self._ends = _offset_array()
+        for (ofs, ln) in _quickder.der_iterate(self._derblob, _quickder.UNPACK_OFFSET):
+            self._starts.append(ofs)
+            self._ends.append(ofs + ln)
+        self._whole = True
+        self._cache = OrderedDict()
+        self._cachesize = self._defaultcachesize
+        # Slices find their elements in the container they were taken from
+        self._base = self
+        self._indexes = None
+        self._pinned = {}
+        self._bindata[self._offset] = self
+
+    def _decode(self, idx):
+        """Decode the element at index idx from its binary data."""
+        (_STHOF, allidx, subpck, subnum, subrcp) = self._recipe
+        subdta = memoryview(self._derblob)[self._starts[idx]:self._ends[idx]]
+        subcrs = der_compile(subpck).unpack(subdta, _unpack_mode(self._derblob))
+        from quick_der import builder
+        return builder.recipe_plan(self._context, subrcp)(subcrs, 0, self._lazy or None)
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            sub = object.__new__(self.__class__)
+            sub._bindata = self._bindata
+            sub._offset = self._offset
+            sub._derblob = self._derblob
+            sub._starts = self._starts[idx]
+            sub._ends = self._ends[idx]
+            sub._whole = False
+            sub._cache = self._base._cache
+            sub._cachesize = self._cachesize
+            sub._base = self._base
+            sub._indexes = self._base_indexes()[idx]
+            sub._pinned = self._base._pinned
+            return sub
+        if idx < 0:
+            idx += len(self._starts)
+        if not 0 <= idx < len(self._starts):
+            raise IndexError('lazy container index out of range')
+        if self._indexes is not None:
+            return self._base._element(self._indexes[idx])
+        return self._element(idx)
+
+    def _base_indexes(self):
+        """Return the indexes of the elements in the container that
+           this one was sliced from.
+        """
+        if self._indexes is None:
+            return range(len(self._starts))
+        return self._indexes
+
+    def _element(self, idx):
+        """Return the element at index idx, decoding it unless it is
+           in the cache.
+        """
+        try:
+            return self._pinned[idx]
+        except KeyError:
+            pass
+        try:
+            # Move the element to the most recently used end
+            subval = self._cache.pop(idx)
+        except KeyError:
+            subval = self._decode(idx)
+        if self._cachesize is None or self._cachesize > 0:
+            self._cache[idx] = subval
+            while self._cachesize is not None and len(self._cache) > self._cachesize:
+                (oldidx, oldval) = self._cache.popitem(last=False)
+                if not oldval._der_clean():
+                    # Changed elements are never dropped
+                    self._pinned[oldidx] = oldval
+        return subval
+
+    def _der_part(self, idx):
+        """Return the binary data of the element at index idx, which is
+           formatted again if the element was changed.
+        """
+        subval = self._pinned.get(idx)
+        if subval is None:
+            subval = self._cache.get(idx)
+        if subval is None or subval._der_clean():
+            return memoryview(self._derblob)[self._starts[idx]:self._ends[idx]].tobytes()
+        (_STHOF, allidx, subpck, subnum, subrcp) = self._recipe
+        return _quickder.der_encode(subpck, subval._der_values(subnum))
+
+    def _der_pack(self):
+        """Return the result of the `der_pack()` operation on this
+           element.
+        """
+        return _quickder.der_encode(self._header_packer, [self._der_format()])
+
+    def _der_format(self):
+        """Format the current container using DER notation, but
+           withhold the DER header consisting of the outer tag and
+           length.  This reproduces the binary data of the elements,
+           without decoding them, except for elements that were changed.
+        """
+        if not self._der_clean():
+            parts = [self._base._der_part(idx) for idx in self._base_indexes()]
+            if self._sorted:
+                parts = _quickder.der_sort(parts)
+            return b''.join(parts)
+        if self._whole:
+            return bytes(self._derblob)
+        view = memoryview(self._derblob)
+        return b''.join([view[start:end].tobytes() for (start, end) in zip(self._starts, self._ends)])
+
+    def _der_clean(self):
+        """Return True if none of the decoded elements were changed."""
+        for cached in (self._pinned, self._cache):
+            for subval in cached.values():
+                if not subval._der_clean():
+                    return False
+        return True
+
+    def __str__(self):
+        entries = ',\n'.join([str(x) for x in self])
+        return self._header_name + ' { ' + entries + ' }'
+
+
+class ASN1LazySetOf(ASN1LazySequenceOf):
+    """A read-only ASN.1 representation for a SET OF other ASN1Object
+       values, which decodes elements only when they are accessed.  This
+       is used instead of `ASN1SetOf` for lazy instances.  The elements
+       are indexed in the order of the DER encoding; see
+       `ASN1LazySequenceOf` for details.
+    """
+
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SET, DER_PACK_END]))
+    _header_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_SET, DER_PACK_END]))
+    _header_name = 'SET'
+    _sorted = True
+
+
 class ASN1Atom(ASN1Object):
     """An ASN.1 primitive object.  This is used for `INTEGER`, `REAL`,
        `BOOLEAN`, `ENUMERATED` and the various `STRING`, `TIME` and
@@ -368,6 +1034,8 @@ class ASN1Atom(ASN1Object):
        TODO: Consider using the _der_packer, and/or having subclasses.
     """
 
+    __slots__ = ('_bindata', '_offset', '_value', '_der')
+
     _numcursori = 1
     _recipe = 0
     _context = {}
@@ -434,7 +1102,9 @@ class ASN1Atom(ASN1Object):
            be avoided in a more clever approach.
         """
         self._value = self._bindata[self._offset]
-        mytag = ord(self._der_packer[0]) & DER_PACK_MATCHBITS
+        # Keep the original binary data until set() is called
+        self._der = self._value
+        mytag = six.indexbytes(self._der_packer, 0) & DER_PACK_MATCHBITS
         if mytag in self._direct_data_map:
             mapfun = self._direct_data_map[mytag]
             if self._bindata[self._offset] is None:
@@ -454,8 +1124,12 @@ class ASN1Atom(ASN1Object):
         return self._value
 
     def set(self, derblob):
-        if type(derblob) == str:
+        if isinstance(derblob, six.binary_type):
             self._value = derblob
+            self._der = None
+            if self._bindata[self._offset] is not self:
+                # Packing uses the binary string in _bindata [_offset]
+                self._bindata[self._offset] = derblob
         else:
             raise ValueError('ASN1Atom.set() only accepts derblob strings')
 
@@ -468,7 +1142,7 @@ class ASN1Atom(ASN1Object):
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = "'" + self._der_format().encode('hex') + "'H"
+            retval = "'" + _printable(binascii.hexlify(self._der_format())) + "'H"
         else:
             retval = 'None'
         return retval
@@ -484,7 +1158,7 @@ class ASN1Atom(ASN1Object):
         """Return the result of the `der_pack()` operation on this
            element.
         """
-        return primitive.der_prefixhead(self._der_packer[0], self._der_format())
+        return _quickder.der_encode(self._der_packer, [self._der_content()])
 
     def _der_format(self):
         """Format the current ASN1Atom using DER notation,
@@ -496,9 +1170,20 @@ class ASN1Atom(ASN1Object):
         """
         return self._bindata[self._offset]
 
+    def _der_clean(self):
+        # An absent value stays absent until set() is called
+        return self._der is not None or self._value is None
+
+    def _der_content(self):
+        if self._der is not None:
+            return self._der
+        return self._der_format()
+
 
 class ASN1Boolean(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_BOOLEAN) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_BOOLEAN, DER_PACK_END]))
 
     def __str__(self):
         if self.get():
@@ -511,7 +1196,9 @@ class ASN1Boolean(ASN1Atom):
 
 
 class ASN1Integer(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_INTEGER) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END]))
 
     def get(self):
         val = super(ASN1Integer, self).get()
@@ -535,37 +1222,47 @@ class ASN1Integer(ASN1Atom):
 
 
 class ASN1BitString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_BITSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_BITSTRING, DER_PACK_END]))
 
     def test(self, bit):
         return bit in self._bindata[self._offset]
 
     def set(self, bit):
         self._bindata[self._offset].add(bit)
+        self._der = None
 
     def clear(self, bit):
         self._bindata[self._offset].remove(bit)
+        self._der = None
 
     def _der_format(self):
         return primitive.der_format_BITSTRING(self.get())
 
 
 class ASN1OctetString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_OCTETSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_OCTETSTRING, DER_PACK_END]))
 
 
 class ASN1Null(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_NULL) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_NULL, DER_PACK_END]))
 
     def __str__(self):
         return 'NULL'
 
 
 class ASN1OID(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_OID) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_OID, DER_PACK_END]))
 
     def __str__(self):
-        oidstr = primitive.der_parse_OID(self.get())
+        oidstr = self.get()
         return '{ ' + oidstr.replace('.', ' ') + ' }'
 
     def _der_format(self):
@@ -573,105 +1270,125 @@ class ASN1OID(ASN1Atom):
 
 
 class ASN1Real(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_REAL) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_REAL, DER_PACK_END]))
 
     def _der_format(self):
         return primitive.der_format_REAL(self.get())
 
 
 class ASN1Enumerated(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_ENUMERATED) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_ENUMERATED, DER_PACK_END]))
 
     def _der_format(self):
         return primitive.der_format_INTEGER(self.get())
 
 
 class ASN1UTF8String(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_UTF8STRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_UTF8STRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1RelativeOID(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_RELATIVE_OID) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_RELATIVE_OID, DER_PACK_END]))
 
     def _der_format(self):
         return primitive.der_format_RELATIVE_OID(self.get())
 
 
 class ASN1NumericString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_NUMERICSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_NUMERICSTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1PrintableString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_PRINTABLESTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_PRINTABLESTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1TeletexString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_TELETEXSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_TELETEXSTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1VideotexString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_VIDEOTEXSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_VIDEOTEXSTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1IA5String(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_IA5STRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_IA5STRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1UTCTime(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_UTCTIME) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_UTCTIME, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self._der_format() + '"'
+            retval = '"' + _printable(self._der_format()) + '"'
         else:
             retval = 'None'
         return retval
@@ -681,12 +1398,14 @@ class ASN1UTCTime(ASN1Atom):
 
 
 class ASN1GeneralizedTime(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_GENERALIZEDTIME) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_GENERALIZEDTIME, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self._der_format() + '"'
+            retval = '"' + _printable(self._der_format()) + '"'
         else:
             retval = 'None'
         return retval
@@ -696,46 +1415,56 @@ class ASN1GeneralizedTime(ASN1Atom):
 
 
 class ASN1GraphicString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_GRAPHICSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_GRAPHICSTRING, DER_PACK_END]))
 
 
 class ASN1VisibleString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_VISIBLESTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_VISIBLESTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1GeneralString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_GENERALSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_GENERALSTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1UniversalString(ASN1Atom):
-    _der_packer = chr(DER_PACK_STORE | DER_TAG_UNIVERSALSTRING) + chr(DER_PACK_END)
+    __slots__ = ()
+
+    _der_packer = bytes(bytearray([DER_PACK_STORE | DER_TAG_UNIVERSALSTRING, DER_PACK_END]))
 
     def __str__(self):
         retval = self.get()
         if retval:
-            retval = '"' + self.get() + '"'
+            retval = '"' + _printable(self.get()) + '"'
         else:
             retval = 'None'
         return retval
 
 
 class ASN1Any(ASN1Atom):
+    __slots__ = ('_class',)
+
     def __init_bindata__(self):
         """The object has been setup with structural information in
            _der_packer and _recipe, as well as instance data in
@@ -749,9 +1478,10 @@ class ASN1Any(ASN1Atom):
            against -- so all validating parsing remains to be done.
         """
         self._value = self._bindata[self._offset]
+        self._der = self._value
+        self._class = None
 
-    _der_packer = chr(DER_PACK_ANY) + chr(DER_PACK_END)
-    _class = None
+    _der_packer = bytes(bytearray([DER_PACK_ANY, DER_PACK_END]))
 
     def set(self, val):
         """You cannot set the value of an ANY type object.  You may
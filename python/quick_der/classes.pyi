@@ -3,12 +3,24 @@
 # NOTE: This dynamically typed stub was automatically generated by stubgen.
 
 from quick_der.packstx import *
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
+
+def der_compile(der_packer: bytes) -> Any: ...
+def der_unpack_batch(der_packer: bytes, records: Any) -> Any: ...
 
 class ASN1Object:
-    def __init__(self, derblob: Optional[Any] = ..., bindata: Optional[Any] = ..., offset: int = ..., der_packer: Optional[Any] = ..., recipe: Optional[Any] = ..., context: Optional[Any] = ...) -> None: ...
+    def __new__(cls, derblob: Optional[Any] = ..., bindata: Optional[Any] = ..., offset: int = ..., der_packer: Optional[Any] = ..., recipe: Optional[Any] = ..., context: Optional[Any] = ..., lazy: Optional[bool] = ...) -> Any: ...
+    def __init__(self, derblob: Optional[Any] = ..., bindata: Optional[Any] = ..., offset: int = ..., der_packer: Optional[Any] = ..., recipe: Optional[Any] = ..., context: Optional[Any] = ..., lazy: Optional[bool] = ...) -> None: ...
     def __init_bindata__(self): ...
 
+class ASN1FieldIndex:
+    def __init__(self, index: int) -> None: ...
+    def __get__(self, obj, cls: Optional[Any] = ...): ...
+
+class ASN1FieldObject:
+    def __init__(self, name: str) -> None: ...
+    def __get__(self, obj, cls: Optional[Any] = ...): ...
+
 class ASN1ConstructedType(ASN1Object):
     def __init_bindata__(self): ...
     def __setattr__(self, name, val): ...
@@ -21,6 +33,13 @@ class ASN1SequenceOf(ASN1Object, list):
 class ASN1SetOf(ASN1Object, set):
     def __init_bindata__(self): ...
 
+class ASN1LazySequenceOf(ASN1Object, Sequence):
+    def __init_bindata__(self): ...
+    def __len__(self) -> int: ...
+    def __getitem__(self, idx): ...
+
+class ASN1LazySetOf(ASN1LazySequenceOf): ...
+
 class ASN1Atom(ASN1Object):
     def __init_bindata__(self): ...
     def get(self): ...
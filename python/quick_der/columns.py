@@ -0,0 +1,172 @@
+# columns.py -- Decode a batch of records into columns
+#
+# Analytics over many records of the same type, such as the entries of
+# a CRL or the SingleResponse values of OCSP responses, look at a few
+# fields of every record.  Rather than building an object per record,
+# the batch is unpacked into the flat table of der_unpack_batch(), which
+# holds the offset and length of every cursor of the type's _der_packer
+# in every record.  A column is the stride through that table for one
+# cursor.  Integers and times in a column are converted by the C
+# extension into arrays of native 64-bit values, which can be filtered
+# and aggregated with array operations.
+#
+# The columns are memoryviews under Python 3.
+
+
+import six
+
+import _quickder
+
+from quick_der import builder
+from quick_der.classes import der_compile
+from quick_der.packstx import *
+from quick_der.projection import _path_recipe
+from quick_der.walk import _follow_typtr, _packer_elements
+
+
+def _cursor_elements(elements, leaves, choices):
+    """Collect the tag stored by each cursor of a list of elements in
+       leaves, and the cursor ranges of the CHOICE elements in choices.
+    """
+    for (cmd, optional, first, last, children) in elements:
+        if children is None:
+            leaves[first] = cmd
+        else:
+            if cmd == DER_PACK_CHOICE_BEGIN:
+                choices.append((first, last))
+            _cursor_elements(children, leaves, choices)
+
+
+def _int64s(column):
+    """Return a bytearray of native 64-bit integers as a memoryview with
+       format 'q' under Python 3, like der_unpack_batch().
+    """
+    if six.PY3:
+        column = memoryview(column).cast('q')
+    return column
+
+
+class DERColumns(object):
+    """The records of a batch, all of the generated ASN1Object subclass
+       cls, unpacked into columns.  The records are either one buffer
+       holding back-to-back DER records, or a sequence of buffers that
+       each hold one record.
+
+       When a dotted path is given, it names a SEQUENCE OF or SET OF
+       field in cls, and the records are its elements.  This is how the
+       entries of one CRL are passed, for instance as the contents of the
+       field that der_project() gives for the path.
+
+       Columns are addressed by a cursor index of the _der_packer of the
+       records, or by a dotted path from the record type to a field that
+       der_unpack() stores.  A path may also end in a CHOICE of such
+       fields, such as a Time, to combine its alternatives.
+    """
+
+    def __init__(self, cls, records, path=None):
+        (der_packer, recipe, context) = (cls._der_packer, cls._recipe, cls._context)
+        if path is not None:
+            names = [name for name in path.split('.') if name != '']
+            (recipe, context, ofs) = _path_recipe(recipe, context, names)
+            if type(recipe) != tuple or recipe[0] not in ['_SEQOF', '_SETOF']:
+                raise ValueError('Path ' + path + ' does not end in a SEQUENCE OF or SET OF')
+            (_STHOF, allidx, der_packer, subnum, recipe) = recipe
+            if type(der_packer) == list:
+                der_packer = builder._link_packer(context, der_packer)
+        self._recipe = recipe
+        self._context = context
+        (elements, _, self.numcursori) = _packer_elements(der_packer)
+        self._tags = {}
+        self._choices = []
+        _cursor_elements(elements, self._tags, self._choices)
+        self.records = records
+        self._table = der_compile(der_packer).unpack_batch(records)
+        self.table = _int64s(self._table)
+        self._numrecords = len(self._table) // (16 * self.numcursori)
+
+    def __len__(self):
+        return self._numrecords
+
+    def _cursori(self, column):
+        """Return the cursor indexes that make up a column."""
+        if isinstance(column, six.integer_types):
+            if not 0 <= column < self.numcursori:
+                raise IndexError('Cursor index out of range')
+            return [column]
+        names = [name for name in column.split('.') if name != '']
+        (recipe, context, ofs) = _path_recipe(self._recipe, self._context, names)
+        if type(recipe) == int:
+            return [ofs + recipe]
+        if type(recipe) == tuple and recipe[0] == '_NAMED':
+            fields = [_follow_typtr(fldrcp, context, ofs) for fldrcp in recipe[1].values()]
+            cursori = [fldofs + fldrcp for (fldrcp, _, fldofs) in fields if type(fldrcp) == int]
+            if cursori and len(cursori) == len(fields):
+                for (first, last) in self._choices:
+                    if first <= min(cursori) and max(cursori) < last:
+                        return sorted(cursori)
+        raise ValueError('Column ' + column + ' is not a field or a CHOICE of fields')
+
+    def cursor(self, column):
+        """Return the cursor index of a column, given as a cursor index
+           or a dotted path.
+        """
+        cursori = self._cursori(column)
+        if len(cursori) > 1:
+            raise ValueError('Column ' + column + ' is a CHOICE of several cursors')
+        return cursori[0]
+
+    def offsets(self, column):
+        """Return the offsets of a column in each record, or -1 where
+           the value is absent.  Offsets count from the start of the
+           concatenated records, or from the start of each record.
+        """
+        crs = self.cursor(column)
+        return self.table[2 * crs::2 * self.numcursori]
+
+    def lengths(self, column):
+        """Return the lengths of the values of a column in each record."""
+        crs = self.cursor(column)
+        return self.table[2 * crs + 1::2 * self.numcursori]
+
+    def values(self, column):
+        """Return a list with the contents of a column in each record,
+           or None where the value is absent.
+        """
+        if isinstance(self.records, (six.binary_type, bytearray, memoryview)):
+            records = [self.records] * len(self)
+        else:
+            records = self.records
+        return [None if ofs < 0 else record[ofs:ofs + length]
+                for (record, ofs, length) in zip(records, self.offsets(column), self.lengths(column))]
+
+    def _convert(self, column, tags, default, missing):
+        """Convert the values of a column in the C extension, where the
+           tag of each cursor must be one of tags or is replaced by the
+           default.
+        """
+        alternatives = []
+        for crs in self._cursori(column):
+            tag = self._tags[crs]
+            if tag not in tags:
+                if default is None:
+                    raise ValueError('Column ' + str(column) + ' does not hold a value of this type')
+                tag = default
+            alternatives.append((crs, tag))
+        return _int64s(_quickder.der_column(self.records, self._table, self.numcursori, alternatives, missing))
+
+    def integers(self, column, missing=0):
+        """Return the INTEGER, ENUMERATED or BOOLEAN values of a column,
+           as native 64-bit integers, with missing where the value is
+           absent.  Values with another tag, such as implicitly tagged
+           fields, are taken to be INTEGER.  Values that do not fit in
+           64 bits raise an OverflowError.
+        """
+        return self._convert(column, (DER_TAG_INTEGER, DER_TAG_ENUMERATED, DER_TAG_BOOLEAN),
+                             DER_TAG_INTEGER, missing)
+
+    def epochs(self, column, missing=0):
+        """Return the UTCTime or GeneralizedTime values of a column as
+           seconds since the epoch, with missing where the value is absent.
+           Fractional seconds are dropped.
+        """
+        return self._convert(column, (DER_TAG_UTCTIME, DER_TAG_GENERALIZEDTIME), None, missing)
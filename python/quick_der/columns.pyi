@@ -0,0 +1,16 @@
+# Stubs for quick_der.columns (Python 3.6)
+
+from typing import Any, List, Optional, Union
+
+class DERColumns:
+    numcursori: int
+    records: Any
+    table: Any
+    def __init__(self, cls, records, path: Optional[str] = ...) -> None: ...
+    def __len__(self) -> int: ...
+    def cursor(self, column: Union[int, str]) -> int: ...
+    def offsets(self, column: Union[int, str]) -> Any: ...
+    def lengths(self, column: Union[int, str]) -> Any: ...
+    def values(self, column: Union[int, str]) -> List[Optional[Any]]: ...
+    def integers(self, column: Union[int, str], missing: int = ...) -> Any: ...
+    def epochs(self, column: Union[int, str], missing: int = ...) -> Any: ...
@@ -7,9 +7,11 @@
 # For primitive operations, such as on INTEGER and BOOLEAN, see primitive.py
 
 
-import _quickder
+import datetime
 import time
 
+import six
+
 from quick_der import classes
 from quick_der import packstx
 from quick_der import primitive
@@ -33,9 +35,15 @@ _hintmap_int = {
 _hintmap_unicode = {
     'no_hint': (None, _hintmap_needs_hint),
     'UTF8': (packstx.DER_TAG_UTF8STRING, primitive.der_format_STRING),
+    'IA5': (packstx.DER_TAG_IA5STRING, primitive.der_format_STRING),
+    'ASCII': (packstx.DER_TAG_IA5STRING, primitive.der_format_STRING),
     'OCTET': (packstx.DER_TAG_OCTETSTRING, primitive.der_format_STRING),
     'GENERALIZED': (packstx.DER_TAG_GENERALSTRING, primitive.der_format_STRING),
     'GENERAL': (packstx.DER_TAG_GENERALSTRING, primitive.der_format_STRING),
+    'PRINTABLE': (packstx.DER_TAG_PRINTABLESTRING, primitive.der_format_STRING),
+    'OID': (packstx.DER_TAG_OID, primitive.der_format_OID),
+    'RELATIVE_OID': (packstx.DER_TAG_RELATIVEOID, primitive.der_format_RELATIVE_OID),
+    'RELATIVEOID': (packstx.DER_TAG_RELATIVEOID, primitive.der_format_RELATIVE_OID),
 }
 
 _hintmap_str = {
@@ -71,21 +79,24 @@ def _der_hintmapping(tp, hint='no_hint'):
       - a suitable tag for a prefixed head
 
     The tuple found in hints maps or constructed locally is returned as-is.
+    Binary strings map through _hintmap_str, text strings through
+    _hintmap_unicode; this is str and unicode under Python 2, but
+    bytes and str under Python 3.
     """
-    if tp == int or tp == long:
+    if tp in six.integer_types:
         return _hintmap_int[hint]
-    elif tp == unicode:
+    elif tp == six.text_type:
         return _hintmap_unicode[hint]
-    elif tp == str:
+    elif tp == six.binary_type:
         return _hintmap_str[hint]
     elif tp == bool:
         return packstx.DER_TAG_BOOLEAN, primitive.der_format_BOOLEAN
-    elif tp == time.struct_time:
+    elif tp in (time.struct_time, datetime.datetime):
         return _hintmap_time[hint]
     elif tp == float:
         return packstx.DER_TAG_REAL, primitive.der_format_REAL
     elif issubclass(tp, classes.ASN1Object):
-        return tp._der_packer[0], lambda v: v._der_format()
+        return six.indexbytes(tp._der_packer, 0), lambda v: v._der_format()
     else:
         raise Exception('Not able to map ' + str(tp) + ' value to DER')
 
@@ -109,7 +120,7 @@ def der_pack(value, hint='no_hint', der_packer=None, cls=None):
             raise Exception('der_pack(...,der_packer=...,cls=...) is ambiguous')
         if hint != 'no_hint':
             raise Exception('der_pack(...,der_packer=...,hint=...) is ambiguous')
-        return _quickder.der_pack(der_packer, value)
+        return classes.der_compile(der_packer).pack(value)
     elif cls is not None:
         if not issubclass(cls, classes.ASN1Object):
             raise Exception('der_pack(value,cls=...) requires cls to be a subclass of ASN1Object')
@@ -117,7 +128,7 @@ def der_pack(value, hint='no_hint', der_packer=None, cls=None):
             value = [value]
         if hint != 'no_hint':
             raise Exception('der_pack(...,cls=...,hint=...) is ambiguous')
-        return _quickder.der_pack(cls._der_packer, value)
+        return classes.der_compile(cls._der_packer).pack(value)
     elif isinstance(value, classes.ASN1Object):
         return value._der_pack()
     else:
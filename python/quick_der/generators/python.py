@@ -1,3 +1,5 @@
+import keyword
+
 from asn1ate.sema import DefinedType, SimpleType, BitStringType, ValueListType, NamedType, TaggedType, ChoiceType, \
     SequenceType, SetType, SequenceOfType, SetOfType, dependency_sort, ValueAssignment, NameForm, NumberForm, \
     NameAndNumberForm, TypeAssignment, TagImplicitness, ExtensionMarker, ComponentType
@@ -141,13 +143,14 @@ class QuickDER2py(QuickDERgeneric):
         retc = []
         for oidcompo in valnode.components:
             if type(oidcompo) == NameForm:
-                retc.append(api_prefix + '.der_parse_OID (' + tosym(oidcompo.name) + '.get())')
+                retc.append(tosym(oidcompo.name) + '.get()')
             elif type(oidcompo) == NumberForm:
                 retc.append("'" + str(oidcompo.value) + "'")
             elif type(oidcompo) == NameAndNumberForm:
                 retc.append("'" + str(oidcompo.number) + "'")
         retval = " + '.' + ".join(retc)
-        retval = api_prefix + '.der_format_OID (' + retval.replace("' + '", '') + ')'
+        # Seed the OID caches with the values defined in the module
+        retval = api_prefix + '.der_seed_OID (' + retval.replace("' + '", '') + ')'
         return retval
 
     def generate_classes(self):
@@ -165,14 +168,14 @@ class QuickDER2py(QuickDERgeneric):
     def pygenTypeAssignment(self, node):
 
         def pymap_packer(pck, ln='\n        '):
-            retval = '(' + ln
+            retval = 'bytes(bytearray([' + ln
             pck = pck + ['DER_PACK_END']
             comma = ''
             for pcke in pck:
                 pcke = pcke.replace('DER_', api_prefix + '.DER_')
-                retval += comma + 'chr(' + pcke + ')'
-                comma = ' +' + ln
-            retval += ' )'
+                retval += comma + pcke
+                comma = ',' + ln
+            retval += ' ]))'
             return retval
 
         def pymap_recipe(recp, ctxofs, ln='\n    '):
@@ -212,29 +215,38 @@ class QuickDER2py(QuickDERgeneric):
             # TODO# Sometimes, ASN1Atom may have a specific supertp
             supertp = tosym(tp)
             self.writeln('class ' + clsnm + ' (' + supertp + '):')
+            # Instances only hold the slots of their supertp
+            self.writeln('    __slots__ = ()')
             atom = type(recp) == int
             subatom = atom and tp != 'ASN1Atom'
-            said_sth = False
             if tp not in ['ASN1SequenceOf', 'ASN1SetOf'] and not subatom:
                 self.writeln('    _der_packer = ' + pymap_packer(pck))
-                said_sth = True
             if not atom:
                 self.writeln('    _recipe = ' + pymap_recipe(recp, ctxofs))
-                said_sth = True
             if False:
                 # TODO# Always fixed or computed
                 self.writeln('    _numcursori = ' + str(numcrs))
-                said_sth = True
             if not atom:
                 self.writeln('    _context = globals ()')
                 self.writeln('    _numcursori = ' + str(numcrs))
-                said_sth = True
             elif subatom:
                 self.writeln('    _context = ' + api_prefix + '.__dict__')
-            if not said_sth:
-                self.writeln('    pass')
+            if not atom and recp[0] == '_NAMED':
+                pygen_fields(recp, ctxofs)
             self.writeln()
 
+        def pygen_fields(recp, ctxofs):
+            # Descriptors read fields without passing through __getattr__
+            (_NAMED, map_) = recp
+            for (fld, fldrcp) in map_.items():
+                fldnm = tosym(fld)
+                if fldnm[:1] == '_' or keyword.iskeyword(fldnm):
+                    continue
+                if type(fldrcp) == int:
+                    self.writeln('    ' + fldnm + ' = ' + api_prefix + '.ASN1FieldIndex (' + str(fldrcp + ctxofs) + ')')
+                elif fldrcp[0] != '_TYPTR' or fldrcp[1][0] not in ['ASN1Atom', api_prefix + '.ASN1Atom']:
+                    self.writeln('    ' + fldnm + ' = ' + api_prefix + '.ASN1FieldObject (' + repr(fldnm) + ')')
+
         #
         # body of pygenTypeAssignment
         #
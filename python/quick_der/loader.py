@@ -0,0 +1,174 @@
+# loader.py -- Decode the DER elements in large files without copying
+#
+# Dumps of certificate transparency logs and archives of CRLs hold many
+# DER elements back to back, and may be far larger than memory.  The
+# files are memory-mapped in windows of der_map_window bytes, and each
+# element is returned as a memoryview into its window.  Decoded objects
+# get their cursors as views as well, so they share the mapped memory.
+# A window is unmapped when nothing refers into it anymore, so memory
+# use depends on the window size and on the objects that are kept, not
+# on the size of the file.
+#
+# PEM files are recognised by their "-----BEGIN" line.  Their contents
+# need to be decoded from base64, which is done for one block at a time.
+#
+# Memory-mapped files do not offer memoryviews under Python 2, so this
+# needs Python 3.
+
+
+import binascii
+import mmap
+import os
+import re
+
+import _quickder
+
+from quick_der.classes import der_compile
+from quick_der.stream import _element_length, _header_length, der_stream_maxsize
+
+
+# The number of bytes mapped at a time, unless an element needs more
+der_map_window = 64 * 1024 * 1024
+
+
+_pem_block = re.compile(br'-----BEGIN ([^-\r\n]*)-----[^\n]*\n(.*?)-----END \1-----', re.DOTALL)
+
+
+def _map_window(fileobj, end, start, length):
+    """Map at least length bytes of the file from offset start, or up
+       to offset end.  The mapping starts at a multiple of the allocation
+       granularity, so it is returned as a memoryview with the offset
+       in the file at which it starts.
+    """
+    base = start - start % mmap.ALLOCATIONGRANULARITY
+    length = min(start - base + length, end - base)
+    mapping = mmap.mmap(fileobj.fileno(), length, access=mmap.ACCESS_READ, offset=base)
+    if hasattr(mapping, 'madvise'):
+        mapping.madvise(mmap.MADV_SEQUENTIAL)
+    return (memoryview(mapping), base)
+
+
+def _der_elements(fileobj, start, end, maxsize, window):
+    """Iterate over the back-to-back DER elements in a file, from offset
+       start up to end, as pairs of an offset and an element.
+    """
+    need = window
+    while start < end:
+        (view, base) = _map_window(fileobj, end, start, need)
+        pos = start - base
+        short = None
+        while pos < len(view):
+            hlen = _header_length(view[pos:pos + 2])
+            if hlen is None or pos + hlen > len(view):
+                short = 10
+                break
+            elmlen = _element_length(view[pos:pos + hlen], maxsize)
+            if pos + elmlen > len(view):
+                short = elmlen
+                break
+            yield (base + pos, view[pos:pos + elmlen])
+            pos += elmlen
+        if short is not None and base + len(view) == end:
+            raise ValueError('DER file ends in an incomplete element of %d bytes' % (len(view) - pos))
+        # Map the next window from the first element that did not fit,
+        # and make it large enough if that element is larger than a window
+        if base + pos == start:
+            need = max(short, need)
+        else:
+            need = window
+        start = base + pos
+
+
+def _pem_elements(fileobj, start, end, maxsize, window):
+    """Iterate over the DER elements in the PEM blocks of a file, from
+       offset start up to end, as pairs of the offset of their block and
+       an element.
+    """
+    need = window
+    while start < end:
+        (view, base) = _map_window(fileobj, end, start, need)
+        pos = start - base
+        while True:
+            block = _pem_block.search(view, pos)
+            if block is None:
+                break
+            derblob = binascii.a2b_base64(view[block.start(2):block.end(2)])
+            if len(derblob) > maxsize:
+                raise ValueError('PEM block of %d bytes exceeds the maximum of %d' % (len(derblob), maxsize))
+            for elem in _quickder.der_iterate(derblob, _quickder.UNPACK_VIEW):
+                yield (base + block.start(), elem)
+            pos = block.end()
+        if base + len(view) == end:
+            break
+        # Continue from the block that may have been cut off, or keep
+        # the tail in which its BEGIN line may start
+        begin = view.obj.find(b'-----BEGIN', pos)
+        if begin < 0:
+            begin = max(pos, len(view) - len(b'-----BEGIN'))
+        if base + begin == start:
+            # The block does not fit; base64 takes 4 bytes for every 3
+            if need > 2 * maxsize + mmap.ALLOCATIONGRANULARITY:
+                raise ValueError('PEM block exceeds the maximum of %d bytes' % maxsize)
+            need *= 2
+        else:
+            need = window
+        start = base + begin
+
+
+def _paths(path):
+    """Return the file names under path in a stable order."""
+    if not os.path.isdir(path):
+        return [path]
+    paths = []
+    for (dirpath, dirnames, filenames) in os.walk(path):
+        dirnames.sort()
+        paths.extend([os.path.join(dirpath, name) for name in sorted(filenames)])
+    return paths
+
+
+def _file_elements(filename, pem, maxsize, window, start=0, end=None):
+    """Iterate over the elements in a file, or in the part of it from
+       offset start up to end, as pairs of an offset and an element.
+       PEM is recognised at the start of the file when pem is None.
+    """
+    with open(filename, 'rb') as fileobj:
+        if end is None:
+            end = os.fstat(fileobj.fileno()).st_size
+        if pem is None:
+            pem = fileobj.read(64).lstrip().startswith(b'-----BEGIN')
+        if pem:
+            elements = _pem_elements(fileobj, start, end, maxsize, window)
+        else:
+            elements = _der_elements(fileobj, start, end, maxsize, window)
+        for elem in elements:
+            yield elem
+
+
+def der_map(path, pem=None, maxsize=None, window=None):
+    """Iterate over the DER elements in a file, or in all the files in
+       and under a directory.  The elements are memoryviews that share
+       the memory of the mapped file; they can be passed as the derblob
+       of a generated class, but der_load() does that without copying.
+
+       Files are mapped in windows of der_map_window bytes, unless a
+       window is given.  Elements larger than maxsize are refused with
+       a ValueError, as with a DERFramer.  PEM files are recognised when
+       pem is None, or else pem tells if the files are PEM.
+    """
+    maxsize = der_stream_maxsize if maxsize is None else maxsize
+    window = der_map_window if window is None else window
+    for filename in _paths(path):
+        for (offset, elem) in _file_elements(filename, pem, maxsize, window):
+            yield elem
+
+
+def der_load(cls, path, pem=None, maxsize=None, window=None, lazy=None):
+    """Iterate over the objects of the generated class cls that are
+       stored in a file, or in all the files in and under a directory.
+       Their binary data refers into the mapped file, so the file is
+       not copied into memory; see der_map() for the other arguments.
+       With lazy=True, only the fields that are accessed are built.
+    """
+    packer = der_compile(cls._der_packer)
+    for elem in der_map(path, pem, maxsize, window):
+        yield cls(bindata=packer.unpack(elem, _quickder.UNPACK_VIEW), lazy=lazy)
@@ -0,0 +1,12 @@
+# Stubs for quick_der.loader (Python 3.6)
+
+from typing import Iterator, Optional, Type, TypeVar
+
+from quick_der.classes import ASN1Object
+
+_T = TypeVar('_T', bound=ASN1Object)
+
+der_map_window: int
+
+def der_map(path: str, pem: Optional[bool] = ..., maxsize: Optional[int] = ..., window: Optional[int] = ...) -> Iterator[memoryview]: ...
+def der_load(cls: Type[_T], path: str, pem: Optional[bool] = ..., maxsize: Optional[int] = ..., window: Optional[int] = ..., lazy: Optional[bool] = ...) -> Iterator[_T]: ...
@@ -14,6 +14,15 @@ DER_PACK_ENTER = 0x20
 DER_PACK_STORE = 0x00
 DER_PACK_MATCHBITS = (~ (DER_PACK_ENTER | DER_PACK_STORE))
 
+# Special markers and flags for der_walk paths
+DER_WALK_END = 0x00
+DER_WALK_OPTIONAL = 0x3f
+DER_WALK_CHOICE = 0x1f
+DER_WALK_ANY = 0x1f
+DER_WALK_ENTER = 0x20
+DER_WALK_SKIP = 0x00
+DER_WALK_MATCHBITS = (~ (DER_WALK_ENTER | DER_WALK_SKIP))
+
 # Universal tags and macros for application, contextual, private tags
 DER_TAG_BOOLEAN = 0x01
 DER_TAG_INTEGER = 0x02
@@ -13,6 +13,13 @@ DER_PACK_ANY: int
 DER_PACK_ENTER: int
 DER_PACK_STORE: int
 DER_PACK_MATCHBITS: Any
+DER_WALK_END: int
+DER_WALK_OPTIONAL: int
+DER_WALK_CHOICE: int
+DER_WALK_ANY: int
+DER_WALK_ENTER: int
+DER_WALK_SKIP: int
+DER_WALK_MATCHBITS: Any
 DER_TAG_BOOLEAN: int
 DER_TAG_INTEGER: int
 DER_TAG_BITSTRING: int
@@ -0,0 +1,101 @@
+# parallel.py -- Decode large collections of DER data in worker processes
+#
+# Building objects of the generated classes is done in Python, so decoding
+# a million certificates keeps a single core busy.  der_load_parallel()
+# spreads the work over a pool of processes.  The files are split into
+# shards at element boundaries, and a worker is only told the file name
+# and the range of a shard, which it maps with quick_der.loader.  It then
+# decodes the elements and applies a projection that picks out the data
+# of interest, so only those results travel back to the caller, never
+# the DER data or the decoded objects.
+
+
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+import _quickder
+
+from quick_der.classes import ASN1Atom, ASN1Object, der_compile
+from quick_der.loader import _file_elements, _paths, der_map_window
+from quick_der.stream import der_stream_maxsize
+
+
+# The number of bytes in the shards that are handed to a worker
+der_shard_size = 4 * 1024 * 1024
+
+
+def _compact(value):
+    """Return the value in a form that can be pickled and is small.
+       Memoryviews turn into bytes, objects of the generated classes
+       into their DER bytes, and atoms into their value.
+    """
+    if isinstance(value, memoryview):
+        return value.tobytes()
+    elif isinstance(value, ASN1Atom):
+        return _compact(value.get())
+    elif isinstance(value, ASN1Object):
+        return value._der_pack()
+    elif type(value) in (tuple, list):
+        return type(value)([_compact(val) for val in value])
+    return value
+
+
+def _shards(paths, pem, maxsize, shard_size):
+    """Iterate over (filename, start, end) for shards of about shard_size
+       bytes, starting at element boundaries.
+    """
+    for filename in paths:
+        start = None
+        for (offset, elem) in _file_elements(filename, pem, maxsize, der_map_window):
+            if start is None:
+                start = offset
+            elif offset - start >= shard_size:
+                yield (filename, start, offset)
+                start = offset
+        if start is not None:
+            yield (filename, start, None)
+
+
+def _load_shard(cls, projection, lazy, pem, maxsize, shard):
+    """Decode the elements in a shard and return their projections."""
+    (filename, start, end) = shard
+    packer = der_compile(cls._der_packer)
+    results = []
+    for (offset, elem) in _file_elements(filename, pem, maxsize, der_map_window, start, end):
+        obj = cls(bindata=packer.unpack(elem, _quickder.UNPACK_VIEW), lazy=lazy)
+        results.append(_compact(projection(obj)))
+    return results
+
+
+def der_load_parallel(cls, path, projection, workers=None, pem=None, maxsize=None, shard_size=None, lazy=True,
+                      executor=None):
+    """Iterate over the projections of the objects of the generated class
+       cls that are stored in a file, or in all the files in and under a
+       directory, in the order in which they are stored.
+
+       The projection is called with each object in a worker process, so
+       it must be a function that can be pickled, such as one defined at
+       the top level of a module.  It returns the data of interest, for
+       instance a tuple of fields.  The results are made compact before
+       they are returned: memoryviews become bytes, atoms their value,
+       and other objects their DER bytes.
+
+       A ProcessPoolExecutor with the given number of workers, by default
+       one per core, is used unless an executor is passed.  The files are
+       split into shards of about shard_size bytes, default der_shard_size.
+       The objects are lazy unless lazy is False, so a projection builds
+       only the fields that it accesses.  See der_map() for pem and maxsize.
+    """
+    maxsize = der_stream_maxsize if maxsize is None else maxsize
+    shard_size = der_shard_size if shard_size is None else shard_size
+    shards = _shards(_paths(path), pem, maxsize, shard_size)
+    load = functools.partial(_load_shard, cls, projection, lazy, pem, maxsize)
+    if executor is None:
+        with ProcessPoolExecutor(workers) as pool:
+            for results in pool.map(load, shards):
+                for result in results:
+                    yield result
+    else:
+        for results in executor.map(load, shards):
+            for result in results:
+                yield result
@@ -0,0 +1,12 @@
+# Stubs for quick_der.parallel (Python 3.6)
+
+from concurrent.futures import Executor
+from typing import Any, Callable, Iterator, Optional, Type, TypeVar
+
+from quick_der.classes import ASN1Object
+
+_T = TypeVar('_T', bound=ASN1Object)
+
+der_shard_size: int
+
+def der_load_parallel(cls: Type[_T], path: str, projection: Callable[[_T], Any], workers: Optional[int] = ..., pem: Optional[bool] = ..., maxsize: Optional[int] = ..., shard_size: Optional[int] = ..., lazy: bool = ..., executor: Optional[Executor] = ...) -> Iterator[Any]: ...
@@ -8,8 +8,11 @@
 
 
 import _quickder
+import binascii
+import datetime
 import time
 
+import six
 from six.moves import intern
 
 
@@ -22,17 +25,43 @@ from six.moves import intern
 # This is a currying function, used as: _der_prefix_head_fn (tag) (body)
 def der_prefixhead(tag, body):
     blen = len(body)
-    if blen == 0:
-        lenh = chr(0)
-    elif blen <= 127:
-        lenh = chr(blen)
+    if blen <= 127:
+        head = bytearray([tag, blen])
     else:
-        lenh = ''
+        lenh = bytearray()
         while blen > 0:
-            lenh = chr(blen % 256) + lenh
+            lenh.append(blen & 0xff)
             blen >>= 8
-        lenh = chr(0x80 + len(lenh))
-    return chr(tag) + lenh + body
+        lenh.append(0x80 + len(lenh))
+        lenh.append(tag)
+        lenh.reverse()
+        head = lenh
+    return bytes(head) + body
+
+
+# Convert between integers and big-endian bytes in linear time.  Python 2
+# lacks int.from_bytes() and int.to_bytes(), so it uses hexadecimal.
+if hasattr(int, 'from_bytes'):
+    def _int_from_bytes(derblob, signed):
+        return int.from_bytes(derblob, 'big', signed=signed)
+
+    def _int_to_bytes(ival, length, signed):
+        return ival.to_bytes(length, 'big', signed=signed)
+else:
+    def _int_from_bytes(derblob, signed):
+        if len(derblob) == 0:
+            return 0
+        ival = int(binascii.hexlify(derblob), 16)
+        if signed and six.indexbytes(derblob, 0) & 0x80:
+            ival -= 1 << (8 * len(derblob))
+        return ival
+
+    def _int_to_bytes(ival, length, signed):
+        if length == 0:
+            return b''
+        if ival < 0:
+            ival += 1 << (8 * length)
+        return binascii.unhexlify('%0*x' % (2 * length, ival))
 
 
 #
@@ -41,6 +70,8 @@ def der_prefixhead(tag, body):
 
 
 def der_format_STRING(sval):
+    if isinstance(sval, six.text_type):
+        sval = sval.encode('utf-8')
     return sval
 
 
@@ -48,24 +79,34 @@ def der_parse_STRING(derblob):
     return derblob
 
 
-def der_format_OID(oidstr, hdr=False):
+# The same OIDs recur in every certificate, so both directions of the OID
+# codec are cached.  Generated modules seed the caches with the values
+# that they define.  Other OIDs are added while the caches hold fewer
+# than oid_cachesize entries; after that, they are converted every time.
+oid_cachesize = 1024
+_oid_parsed = {}
+_oid_formatted = {}
+# Hits and misses of der_parse_OID() and der_format_OID()
+_oid_counts = [0, 0, 0, 0]
+
+
+def _format_OID(oidstr):
     oidvals = list(map(int, oidstr.split('.')))
     oidvals[1] += 40 * oidvals[0]
-    enc = ''
+    enc = bytearray()
     for oidx in range(len(oidvals) - 1, 0, -1):
         oidval = oidvals[oidx]
-        enc = chr(oidval & 0x7f) + enc
+        enc.append(oidval & 0x7f)
         while oidval > 127:
             oidval >>= 7
-            enc = chr(0x80 | (oidval & 0x7f)) + enc
-    if hdr:
-        enc = _quickder.der_pack('\x06\x00', [enc])
-    return enc
+            enc.append(0x80 | (oidval & 0x7f))
+    enc.reverse()
+    return bytes(enc)
 
 
-def der_parse_OID(derblob):
+def _parse_OID(derblob):
     oidvals = [0]
-    for byte in map(ord, derblob):
+    for byte in bytearray(derblob):
         if byte & 0x80 != 0x00:
             oidvals[-1] = (oidvals[-1] << 7) | (byte & 0x7f)
         else:
@@ -75,7 +116,67 @@ def der_parse_OID(derblob):
     snd = oidvals[0] % 40
     oidvals = [fst, snd] + oidvals[1:-1]
     retval = '.'.join(map(str, oidvals))
-    return intern(retval)
+    return intern(str(retval))
+
+
+def der_format_OID(oidstr, hdr=False):
+    if not isinstance(oidstr, str):
+        # Dotted OIDs given as bytes, or as unicode under Python 2
+        oidstr = str(oidstr.decode('ascii') if isinstance(oidstr, six.binary_type) else oidstr)
+    try:
+        enc = _oid_formatted[oidstr]
+        _oid_counts[2] += 1
+    except KeyError:
+        _oid_counts[3] += 1
+        enc = _format_OID(oidstr)
+        if len(_oid_formatted) < oid_cachesize:
+            _oid_formatted[oidstr] = enc
+    if hdr:
+        enc = _quickder.der_pack(b'\x06\x00', [enc])
+    return enc
+
+
+def der_parse_OID(derblob):
+    if not isinstance(derblob, six.binary_type):
+        # Cache keys must be hashable, unlike views and bytearrays
+        derblob = bytes(derblob)
+    try:
+        oidstr = _oid_parsed[derblob]
+        _oid_counts[0] += 1
+        return oidstr
+    except KeyError:
+        _oid_counts[1] += 1
+    oidstr = _parse_OID(derblob)
+    if len(_oid_parsed) < oid_cachesize:
+        _oid_parsed[derblob] = oidstr
+    return oidstr
+
+
+def der_seed_OID(oidstr):
+    """Add an OID to the caches of der_format_OID() and der_parse_OID(),
+       regardless of oid_cachesize, and return its DER contents.  This
+       is used by generated modules for the OID values that they define.
+    """
+    enc = _format_OID(oidstr)
+    oidstr = _parse_OID(enc)
+    _oid_formatted[oidstr] = enc
+    _oid_parsed[enc] = oidstr
+    return enc
+
+
+def der_cacheinfo_OID():
+    """Return a dictionary with the numbers of cache hits and misses of
+       der_parse_OID() and der_format_OID(), and the sizes of the caches.
+    """
+    return {
+        'parse_hits': _oid_counts[0],
+        'parse_misses': _oid_counts[1],
+        'parse_size': len(_oid_parsed),
+        'format_hits': _oid_counts[2],
+        'format_misses': _oid_counts[3],
+        'format_size': len(_oid_formatted),
+        'maxsize': oid_cachesize,
+    }
 
 
 def der_format_RELATIVE_OID(oidstr):
@@ -86,70 +187,232 @@ def der_parse_RELATIVE_OID(oidstr):
     raise NotImplementedError('der_parse_RELATIVE_OID')
 
 
-def der_format_BITSTRING(bitint):
-    return chr(0) + der_format_INTEGER(bitint)
+def der_format_BITSTRING(bitint, numbits=None):
+    # The first bit is the most significant one of the first byte.
+    # Without numbits, the value is padded with leading zero bits to a
+    # whole number of bytes; with it, unused bits end the last byte.
+    if bitint < 0:
+        raise ValueError('BITSTRING values cannot be negative')
+    if numbits is None:
+        numbits = (bitint.bit_length() + 7) & ~7
+    elif bitint.bit_length() > numbits:
+        raise ValueError('BITSTRING value does not fit in %d bits' % numbits)
+    unused = -numbits % 8
+    return six.int2byte(unused) + _int_to_bytes(bitint << unused, (numbits + 7) // 8, False)
 
 
 def der_parse_BITSTRING(derblob):
     assert len(derblob) > 0, 'BITSTRING elements cannot be empty'
-    if ord(derblob[0]) != 0:
-        raise NotImplementedError('BISTRING with more than 0 trailing bits are not implemented')
-    return der_parse_INTEGER(derblob[1:])
+    unused = six.indexbytes(derblob, 0)
+    if unused > 7 or (unused > 0 and len(derblob) == 1):
+        raise ValueError('BITSTRING with an invalid number of unused bits')
+    return _int_from_bytes(derblob[1:], False) >> unused
+
+
+# UTCTime and GeneralizedTime values have a fixed layout of digits, so
+# they are parsed by picking out the fields instead of through strptime().
+# The number of digits tells which of the optional fields are present.
+_time_digits = {2: (10, 12), 4: (10, 12, 14)}
+_days_in_month = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_epoch_naive = datetime.datetime(1970, 1, 1)
+if six.PY3:
+    _epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+else:
+    _epoch = _epoch_naive
+
+
+def _days_from_civil(year, month, day):
+    """Count the days from 1970-01-01 to a Gregorian calendar date."""
+    if month <= 2:
+        year -= 1
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+
+def _parse_TIME(derblob, yearlen):
+    """Parse the contents of a UTCTime (yearlen 2) or GeneralizedTime
+       (yearlen 4).  Returns the seconds since the epoch and a float with
+       the fraction of a second, which only a GeneralizedTime can have.
+       The time ends in Z or in an offset +hhmm or -hhmm.  A UTCTime year
+       below 50 is in the 21st century, as in RFC 5280.
+    """
+    txt = bytes(derblob)
+    if len(txt) == yearlen + 11 and txt[-1:] == b'Z' and txt[:-1].isdigit():
+        # The layout that DER prescribes, with seconds and in UTC
+        (rest, second) = divmod(int(txt[:-1]), 100)
+        (rest, minute) = divmod(rest, 100)
+        (rest, hour) = divmod(rest, 100)
+        (rest, day) = divmod(rest, 100)
+        (year, month) = divmod(rest, 100)
+        frac = 0.0
+        offset = 0
+    else:
+        digits = len(txt) - len(txt.lstrip(b'0123456789'))
+        if digits not in _time_digits[yearlen]:
+            raise ValueError('Malformed time value %r' % txt)
+        year = int(txt[:yearlen])
+        month = int(txt[yearlen:yearlen + 2])
+        day = int(txt[yearlen + 2:yearlen + 4])
+        hour = int(txt[yearlen + 4:yearlen + 6])
+        minute = int(txt[yearlen + 6:yearlen + 8]) if digits >= yearlen + 8 else 0
+        second = int(txt[yearlen + 8:yearlen + 10]) if digits >= yearlen + 10 else 0
+        frac = 0.0
+        zone = txt[digits:]
+        if digits == 14 and zone[:1] in (b'.', b','):
+            fracdigits = len(zone) - 1 - len(zone[1:].lstrip(b'0123456789'))
+            if fracdigits == 0:
+                raise ValueError('Malformed time value %r' % txt)
+            frac = float(b'0.' + zone[1:1 + fracdigits])
+            zone = zone[1 + fracdigits:]
+        if zone == b'Z':
+            offset = 0
+        elif len(zone) == 5 and zone[:1] in (b'+', b'-') and zone[1:].isdigit():
+            offset = int(zone[1:3]) * 3600 + int(zone[3:]) * 60
+            if zone[:1] == b'-':
+                offset = -offset
+            if zone[1:3] > b'23' or zone[3:] > b'59':
+                raise ValueError('Malformed time value %r' % txt)
+        else:
+            raise ValueError('Malformed time value %r' % txt)
+    if yearlen == 2:
+        year += 2000 if year < 50 else 1900
+    if not (1 <= month <= 12 and 1 <= day <= _days_in_month[month]):
+        raise ValueError('Malformed time value %r' % txt)
+    if month == 2 and day == 29 and (year % 4 != 0 or (year % 100 == 0 and year % 400 != 0)):
+        raise ValueError('Malformed time value %r' % txt)
+    if hour > 23 or minute > 59 or second > 60:
+        raise ValueError('Malformed time value %r' % txt)
+    secs = hour * 3600 + minute * 60 + second
+    return (_days_from_civil(year, month, day) * 86400 + secs - offset, frac)
+
+
+def _struct_TIME(epoch):
+    # Like time.strptime(), without DST information and also before 1970
+    return (_epoch_naive + datetime.timedelta(seconds=epoch)).timetuple()
+
+
+def _utc_datetime(tstamp):
+    # A naive datetime in UTC; an aware datetime is moved to UTC first
+    if tstamp.tzinfo is not None:
+        tstamp = (tstamp - tstamp.utcoffset()).replace(tzinfo=None)
+    return tstamp
 
 
 def der_format_UTCTIME(tstamp):
-    return time.strftime('%y%m%d%H%M%SZ', tstamp)
+    """Format the contents of a UTCTime from a struct_time or a datetime.
+       A UTCTime cannot hold a fraction of a second.
+    """
+    if not isinstance(tstamp, datetime.datetime):
+        return time.strftime('%y%m%d%H%M%SZ', tstamp).encode('ascii')
+    tstamp = _utc_datetime(tstamp)
+    if tstamp.microsecond:
+        raise ValueError('A UTCTime cannot hold a fraction of a second')
+    return ('%02d%02d%02d%02d%02d%02dZ' % (tstamp.year % 100, tstamp.month, tstamp.day,
+                                          tstamp.hour, tstamp.minute, tstamp.second)).encode('ascii')
 
 
 def der_parse_UTCTIME(derblob):
-    return time.strptime(derblob, '%y%m%d%H%M%SZ')
+    return _struct_TIME(_parse_TIME(derblob, 2)[0])
+
+
+def der_epoch_UTCTIME(derblob):
+    """Return the seconds since the epoch for the contents of a UTCTime."""
+    return _parse_TIME(derblob, 2)[0]
+
+
+def der_datetime_UTCTIME(derblob):
+    """Return a datetime in UTC for the contents of a UTCTime.  It is
+       timezone-aware under Python 3 and naive under Python 2.
+    """
+    return _epoch + datetime.timedelta(seconds=_parse_TIME(derblob, 2)[0])
+
+
+def der_epochs_UTCTIME(column):
+    """Convert a sequence with the contents of UTCTime values into seconds
+       since the epoch, in a single call into the C extension.  Under
+       Python 3 the result is a memoryview with format 'q'; Python 2
+       receives the bytearray of native 64-bit integers it is built on.
+    """
+    epochs = _quickder.der_epochs(column, 2)
+    if six.PY3:
+        epochs = memoryview(epochs).cast('q')
+    return epochs
 
 
 def der_format_GENERALIZEDTIME(tstamp):
-    # TODO# No support for fractional seconds
-    return time.strftime('%Y%m%d%H%M%SZ', tstamp)
+    """Format the contents of a GeneralizedTime from a struct_time or a
+       datetime.  The microseconds of a datetime become a fraction of a
+       second, written as DER requires without trailing zeroes, so that
+       der_datetime_GENERALIZEDTIME() returns the same moment.
+    """
+    if not isinstance(tstamp, datetime.datetime):
+        return time.strftime('%Y%m%d%H%M%SZ', tstamp).encode('ascii')
+    tstamp = _utc_datetime(tstamp)
+    txt = '%04d%02d%02d%02d%02d%02d' % (tstamp.year, tstamp.month, tstamp.day,
+                                        tstamp.hour, tstamp.minute, tstamp.second)
+    if tstamp.microsecond:
+        txt += ('.%06d' % tstamp.microsecond).rstrip('0')
+    return (txt + 'Z').encode('ascii')
 
 
 def der_parse_GENERALIZEDTIME(derblob):
-    # TODO# No support for fractional seconds
-    return time.strptime(derblob, '%Y%m%d%H%M%SZ')
+    # The struct_time has no room for the fraction of a second
+    return _struct_TIME(_parse_TIME(derblob, 4)[0])
+
+
+def der_epoch_GENERALIZEDTIME(derblob):
+    """Return the seconds since the epoch for the contents of a
+       GeneralizedTime.  This is an int, or a float if the value holds
+       a fraction of a second.
+    """
+    (epoch, frac) = _parse_TIME(derblob, 4)
+    return epoch + frac if frac else epoch
+
+
+def der_datetime_GENERALIZEDTIME(derblob):
+    """Return a datetime in UTC for the contents of a GeneralizedTime,
+       including its fraction of a second down to microseconds.  It is
+       timezone-aware under Python 3 and naive under Python 2.
+    """
+    (epoch, frac) = _parse_TIME(derblob, 4)
+    return _epoch + datetime.timedelta(seconds=epoch, microseconds=round(frac * 1000000))
+
+
+def der_epochs_GENERALIZEDTIME(column):
+    """Convert a sequence with the contents of GeneralizedTime values into
+       whole seconds since the epoch, in a single call into the C extension.
+       Fractions of a second are dropped.  The result is as for
+       der_epochs_UTCTIME().
+    """
+    epochs = _quickder.der_epochs(column, 4)
+    if six.PY3:
+        epochs = memoryview(epochs).cast('q')
+    return epochs
 
 
 def der_format_BOOLEAN(bval):
-    return '\xff' if bval else '\x00'
+    return b'\xff' if bval else b'\x00'
 
 
 def der_parse_BOOLEAN(derblob):
-    return derblob != '\x00' * len(derblob)
+    return any(bytearray(derblob))
 
 
 def der_format_INTEGER(ival, hdr=False):
-    retval = ''
-    byt = ival & 0xff
-    while ival not in [0, -1]:
-        byt = ival & 0xff
-        ival = ival >> 8
-        retval = chr(byt) + retval
-    if ival == 0:
-        if len(retval) > 0 and byt & 0x80 == 0x80:
-            retval = chr(0x00) + retval
+    # The shortest two's complement form, with at least one byte
+    if ival < 0:
+        retval = _int_to_bytes(ival, (~ival).bit_length() // 8 + 1, True)
     else:
-        if len(retval) == 0 or byt & 0x80 == 0x00:
-            retval = chr(0xff) + retval
+        retval = _int_to_bytes(ival, ival.bit_length() // 8 + 1, True)
     if hdr:
-        retval = _quickder.der_pack('\x02\x00', [retval])
+        retval = _quickder.der_pack(b'\x02\x00', [retval])
     return retval
 
 
 def der_parse_INTEGER(derblob):
-    if derblob == '':
-        return 0
-    retval = 0
-    if ord(derblob[0]) & 0x80:
-        retval = -1
-    for byt in map(ord, derblob):
-        retval = (retval << 8) + byt
-    return retval
+    return _int_from_bytes(derblob, True)
 
 
 def der_format_REAL(rval):
@@ -2,19 +2,32 @@
 #
 # NOTE: This dynamically typed stub was automatically generated by stubgen.
 
+import datetime
+from typing import Any, Dict, Optional, Sequence, Union
+
+oid_cachesize: int
+
 def der_prefixhead(tag, body): ...
 def der_format_STRING(sval): ...
 def der_parse_STRING(derblob): ...
 def der_format_OID(oidstr, hdr: bool = ...): ...
 def der_parse_OID(derblob): ...
+def der_seed_OID(oidstr: str) -> bytes: ...
+def der_cacheinfo_OID() -> Dict[str, int]: ...
 def der_format_RELATIVE_OID(oidstr): ...
 def der_parse_RELATIVE_OID(oidstr): ...
-def der_format_BITSTRING(bitint): ...
+def der_format_BITSTRING(bitint, numbits: Optional[int] = ...): ...
 def der_parse_BITSTRING(derblob): ...
 def der_format_UTCTIME(tstamp): ...
 def der_parse_UTCTIME(derblob): ...
+def der_epoch_UTCTIME(derblob) -> int: ...
+def der_datetime_UTCTIME(derblob) -> datetime.datetime: ...
+def der_epochs_UTCTIME(column: Sequence[Any]) -> Any: ...
 def der_format_GENERALIZEDTIME(tstamp): ...
 def der_parse_GENERALIZEDTIME(derblob): ...
+def der_epoch_GENERALIZEDTIME(derblob) -> Union[int, float]: ...
+def der_datetime_GENERALIZEDTIME(derblob) -> datetime.datetime: ...
+def der_epochs_GENERALIZEDTIME(column: Sequence[Any]) -> Any: ...
 def der_format_BOOLEAN(bval): ...
 def der_parse_BOOLEAN(derblob): ...
 def der_format_INTEGER(ival, hdr: bool = ...): ...
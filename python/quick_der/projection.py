@@ -0,0 +1,218 @@
+# projection.py -- Extract a set of fields from DER data into tuples
+#
+# Callers that need a few fields of many messages, such as the serial
+# number, issuer and validity of certificates, need not build the objects
+# of the generated classes.  A projection compiles a list of dotted paths
+# against the _recipe of a class into the indexes of the cursors that
+# its _der_packer stores.  Projecting a DER blob then takes one call to
+# der_unpack() in the C extension and picks those cursors.
+#
+# Paths that go through a SEQUENCE OF or SET OF continue in its elements.
+# The elements are unpacked by one more call, which is shared by all the
+# paths through the same field, and they yield a list of values.
+#
+# A path may also end in a CHOICE whose alternatives are each stored in
+# one cursor, such as a Time or a Name.  It gives the value of whichever
+# alternative is present, so callers need not name the alternatives.
+
+
+import operator
+
+import _quickder
+
+from quick_der import builder
+from quick_der.classes import der_compile
+from quick_der.packstx import *
+from quick_der.walk import _follow_typtr, _packer_elements
+
+
+def _field_recipe(recipe, context, ofs, name):
+    """Return the recipe, context and offset of a field in a recipe."""
+    (recipe, context, ofs) = _follow_typtr(recipe, context, ofs)
+    if type(recipe) != tuple or recipe[0] != '_NAMED':
+        raise ValueError('Cannot find field ' + name + ' in a type without named fields')
+    for (fldnm, fldrcp) in recipe[1].items():
+        if fldnm.replace('-', '_') == name:
+            return (fldrcp, context, ofs)
+    raise ValueError('No field ' + name + ' in path')
+
+
+def _choice_cursors(elements, choices):
+    """Collect the cursor indexes of each CHOICE in a list of elements
+       whose alternatives are each stored in a single cursor, as a tuple.
+    """
+    for (cmd, optional, first, last, children) in elements:
+        if children is not None:
+            if cmd == DER_PACK_CHOICE_BEGIN and all(child[4] is None for child in children):
+                choices.add(tuple(range(first, last)))
+            _choice_cursors(children, choices)
+
+
+def _leaf_cursor(recipe, ofs):
+    """Return the cursor index that der_unpack() stores a field in, or
+       None for a field that has fields of its own.
+    """
+    if type(recipe) == int:
+        return ofs + recipe
+    if recipe[0] in ['_SEQOF', '_SETOF']:
+        return ofs + recipe[1]
+    return None
+
+
+def _path_recipe(recipe, context, names):
+    """Return the recipe, context and offset at the end of a path that
+       does not pass through a SEQUENCE OF or SET OF.
+    """
+    ofs = 0
+    for name in names:
+        (recipe, context, ofs) = _field_recipe(recipe, context, ofs, name)
+        (recipe, context, ofs) = _follow_typtr(recipe, context, ofs)
+    return (recipe, context, ofs)
+
+
+class _Level(object):
+    """The part of a projection that picks values from the cursors of
+       one _der_packer.  Each path is either a leaf, which is a cursor
+       index, or a CHOICE of leaves, or it passes through a SEQUENCE OF
+       or SET OF, and then it is projected by the _Level of its elements.
+    """
+
+    def __init__(self, der_packer, recipe, context, paths):
+        self.size = len(paths)
+        self.leaves = []
+        self.choices = []
+        choices = set()
+        _choice_cursors(_packer_elements(der_packer)[0], choices)
+        # Map the cursor of a SEQUENCE OF or SET OF to its packer, the
+        # paths into its elements and their positions in the result
+        nested = {}
+        for (pos, names) in enumerate(paths):
+            (subrcp, subctx, ofs) = (recipe, context, 0)
+            for (depth, name) in enumerate(names):
+                (subrcp, subctx, ofs) = _field_recipe(subrcp, subctx, ofs, name)
+                (subrcp, subctx, ofs) = _follow_typtr(subrcp, subctx, ofs)
+                if type(subrcp) == int:
+                    if depth + 1 < len(names):
+                        raise ValueError('Field ' + name + ' in path has no fields')
+                    self.leaves.append((pos, ofs + subrcp))
+                elif subrcp[0] in ['_SEQOF', '_SETOF']:
+                    (_STHOF, allidx, subpck, subnum, elmrcp) = subrcp
+                    if depth + 1 == len(names):
+                        # The contents of all elements, like der_walk()
+                        self.leaves.append((pos, ofs + allidx))
+                        break
+                    if ofs + allidx not in nested:
+                        if type(subpck) == list:
+                            subpck = builder._link_packer(subctx, subpck)
+                        nested[ofs + allidx] = (subpck, elmrcp, subctx, [], [])
+                    nested[ofs + allidx][3].append(names[depth + 1:])
+                    nested[ofs + allidx][4].append(pos)
+                    break
+                elif depth + 1 == len(names):
+                    alternatives = [_follow_typtr(altrcp, subctx, ofs) for altrcp in subrcp[1].values()]
+                    cursori = [_leaf_cursor(altrcp, altofs) for (altrcp, _, altofs) in alternatives]
+                    if None in cursori or tuple(sorted(cursori)) not in choices:
+                        raise ValueError('Path ends in field ' + name + ', which has fields of its own')
+                    self.choices.append((pos, sorted(cursori)))
+        self.nested = [(idx, der_compile(subpck), _Level(subpck, elmrcp, subctx, subpaths), positions)
+                       for (idx, (subpck, elmrcp, subctx, subpaths, positions)) in sorted(nested.items())]
+        if self.nested or self.choices or len(self.leaves) == 0:
+            self.pick = None
+        else:
+            # Without nesting, a single itemgetter makes the tuple
+            self.leaves.sort()
+            self.pick = operator.itemgetter(*[idx for (pos, idx) in self.leaves])
+            if len(self.leaves) == 1:
+                self.pick = lambda crs, idx=self.leaves[0][1]: (crs[idx],)
+
+    def project(self, crs, mode):
+        """Return the values of the paths in the list of cursors crs."""
+        if self.pick is not None:
+            return self.pick(crs)
+        values = [None] * self.size
+        for (pos, idx) in self.leaves:
+            values[pos] = crs[idx]
+        for (pos, cursori) in self.choices:
+            for idx in cursori:
+                if crs[idx] is not None:
+                    values[pos] = crs[idx]
+                    break
+        for (idx, packer, level, positions) in self.nested:
+            if crs[idx] is None:
+                continue
+            rows = [level.project(elmcrs, mode) for elmcrs in packer.unpack_each(crs[idx], mode)]
+            for (subpos, pos) in enumerate(positions):
+                values[pos] = [row[subpos] for row in rows]
+        return tuple(values)
+
+
+class Projection(object):
+    """A list of dotted paths into the generated ASN1Object subclass
+       cls, compiled to pick their values from DER data; see
+       der_compile_projection().
+    """
+
+    def __init__(self, cls, paths):
+        self.cls = cls
+        self.paths = tuple(paths)
+        names = [[name for name in path.split('.') if name != ''] for path in self.paths]
+        self._packer = der_compile(cls._der_packer)
+        self._level = _Level(cls._der_packer, cls._recipe, cls._context, names)
+
+    def __call__(self, derblob, mode=_quickder.UNPACK_COPY):
+        """Return a tuple with the value of each path in derblob."""
+        if mode == _quickder.UNPACK_OFFSET and self._level.nested:
+            raise ValueError('Offsets are not available for paths through a SEQUENCE OF or SET OF')
+        return self._level.project(self._packer.unpack(derblob, mode), mode)
+
+    def rows(self, derblobs, mode=_quickder.UNPACK_COPY):
+        """Return a list with a tuple of values for each DER blob."""
+        return [self(derblob, mode) for derblob in derblobs]
+
+    def columns(self, derblobs, mode=_quickder.UNPACK_COPY):
+        """Return a tuple with a list for each path, holding its value
+           in each of the DER blobs.
+        """
+        rows = self.rows(derblobs, mode)
+        if not rows:
+            return tuple([[] for _ in self.paths])
+        return tuple([list(column) for column in zip(*rows)])
+
+
+_compiled_projections = {}
+
+
+def der_compile_projection(cls, paths):
+    """Compile a list of dotted paths of field names, starting from the
+       generated ASN1Object subclass cls, into a `Projection`.  The result
+       is cached, so it is cheap to call this again for the same paths.
+       Field names are written as they are accessed on instances, with
+       any dash in the ASN.1 name replaced by an underscore.
+
+       The values are the contents of the selected fields, without the
+       DER header, just like the values stored by der_unpack(), and None
+       when the field is absent.  A path that passes through a SEQUENCE OF
+       or SET OF gives a list with a value for each element; when it ends
+       there, it gives the contents of all elements.  A path must end in
+       a field that der_unpack() stores, so not in a structure that has
+       fields of its own, or in a CHOICE of such fields, which gives the
+       value of the alternative that is present.
+    """
+    key = (cls, tuple(paths))
+    try:
+        return _compiled_projections[key]
+    except KeyError:
+        projection = Projection(cls, paths)
+        _compiled_projections[key] = projection
+        return projection
+
+
+def der_project(cls, paths, derblob, mode=_quickder.UNPACK_COPY):
+    """Return a tuple with the values at the dotted paths in a DER blob
+       of the generated ASN1Object subclass cls, without building any
+       objects.  The mode is one of the UNPACK_ modes of `_quickder`,
+       where UNPACK_OFFSET is not available for paths that pass through
+       a SEQUENCE OF or SET OF.  See der_compile_projection() for the
+       form of the paths.
+    """
+    return der_compile_projection(cls, paths)(derblob, mode)
@@ -0,0 +1,14 @@
+# Stubs for quick_der.projection (Python 3.6)
+
+from typing import Any, Iterable, List, Sequence, Tuple
+
+class Projection:
+    cls: Any
+    paths: Tuple[str, ...]
+    def __init__(self, cls, paths: Sequence[str]) -> None: ...
+    def __call__(self, derblob, mode: int = ...) -> Tuple[Any, ...]: ...
+    def rows(self, derblobs: Iterable[Any], mode: int = ...) -> List[Tuple[Any, ...]]: ...
+    def columns(self, derblobs: Iterable[Any], mode: int = ...) -> Tuple[List[Any], ...]: ...
+
+def der_compile_projection(cls, paths: Sequence[str]) -> Projection: ...
+def der_project(cls, paths: Sequence[str], derblob, mode: int = ...) -> Tuple[Any, ...]: ...
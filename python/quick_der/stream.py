@@ -0,0 +1,151 @@
+# stream.py -- Frame DER elements that arrive in chunks
+#
+# Connections for LDAP or Kerberos, and files with back-to-back DER data
+# such as certificate dumps, deliver their elements in chunks that need
+# not follow element boundaries.  A DERFramer collects such chunks and
+# returns each complete top-level element as a memoryview.  Elements that
+# fit in one chunk are views into that chunk; only an element that spans
+# chunks is collected in a buffer of its own, which is allocated once its
+# DER header tells its size.
+
+
+import _quickder
+
+
+# The default limit on the size of one element, including its header
+der_stream_maxsize = 16 * 1024 * 1024
+
+
+def _header_length(data):
+    """Return the length of the DER header at the start of data, or None
+       if data is too short to tell.
+    """
+    if len(data) < 2:
+        return None
+    lenbyte = bytearray(data[1:2])[0]
+    if lenbyte & 0x80 == 0x00:
+        return 2
+    if lenbyte & 0x7f > 8:
+        raise ValueError('DER length field of %d bytes in stream' % (lenbyte & 0x7f))
+    return 2 + (lenbyte & 0x7f)
+
+
+def _element_length(header, maxsize):
+    """Return the total length of the element with the given header,
+       which may not exceed maxsize.
+    """
+    try:
+        (tag, ilen, hlen) = _quickder.der_header(header)
+    except OSError as exc:
+        raise ValueError('Malformed DER header in stream: ' + str(exc))
+    if hlen + ilen > maxsize:
+        raise ValueError('DER element of %d bytes exceeds the maximum of %d' % (hlen + ilen, maxsize))
+    return hlen + ilen
+
+
+class DERFramer(object):
+    """Split a stream of back-to-back DER elements into complete elements.
+
+       Pass chunks of the stream to feed(), which returns the elements
+       that they complete as memoryviews.  A view may refer into a chunk
+       that was fed, so do not change chunks after feeding them.  Elements
+       larger than maxsize bytes, including the header, are refused with
+       a ValueError, before any memory is allocated for them.  Only the
+       one element that is incomplete is held between chunks.  Call
+       close() at the end of the stream to check that no element was cut
+       off.  After an error, the stream cannot be framed any further.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = der_stream_maxsize if maxsize is None else maxsize
+        # Header bytes of the next element, while incomplete
+        self._header = b''
+        # The element being collected, and the number of bytes in it
+        self._partial = None
+        self._filled = 0
+
+    def pending(self):
+        """Return the number of bytes held for an incomplete element."""
+        return len(self._header) + self._filled
+
+    def feed(self, chunk):
+        """Add a chunk of the stream and return a list of memoryviews,
+           one for each element that is now complete.
+        """
+        view = memoryview(chunk)
+        elements = []
+        pos = 0
+        # Continue the element that spans chunks
+        if self._partial is not None:
+            take = min(len(self._partial) - self._filled, len(view))
+            self._partial[self._filled:self._filled + take] = view[:take]
+            self._filled += take
+            pos = take
+            if self._filled < len(self._partial):
+                return elements
+            elements.append(memoryview(self._partial))
+            self._partial = None
+            self._filled = 0
+        while pos < len(view):
+            if self._header:
+                # Complete a header that was cut off by the previous chunk
+                head = self._header + view[pos:pos + 10].tobytes()
+                hlen = _header_length(head)
+                if hlen is None or hlen > len(head):
+                    self._header = head
+                    return elements
+                pos += hlen - len(self._header)
+                self._header = b''
+                elmlen = _element_length(head[:hlen], self.maxsize)
+                self._partial = bytearray(elmlen)
+                self._partial[:hlen] = head[:hlen]
+                self._filled = hlen
+            else:
+                hlen = _header_length(view[pos:pos + 2])
+                if hlen is None or pos + hlen > len(view):
+                    self._header = view[pos:].tobytes()
+                    return elements
+                elmlen = _element_length(view[pos:pos + hlen], self.maxsize)
+                if pos + elmlen <= len(view):
+                    # The common case, without any copying
+                    elements.append(view[pos:pos + elmlen])
+                    pos += elmlen
+                    continue
+                self._partial = bytearray(elmlen)
+                self._filled = 0
+            # Start collecting an element that spans chunks
+            take = min(len(self._partial) - self._filled, len(view) - pos)
+            self._partial[self._filled:self._filled + take] = view[pos:pos + take]
+            self._filled += take
+            pos += take
+            if self._filled < len(self._partial):
+                return elements
+            elements.append(memoryview(self._partial))
+            self._partial = None
+            self._filled = 0
+        return elements
+
+    def close(self):
+        """Signal the end of the stream.  Raises a ValueError if the
+           last element is incomplete.
+        """
+        if self.pending() > 0:
+            raise ValueError('DER stream ends in an incomplete element of %d bytes' % self.pending())
+
+
+def der_read_stream(stream, maxsize=None, chunksize=65536):
+    """Iterate over the DER elements in a stream, which is a binary file
+       or a socket, until it ends.  The elements are memoryviews, as
+       returned by DERFramer.feed(), that can be passed as the derblob
+       of a generated class.  The maxsize is passed to the DERFramer,
+       and chunksize is the number of bytes read at a time.
+    """
+    read = getattr(stream, 'read', None) or stream.recv
+    framer = DERFramer(maxsize)
+    while True:
+        chunk = read(chunksize)
+        if not chunk:
+            break
+        for element in framer.feed(chunk):
+            yield element
+    framer.close()
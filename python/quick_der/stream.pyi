@@ -0,0 +1,14 @@
+# Stubs for quick_der.stream (Python 3.6)
+
+from typing import Any, Iterator, List, Optional
+
+der_stream_maxsize: int
+
+class DERFramer:
+    maxsize: int
+    def __init__(self, maxsize: Optional[int] = ...) -> None: ...
+    def pending(self) -> int: ...
+    def feed(self, chunk) -> List[memoryview]: ...
+    def close(self) -> None: ...
+
+def der_read_stream(stream: Any, maxsize: Optional[int] = ..., chunksize: int = ...) -> Iterator[memoryview]: ...
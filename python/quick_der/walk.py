@@ -0,0 +1,233 @@
+# walk.py -- Compile field paths into der_walk() instructions
+#
+# A dotted path of field names, such as 'tbsCertificate.subject', is
+# translated into DER_WALK_ instructions by scanning the _der_packer and
+# _recipe of the generated class that starts the path.  The resulting
+# _quickder.Walker picks the value from DER data without unpacking the
+# rest of the structure, or building any ASN1Object around it.
+
+
+import _quickder
+
+import six
+
+from quick_der.packstx import *
+
+
+def _packer_elements(der_packer, pos=0, terminal=DER_PACK_END, numcrs=0):
+    """Parse one level of a DER_PACK_ sequence into a list of elements.
+       Each element is a tuple (cmd, optional, first, last, children)
+       that describes the cursors first up to last that it stores, and
+       holds a list of the elements inside a CHOICE or ENTER, or None.
+       Returns the elements, the position after the terminal and the
+       number of cursors up to that position.
+    """
+    elements = []
+    optional = False
+    while six.indexbytes(der_packer, pos) != terminal:
+        cmd = six.indexbytes(der_packer, pos)
+        pos += 1
+        if cmd == DER_PACK_OPTIONAL:
+            optional = True
+            continue
+        first = numcrs
+        children = None
+        if cmd == DER_PACK_CHOICE_BEGIN:
+            (children, pos, numcrs) = _packer_elements(der_packer, pos, DER_PACK_CHOICE_END, numcrs)
+        elif cmd != DER_PACK_ANY and cmd & DER_PACK_ENTER:
+            (children, pos, numcrs) = _packer_elements(der_packer, pos, DER_PACK_LEAVE, numcrs)
+        else:
+            numcrs += 1
+        elements.append((cmd, optional, first, numcrs, children))
+        optional = False
+    return (elements, pos + 1, numcrs)
+
+
+def _choice_tags(element):
+    """Return the tags that may start a CHOICE element, or None if one of
+       its alternatives is an ANY and so it cannot be recognised by tag.
+    """
+    tags = []
+    for (cmd, optional, first, last, children) in element[4]:
+        if cmd == DER_PACK_ANY:
+            return None
+        elif cmd == DER_PACK_CHOICE_BEGIN:
+            subtags = _choice_tags((cmd, optional, first, last, children))
+            if subtags is None:
+                return None
+            tags.extend(subtags)
+        else:
+            tags.append(cmd & ~DER_PACK_ENTER)
+    return tags
+
+
+def _skip_steps(element, constrained):
+    """Return the DER_WALK_ steps that skip over the element.  When the
+       next step is constrained, meaning that it is an OPTIONAL or CHOICE
+       that der_walk() does not accept after a DER_WALK_CHOICE, then a
+       CHOICE is skipped by trying each of its alternatives.
+    """
+    (cmd, optional, first, last, children) = element
+    if cmd == DER_PACK_ANY:
+        if optional or constrained:
+            raise ValueError('Cannot walk past an ANY next to an OPTIONAL or CHOICE element')
+        return [DER_WALK_ANY]
+    elif cmd == DER_PACK_CHOICE_BEGIN:
+        if not (optional or constrained):
+            return [DER_WALK_CHOICE]
+        tags = _choice_tags(element)
+        if tags is None:
+            raise ValueError('Cannot walk past a CHOICE with an ANY next to an OPTIONAL or CHOICE element')
+        steps = []
+        for tag in tags:
+            steps += [DER_WALK_OPTIONAL, DER_WALK_SKIP | tag]
+        return steps
+    elif optional:
+        return [DER_WALK_OPTIONAL, cmd & ~DER_PACK_ENTER]
+    else:
+        return [cmd & ~DER_PACK_ENTER]
+
+
+def _recipe_first(recipe):
+    """Return the first cursor index covered by a recipe entry."""
+    if type(recipe) == int:
+        return recipe
+    elif recipe[0] == '_NAMED':
+        return min([_recipe_first(sub) for sub in recipe[1].values()])
+    elif recipe[0] in ['_SEQOF', '_SETOF']:
+        return recipe[1]
+    elif recipe[0] == '_TYPTR':
+        return recipe[2]
+    else:
+        raise ValueError('Unknown recipe tag ' + str(recipe[0]))
+
+
+def _follow_typtr(recipe, context, ofs):
+    """Follow _TYPTR references in a recipe entry down to the recipe of
+       the type that they refer to.  Returns that recipe, the context to
+       resolve further references in, and its cursor offset.
+    """
+    while type(recipe) == tuple and recipe[0] == '_TYPTR':
+        (_TYPTR, [subcls], subofs) = recipe
+        ofs += subofs
+        if type(subcls) == str:
+            if subcls[:5] == '_api.':
+                context = context['_api'].__dict__
+                subcls = subcls[5:]
+            elif subcls[:4] == 'ASN1':
+                context = context['_api'].__dict__
+            subcls = context[subcls]
+        recipe = subcls._recipe
+        context = getattr(subcls, '_context', context)
+    return (recipe, context, ofs)
+
+
+def _recipe_fields(recipe, context, ofs):
+    """Follow _TYPTR references in a recipe entry down to the field
+       map of a constructed type.  Returns the map, the context to resolve
+       further references in, and the cursor offset of the map; the map
+       is None when the recipe has no named fields.
+    """
+    (recipe, context, ofs) = _follow_typtr(recipe, context, ofs)
+    if type(recipe) == tuple and recipe[0] == '_NAMED':
+        return (recipe[1], context, ofs)
+    return (None, context, ofs)
+
+
+def _path_steps(cls, names):
+    """Translate a list of field names into DER_WALK_ steps, starting
+       from the ASN1Object subclass cls.
+    """
+    (elements, _, _) = _packer_elements(cls._der_packer)
+    assert len(elements) == 1, 'Expected one outer element in the _der_packer of ' + cls.__name__
+    target = elements[0]
+    target_optional = target[1]
+    (fields, context, ofs) = _recipe_fields(cls._recipe, cls._context, 0)
+    steps = []
+    crs = None
+    for name in names:
+        if fields is None:
+            raise ValueError('Cannot find field ' + name + ' in a type without named fields')
+        recipe = None
+        for (fldnm, fldrcp) in fields.items():
+            if fldnm.replace('-', '_') == name:
+                recipe = fldrcp
+        if recipe is None:
+            raise ValueError('No field ' + name + ' in path')
+        crs = ofs + _recipe_first(recipe)
+        (cmd, optional, first, last, children) = target
+        if cmd == DER_PACK_CHOICE_BEGIN:
+            # Alternatives are absent when another one is present
+            target_optional = True
+            siblings = []
+        elif children is not None and cmd != DER_PACK_ANY:
+            if target_optional:
+                steps.append(DER_WALK_OPTIONAL)
+            steps.append(cmd | DER_WALK_ENTER)
+            target_optional = False
+            siblings = children
+        else:
+            raise ValueError('Cannot find field ' + name + ' in an element without fields')
+        found = [elem for elem in children if elem[2] <= crs < elem[3]]
+        if len(found) != 1:
+            raise ValueError('Field ' + name + ' has no single place in the _der_packer')
+        # Skip the preceding elements, back to front to see what follows
+        skips = []
+        for elem in reversed(siblings[:siblings.index(found[0])] if siblings else []):
+            skips = _skip_steps(elem, skips[:1] in [[DER_WALK_OPTIONAL], [DER_WALK_CHOICE]]) + skips
+        steps += skips
+        target = found[0]
+        target_optional = target_optional or target[1]
+        (fields, context, ofs) = _recipe_fields(recipe, context, ofs)
+    (cmd, optional, first, last, children) = target
+    # Enter the EXPLICIT tags around a field without fields of its own
+    while fields is None and crs is not None and children is not None and \
+            cmd not in (DER_PACK_ANY, DER_PACK_CHOICE_BEGIN) and \
+            len(children) == 1 and children[0][2] <= crs < children[0][3]:
+        if target_optional:
+            steps.append(DER_WALK_OPTIONAL)
+        steps.append(cmd | DER_WALK_ENTER)
+        target = children[0]
+        target_optional = target[1]
+        (cmd, optional, first, last, children) = target
+    if cmd == DER_PACK_ANY or cmd == DER_PACK_CHOICE_BEGIN:
+        raise ValueError('A path cannot end in an untagged CHOICE or ANY')
+    if target_optional:
+        steps.append(DER_WALK_OPTIONAL)
+    return steps + [cmd | DER_WALK_ENTER, DER_WALK_END]
+
+
+_compiled_paths = {}
+
+
+def der_compile_path(cls, path):
+    """Compile a dotted path of field names, starting from the generated
+       ASN1Object subclass cls, into a `_quickder.Walker`.  The result is
+       cached, so it is cheap to call this again for the same path.
+       Field names are written as they are accessed on instances, with
+       any dash in the ASN.1 name replaced by an underscore.
+
+       The walker returns the contents of the selected field, without
+       the DER header, just like the values stored by der_unpack(), so
+       any EXPLICIT tags around the field are entered too.  These are
+       the raw contents, so a BIT STRING includes its unused-bits byte.
+       When an OPTIONAL element or an unselected CHOICE alternative on
+       the path is absent, the walker returns None.  A path cannot end in
+       an untagged CHOICE or ANY, since der_walk() selects values by tag.
+    """
+    try:
+        return _compiled_paths[(cls, path)]
+    except KeyError:
+        names = [name for name in path.split('.') if name != '']
+        walker = _quickder.Walker(bytes(bytearray(_path_steps(cls, names))))
+        _compiled_paths[(cls, path)] = walker
+        return walker
+
+
+def der_walk(cls, path, derblob, mode=_quickder.UNPACK_COPY):
+    """Return the value at the dotted path in a DER blob of the generated
+       ASN1Object subclass cls, or None if it is absent.  Nothing else is
+       unpacked on the way.  The mode is one of the UNPACK_ modes of
+       `_quickder`.  See der_compile_path() for the form of the path.
+    """
+    return der_compile_path(cls, path).walk(derblob, mode)
@@ -0,0 +1,6 @@
+# Stubs for quick_der.walk (Python 3.6)
+
+from typing import Any, Optional
+
+def der_compile_path(cls, path: str) -> Any: ...
+def der_walk(cls, path: str, derblob, mode: int = ...) -> Optional[Any]: ...
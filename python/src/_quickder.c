@@ -22,195 +22,1983 @@
  * INTEGER values.  We may be able to provide for such helps in a future
  * version.
  *
- * The code below allocates DER structures on the stack, assuming that sizes
- * are kept modest.  This may crash the program when not cared for.  We may
- * want or need to change that through malloc() in a future version.
+ * The code below allocates its dercursor arrays from a size-tiered
+ * freelist, falling back to the heap for large structures, and writes
+ * packed output directly into the resulting Python object.  This keeps
+ * large structures off the C stack, and small ones away from malloc().
  *
  * From: Rick van Rein <rick@openfortress.nl>
  */
 
 
+#define PY_SSIZE_T_CLEAN
 #include <Python.h>
 
 #include <arpa2/quick-der.h>
 
 
-/* _quickder.der_unpack (pck, bin, numcursori) -> cursori */
+/* Binary data is bytes under Python 3 and str under Python 2; it never
+ * passes through a text codec on its way between DER and Python.
+ */
+#if PY_MAJOR_VERSION >= 3
+#  define QUICKDER_BUFARG "y*"
+#  define QUICKDER_BYTES_FROM PyBytes_FromStringAndSize
+#  define QUICKDER_BYTES_AS PyBytes_AS_STRING
+#  define QUICKDER_BYTES_CHECK PyBytes_Check
+#  define QUICKDER_BYTES_SIZE PyBytes_GET_SIZE
+#else
+#  define QUICKDER_BUFARG "s*"
+#  define QUICKDER_BYTES_FROM PyString_FromStringAndSize
+#  define QUICKDER_BYTES_AS PyString_AS_STRING
+#  define QUICKDER_BYTES_CHECK PyString_Check
+#  define QUICKDER_BYTES_SIZE PyString_GET_SIZE
+#endif
+
+
+/* Inputs from a few hundred bytes, such as certificates, are walked
+ * without holding the GIL, so that threads can run der_unpack() and
+ * der_pack() in parallel.  The buffers the C code reads and writes are
+ * pinned through a Py_buffer before the GIL is dropped, so they cannot
+ * be released or resized; a bytearray may still be changed in place.
+ * Small inputs keep the GIL, because releasing and reacquiring it costs
+ * about 0.1 us, which is the time to walk some 100 bytes of DER.  The
+ * threshold can be changed with der_nogil_minsize().
+ */
+#define QUICKDER_NOGIL_MINSIZE 512
+
+static Py_ssize_t quickder_nogil_minsize = QUICKDER_NOGIL_MINSIZE;
+
+#define QUICKDER_BEGIN_NOGIL(size) { \
+	PyThreadState *_qd_save = (((Py_ssize_t) (size)) >= quickder_nogil_minsize)? PyEval_SaveThread (): NULL;
+#define QUICKDER_END_NOGIL \
+	if (_qd_save != NULL) { \
+		PyEval_RestoreThread (_qd_save); \
+	} }
+
+
+/* Scratch memory for dercursor and Py_buffer arrays.  Requests up to the
+ * largest tier are rounded up to a tier size, and released blocks are
+ * kept on a per-tier freelist for reuse by later calls.  Larger requests
+ * are served from the heap and returned to it directly.  The freelist is
+ * only touched while holding the GIL, which also protects it from the
+ * concurrent calls that may run while other threads have released it.
+ */
+#define QUICKDER_TIERS 4
+#define QUICKDER_TIER_KEEP 8
+
+static const size_t quickder_tiersize [QUICKDER_TIERS] = {
+	512, 4096, 32768, 262144
+};
+
+static void *quickder_freelist [QUICKDER_TIERS] [QUICKDER_TIER_KEEP];
+static int quickder_freecount [QUICKDER_TIERS];
+
+static int quickder_scratch_tier (size_t size) {
+	int tier = 0;
+	while ((tier < QUICKDER_TIERS) && (size > quickder_tiersize [tier])) {
+		tier++;
+	}
+	return tier;
+}
+
+/* Allocate scratch memory of at least size bytes.  On failure, this
+ * returns NULL with a MemoryError set.
+ */
+static void *quickder_scratch_alloc (size_t size) {
+	void *retval;
+	int tier = quickder_scratch_tier (size);
+	if (tier < QUICKDER_TIERS) {
+		if (quickder_freecount [tier] > 0) {
+			return quickder_freelist [tier] [-- quickder_freecount [tier]];
+		}
+		size = quickder_tiersize [tier];
+	}
+	retval = PyMem_Malloc (size);
+	if (retval == NULL) {
+		PyErr_NoMemory ();
+	}
+	return retval;
+}
+
+/* Release scratch memory, passing the size with which it was allocated.
+ * A NULL pointer is silently accepted.
+ */
+static void quickder_scratch_free (void *ptr, size_t size) {
+	int tier;
+	if (ptr == NULL) {
+		return;
+	}
+	tier = quickder_scratch_tier (size);
+	if ((tier < QUICKDER_TIERS) && (quickder_freecount [tier] < QUICKDER_TIER_KEEP)) {
+		quickder_freelist [tier] [quickder_freecount [tier] ++] = ptr;
+	} else {
+		PyMem_Free (ptr);
+	}
+}
+
+
+/* Return modes for der_unpack(), selecting how cursori are represented */
+#define QUICKDER_UNPACK_COPY   0	/* fresh binary copies (default) */
+#define QUICKDER_UNPACK_VIEW   1	/* memoryview slices of the input */
+#define QUICKDER_UNPACK_OFFSET 2	/* (offset, length) into the input */
+
+
+/* Map one dercursor to a Python object according to the unpack mode.
+ * Absent values, signalled by a NULL derptr, are returned as None.
+ * The binview is only used for QUICKDER_UNPACK_VIEW; it references
+ * the input buffer, so slices share its memory without copying.
+ */
+static PyObject *quickder_cursor2py (dercursor *crs, Py_buffer *binbuf,
+				PyObject *binview, int mode) {
+	Py_ssize_t ofs;
+	if (crs->derptr == NULL) {
+		Py_INCREF (Py_None);
+		return Py_None;
+	}
+	ofs = (Py_ssize_t) (crs->derptr - (uint8_t *) binbuf->buf);
+	switch (mode) {
+	case QUICKDER_UNPACK_VIEW:
+		return PySequence_GetSlice (binview, ofs, ofs + crs->derlen);
+	case QUICKDER_UNPACK_OFFSET:
+		return Py_BuildValue ("(nn)", ofs, (Py_ssize_t) crs->derlen);
+	default:
+		return QUICKDER_BYTES_FROM ((char *)crs->derptr, crs->derlen);
+	}
+}
+
+
+/* Unpack the DER data in binobj with the packer instructions in pck,
+ * which produce numcursori cursors, and return them as a list in the
+ * given mode.  This is shared by der_unpack() and Packer.unpack().
+ *
+ * The binobj may be any object that supports the buffer protocol, such
+ * as bytes, bytearray, memoryview or mmap.  The mode selects the form of
+ * the cursori: UNPACK_COPY returns binary copies, UNPACK_VIEW returns
+ * memoryview slices that share the input memory, and UNPACK_OFFSET
+ * returns (offset, length) pairs into binobj.  Absent values are None
+ * in all modes.
+ */
+static PyObject *quickder_unpack_core (const uint8_t *pck, int numcursori,
+				PyObject *binobj, int mode) {
+	Py_buffer bin;
+	dercursor *cursori = NULL;
+	size_t cursorisize = 0;
+	PyObject *binview = NULL;
+	PyObject *retval = NULL;
+	//
+	// Check and pin the arguments
+	if ((mode < QUICKDER_UNPACK_COPY) || (mode > QUICKDER_UNPACK_OFFSET)) {
+		PyErr_SetString (PyExc_ValueError, "Unknown der_unpack() mode");
+		return NULL;
+	}
+	if (numcursori < 0) {
+		PyErr_SetString (PyExc_ValueError, "Negative number of cursori");
+		return NULL;
+	}
+	if (PyObject_GetBuffer (binobj, &bin, PyBUF_SIMPLE)) {
+		return NULL;
+	}
+	//
+	// Allocate the dercursor array
+	cursorisize = numcursori * sizeof (dercursor);
+	cursori = quickder_scratch_alloc (cursorisize);
+	if (cursori == NULL) {
+		goto done;
+	}
+	dercursor binput;
+	binput.derptr = (uint8_t *)bin.buf;
+	binput.derlen = bin.len;
+	int unpacked;
+	QUICKDER_BEGIN_NOGIL (bin.len)
+	unpacked = der_unpack (&binput, (const derwalk *)pck, cursori, 1);
+	QUICKDER_END_NOGIL
+	if (unpacked) {
+		PyErr_SetFromErrno (PyExc_OSError);
+		goto done;
+	}
+	//
+	// Slices are taken from a single memoryview on the input object,
+	// so they keep that object alive without copying its contents
+	if (mode == QUICKDER_UNPACK_VIEW) {
+		binview = PyMemoryView_FromObject (binobj);
+		if (binview == NULL) {
+			goto done;
+		}
+	}
+	//
+	// Construct the structure of cursori to be returned
+	retval = PyList_New (numcursori);
+	if (retval == NULL) {
+		goto done;
+	}
+	while (numcursori-- > 0) {
+		PyObject *elem = quickder_cursor2py (&cursori [numcursori], &bin, binview, mode);
+		if (elem == NULL) {
+			Py_DECREF (retval); // not returned, so discard
+			retval = NULL;
+			goto done;
+		}
+		// PyList_SET_ITEM steals the reference to elem
+		PyList_SET_ITEM (retval, numcursori, elem);
+	}
+	//
+	// Cleanup and return
+done:
+	quickder_scratch_free (cursori, cursorisize);
+	Py_XDECREF (binview);
+	PyBuffer_Release (&bin);
+	return retval;
+}
+
+
+/* Pack the cursor values in the list bins with the packer instructions in
+ * pck and return the DER output as a binary string.  This is shared by
+ * der_pack() and Packer.pack().
+ *
+ * The bins hold None for absent values, or otherwise a binary string
+ * or another object that supports the buffer protocol, such as the views
+ * returned by der_unpack() in UNPACK_VIEW mode.  When numcursori is not
+ * negative, it is the required length of bins.
+ *
+ * The DER output is written straight into the returned binary string,
+ * which is allocated once its size is known.
+ */
+static PyObject *quickder_pack_core (const uint8_t *pck, int numcursori,
+				PyObject *bins) {
+	Py_ssize_t binslen;
+	Py_ssize_t pinned = 0;
+	dercursor *cursori = NULL;
+	Py_buffer *views = NULL;
+	size_t scratchsize = 0;
+	PyObject *retval = NULL;
+	//
+	// "bins" is refct'd by the caller's arguments, held during this call
+	if (!PyList_Check (bins)) {
+		PyErr_SetString (PyExc_TypeError, "der_pack() expects a list of cursor values");
+		return NULL;
+	}
+	binslen = PyList_GET_SIZE (bins);
+	if ((numcursori >= 0) && (binslen != numcursori)) {
+		PyErr_Format (PyExc_ValueError, "der_pack() expects %d cursor values, not %zd", numcursori, binslen);
+		return NULL;
+	}
+	//
+	// Allocate cursori, the dercursor array for der_pack(), followed
+	// by the views that hold on to their values until packing is done
+	scratchsize = binslen * (sizeof (dercursor) + sizeof (Py_buffer));
+	cursori = quickder_scratch_alloc (scratchsize);
+	if (cursori == NULL) {
+		return NULL;
+	}
+	views = (Py_buffer *) (cursori + binslen);
+	while (pinned < binslen) {
+		PyObject *elem = PyList_GET_ITEM (bins, pinned);
+		if (elem == Py_None) {
+			memset (&views [pinned], 0, sizeof (*views));
+			memset (&cursori [pinned], 0, sizeof (*cursori));
+		} else if (PyObject_GetBuffer (elem, &views [pinned], PyBUF_SIMPLE) == 0) {
+			cursori [pinned].derptr = (uint8_t *) views [pinned].buf;
+			cursori [pinned].derlen = views [pinned].len;
+		} else {
+			goto done;
+		}
+		pinned++;
+	}
+	//
+	// Determine the length of the packed string
+	size_t packedlen = der_pack ((const derwalk *)pck, cursori, NULL);
+	if (packedlen >= DER_DERLEN_ERROR) {
+		errno = EBADMSG;
+		PyErr_SetFromErrno (PyExc_OSError);
+		goto done;
+	}
+	retval = QUICKDER_BYTES_FROM (NULL, packedlen);
+	if (retval == NULL) {
+		goto done;
+	}
+	// "retval" is a new reference that no other code has seen yet
+	uint8_t *packed = (uint8_t *) QUICKDER_BYTES_AS (retval);
+	QUICKDER_BEGIN_NOGIL (packedlen)
+	der_pack ((const derwalk *)pck, cursori, packed + packedlen);
+	QUICKDER_END_NOGIL
+	//
+	// Cleanup and return
+done:
+	while (pinned-- > 0) {
+		if (views [pinned].obj != NULL) {
+			PyBuffer_Release (&views [pinned]);
+		}
+	}
+	quickder_scratch_free (cursori, scratchsize);
+	return retval;
+}
+
+
+/* der_pack() takes every value from a contiguous buffer, so the contents of
+ * a SEQUENCE OF or SET OF had to be packed on their own, and were copied
+ * once more by every enclosing der_pack().  The encoder below takes a tree
+ * of values instead, and follows der_pack_rec() to write each byte exactly
+ * once, from the end of a single output buffer towards its start.  A first
+ * run without an output buffer computes the size of that buffer.
+ *
+ * The values for the DER_PACK_STORE and DER_PACK_ANY commands of a packer
+ * are None when absent, a buffer with contents, or a list that holds the
+ * concatenation of complete DER elements.  The items in such a list are
+ * buffers with DER elements, or tuples (pck, values) that are encoded in
+ * turn.  All functions return DER_DERLEN_ERROR with an exception set when
+ * they fail.
+ */
+static size_t quickder_encode_values (const uint8_t *pck, Py_ssize_t pcklen,
+				PyObject *values, uint8_t **bufend);
+
+
+/* Backward-insert the contents of a buffer object. */
+static size_t quickder_encode_buffer (PyObject *obj, uint8_t **bufend) {
+	Py_buffer view;
+	size_t len;
+	if (QUICKDER_BYTES_CHECK (obj)) {
+		len = QUICKDER_BYTES_SIZE (obj);
+		if (bufend) {
+			*bufend -= len;
+			memcpy (*bufend, QUICKDER_BYTES_AS (obj), len);
+		}
+		return len;
+	}
+	if (PyObject_GetBuffer (obj, &view, PyBUF_SIMPLE)) {
+		return DER_DERLEN_ERROR;
+	}
+	len = view.len;
+	if (bufend) {
+		*bufend -= len;
+		memcpy (*bufend, view.buf, len);
+	}
+	PyBuffer_Release (&view);
+	return len;
+}
+
+
+/* Backward-insert the DER elements in a list, last one first. */
+static size_t quickder_encode_list (PyObject *list, uint8_t **bufend) {
+	size_t totlen = 0;
+	size_t elmlen;
+	Py_ssize_t idx = PyList_GET_SIZE (list);
+	while (idx-- > 0) {
+		PyObject *item = PyList_GET_ITEM (list, idx);
+		if (PyTuple_Check (item)) {
+			PyObject *pck;
+			if ((PyTuple_GET_SIZE (item) != 2) ||
+					!QUICKDER_BYTES_CHECK (PyTuple_GET_ITEM (item, 0))) {
+				PyErr_SetString (PyExc_TypeError, "der_encode() expects list items to be buffers or (pck, values) tuples");
+				return DER_DERLEN_ERROR;
+			}
+			pck = PyTuple_GET_ITEM (item, 0);
+			if (Py_EnterRecursiveCall (" in der_encode()")) {
+				return DER_DERLEN_ERROR;
+			}
+			elmlen = quickder_encode_values ((uint8_t *) QUICKDER_BYTES_AS (pck),
+					QUICKDER_BYTES_SIZE (pck), PyTuple_GET_ITEM (item, 1), bufend);
+			Py_LeaveRecursiveCall ();
+		} else {
+			elmlen = quickder_encode_buffer (item, bufend);
+		}
+		if (elmlen == DER_DERLEN_ERROR) {
+			return DER_DERLEN_ERROR;
+		}
+		totlen += elmlen;
+		if (totlen & DER_DERLEN_FLAG_CONSTRUCTED) {
+			PyErr_SetString (PyExc_OverflowError, "der_encode() output is too large");
+			return DER_DERLEN_ERROR;
+		}
+	}
+	return totlen;
+}
+
+
+/* Backward-insert the bytes for one level of the packer, like der_pack_rec()
+ * but with the values taken from a list of Python objects.
+ */
+static size_t quickder_encode_rec (const uint8_t *pck, int *stxlen,
+				uint8_t **bufend,
+				PyObject *values, Py_ssize_t *offsetp) {
+	size_t totlen = 0;
+	size_t elmlen = 0;
+	size_t tmplen;
+	bool addhdr;
+	bool bitstr;
+	uint8_t cmd;
+	uint8_t tag;
+	uint8_t *buf = NULL;
+	uint8_t lenlen;
+	PyObject *value;
+	do {
+		tag = cmd = pck [-- *stxlen];
+		bitstr = (cmd == (DER_PACK_ENTER | DER_TAG_BITSTRING));
+		if ((cmd == DER_PACK_CHOICE_BEGIN) || (cmd == DER_PACK_OPTIONAL)) {
+			// Skip, and rely on None for the absent values
+			cmd = 0x00;
+			continue;
+		} else if (cmd & DER_PACK_ENTER) {
+			// Ends the current recursion level, add the header below
+			addhdr = (totlen > 0);
+			elmlen = totlen;
+			totlen = bitstr? 1: 0;
+		} else if (cmd == DER_PACK_LEAVE) {
+			// Recurse for what precedes DER_PACK_LEAVE
+			elmlen = quickder_encode_rec (pck, stxlen, bufend, values, offsetp);
+			if (elmlen == DER_DERLEN_ERROR) {
+				return DER_DERLEN_ERROR;
+			}
+			addhdr = 0;
+		} else {
+			// DER_PACK_STORE or DER_PACK_ANY consume one value
+			addhdr = (cmd != DER_PACK_ANY);
+			value = PyList_GET_ITEM (values, -- *offsetp);
+			if (value == Py_None) {
+				elmlen = 0;
+				addhdr = 0;
+			} else if (PyList_Check (value)) {
+				elmlen = quickder_encode_list (value, bufend);
+			} else {
+				elmlen = quickder_encode_buffer (value, bufend);
+			}
+			if (elmlen == DER_DERLEN_ERROR) {
+				return DER_DERLEN_ERROR;
+			}
+			if ((tag == 0x08) || (tag == 0x0b)
+					|| (tag == 0x10) || (tag == 0x11)) {
+				tag |= 0x20;	// Constructed, even STORED
+			}
+		}
+		if (addhdr) {
+			if (bufend) {
+				buf = *bufend;
+				if (bitstr) {
+					* --buf = 0x00;
+				}
+			}
+			lenlen = 0;
+			if (elmlen >= 0x80) {
+				tmplen = elmlen;
+				while (tmplen > 0) {
+					if (bufend) {
+						* -- buf = (tmplen & 0xff);
+					}
+					tmplen >>= 8;
+					lenlen++;
+				}
+			}
+			if (bufend) {
+				* -- buf = (elmlen >= 0x80)? (lenlen|0x80): elmlen;
+				* -- buf = tag;
+				* bufend = buf;
+			}
+			elmlen += 2 + lenlen;
+		}
+		totlen += elmlen;
+		if ((elmlen | totlen) & DER_DERLEN_FLAG_CONSTRUCTED) {
+			PyErr_SetString (PyExc_OverflowError, "der_encode() output is too large");
+			return DER_DERLEN_ERROR;
+		}
+	} while (((cmd & DER_PACK_ENTER) == 0x00) && (*stxlen > 0));
+	return totlen;
+}
+
+
+/* Backward-insert the bytes for a packer and its list of values. */
+static size_t quickder_encode_values (const uint8_t *pck, Py_ssize_t pcklen,
+				PyObject *values, uint8_t **bufend) {
+	int entered = 0;
+	int stxlen = 0;
+	Py_ssize_t numvals = 0;
+	size_t totlen = 0;
+	size_t elmlen;
+	uint8_t cmd;
+	//
+	// Find the end of the packer and count its values, as der_pack() does
+	while (1) {
+		if (stxlen >= pcklen) {
+			PyErr_SetString (PyExc_ValueError, "der_encode() found a packer without DER_PACK_END");
+			return DER_DERLEN_ERROR;
+		}
+		cmd = pck [stxlen];
+		if ((entered == 0) && (cmd == DER_PACK_END)) {
+			break;
+		}
+		stxlen++;
+		if (cmd & DER_PACK_ENTER) {
+			if (cmd != DER_PACK_OPTIONAL) {
+				entered++;
+			}
+		} else if (cmd == DER_PACK_LEAVE) {
+			entered--;
+		} else if (cmd != DER_PACK_CHOICE_BEGIN) {
+			numvals++;
+		}
+	}
+	if (!PyList_Check (values) || (PyList_GET_SIZE (values) != numvals)) {
+		PyErr_Format (PyExc_ValueError, "der_encode() expects a list of %zd values", numvals);
+		return DER_DERLEN_ERROR;
+	}
+	//
+	// Write the values back to front
+	while (stxlen > 0) {
+		elmlen = quickder_encode_rec (pck, &stxlen, bufend, values, &numvals);
+		if (elmlen == DER_DERLEN_ERROR) {
+			return DER_DERLEN_ERROR;
+		}
+		totlen += elmlen;
+		if (totlen & DER_DERLEN_FLAG_CONSTRUCTED) {
+			PyErr_SetString (PyExc_OverflowError, "der_encode() output is too large");
+			return DER_DERLEN_ERROR;
+		}
+	}
+	return totlen;
+}
+
+
+/* Check the element under an iterator from der_iterate_first() or
+ * der_iterate_next() and pass back its total length, including the header.
+ * The iteration functions trust the lengths in the DER headers, so this is
+ * done before each step to avoid running beyond the buffer.  Returns 0 on
+ * success, or -1 with errno set.  This does not need the GIL.
+ */
+static int quickder_element_check (const dercursor *iter, size_t *elemlen) {
+	uint8_t tag;
+	uint8_t hlen;
+	size_t ilen;
+	if (der_header2 (*iter, &tag, &ilen, &hlen)) {
+		return -1;
+	}
+	if (ilen > iter->derlen - hlen) {
+		errno = EBADMSG;
+		return -1;
+	}
+	*elemlen = hlen + ilen;
+	return 0;
+}
+
+
+/* Count the back-to-back DER elements in a buffer, without looking into
+ * their contents.  Returns 0 on success, or -1 with errno set when the
+ * buffer does not hold whole elements.  This does not need the GIL.
+ */
+static int quickder_count_elements (const uint8_t *buf, size_t buflen, Py_ssize_t *count) {
+	dercursor container;
+	dercursor iter;
+	size_t elemlen;
+	container.derptr = (uint8_t *) buf;
+	container.derlen = buflen;
+	*count = 0;
+	if (der_iterate_first (&container, &iter)) do {
+		if (quickder_element_check (&iter, &elemlen)) {
+			return -1;
+		}
+		(*count)++;
+	} while (der_iterate_next (&iter));
+	if (iter.derlen != 0) {
+		// Trailing bytes that cannot form an element
+		errno = EBADMSG;
+		return -1;
+	}
+	return 0;
+}
+
+
+/* Split the DER data in binobj into its back-to-back elements, unpack
+ * each of them with the packer instructions in pck, which produce
+ * numcursori cursors, and return a list with a list of cursors for each
+ * element, in the given mode.  This is used by Packer.unpack_each() to
+ * take apart the contents of a SEQUENCE OF or SET OF in linear time.
+ */
+static PyObject *quickder_unpack_each_core (const uint8_t *pck, int numcursori,
+				PyObject *binobj, int mode) {
+	Py_buffer bin;
+	Py_ssize_t numelem = 0;
+	Py_ssize_t elem;
+	dercursor *cursori = NULL;
+	size_t cursorisize = 0;
+	PyObject *binview = NULL;
+	PyObject *retval = NULL;
+	int err;
+	int c;
+	if ((mode < QUICKDER_UNPACK_COPY) || (mode > QUICKDER_UNPACK_OFFSET)) {
+		PyErr_SetString (PyExc_ValueError, "Unknown der_unpack() mode");
+		return NULL;
+	}
+	if (PyObject_GetBuffer (binobj, &bin, PyBUF_SIMPLE)) {
+		return NULL;
+	}
+	QUICKDER_BEGIN_NOGIL (bin.len)
+	err = quickder_count_elements ((uint8_t *) bin.buf, bin.len, &numelem);
+	QUICKDER_END_NOGIL
+	if (err) {
+		PyErr_SetFromErrno (PyExc_OSError);
+		goto done;
+	}
+	if ((numcursori > 0) && ((size_t) numelem > PY_SSIZE_T_MAX / (sizeof (dercursor) * numcursori))) {
+		PyErr_NoMemory ();
+		goto done;
+	}
+	cursorisize = numelem * numcursori * sizeof (dercursor);
+	cursori = quickder_scratch_alloc (cursorisize);
+	if (cursori == NULL) {
+		goto done;
+	}
+	//
+	// Unpack every element on its own; they were checked while counting
+	QUICKDER_BEGIN_NOGIL (bin.len)
+	dercursor container;
+	dercursor iter;
+	dercursor elemcrs;
+	container.derptr = (uint8_t *) bin.buf;
+	container.derlen = bin.len;
+	elem = 0;
+	if (der_iterate_first (&container, &iter)) do {
+		elemcrs.derptr = iter.derptr;
+		quickder_element_check (&iter, &elemcrs.derlen);
+		err = der_unpack (&elemcrs, (const derwalk *) pck, cursori + elem * numcursori, 1);
+		elem++;
+	} while ((err == 0) && der_iterate_next (&iter));
+	QUICKDER_END_NOGIL
+	if (err) {
+		PyErr_SetFromErrno (PyExc_OSError);
+		goto done;
+	}
+	if (mode == QUICKDER_UNPACK_VIEW) {
+		binview = PyMemoryView_FromObject (binobj);
+		if (binview == NULL) {
+			goto done;
+		}
+	}
+	//
+	// Construct a list of cursori lists
+	retval = PyList_New (numelem);
+	if (retval == NULL) {
+		goto done;
+	}
+	for (elem = 0; elem < numelem; elem++) {
+		PyObject *crslist = PyList_New (numcursori);
+		if (crslist == NULL) {
+			goto fail;
+		}
+		PyList_SET_ITEM (retval, elem, crslist);
+		for (c = 0; c < numcursori; c++) {
+			PyObject *crsval = quickder_cursor2py (&cursori [elem * numcursori + c], &bin, binview, mode);
+			if (crsval == NULL) {
+				goto fail;
+			}
+			PyList_SET_ITEM (crslist, c, crsval);
+		}
+	}
+	goto done;
+fail:
+	Py_DECREF (retval);
+	retval = NULL;
+done:
+	quickder_scratch_free (cursori, cursorisize);
+	Py_XDECREF (binview);
+	PyBuffer_Release (&bin);
+	return retval;
+}
+
+
+/* Unpack a batch of same-typed records with the packer instructions in
+ * pck, which produce numcursori cursors per record, and return all their
+ * cursors in one flat bytearray.  This is used by Packer.unpack_batch().
+ *
+ * The records are either a single object that supports the buffer
+ * protocol and holds back-to-back DER records, or a sequence of such
+ * objects that each hold one record.  The result holds an int64_t offset
+ * and length for every cursor of every record, in order, so it can be
+ * cast to a memoryview of format 'q' without copying.  Offsets count from
+ * the start of the concatenated buffer, or from the start of the record's
+ * own buffer.  Absent values have offset -1 and length 0.
+ *
+ * Everything is pinned before the walk, so the walk over all records is
+ * done in one stretch without the GIL.
+ */
+static PyObject *quickder_unpack_batch_core (const uint8_t *pck, int numcursori,
+				PyObject *records) {
+	bool concat = PyObject_CheckBuffer (records);
+	PyObject *seq = NULL;
+	Py_ssize_t numviews;
+	Py_ssize_t pinned = 0;
+	Py_ssize_t maxrecords = 0;
+	Py_ssize_t numrecords = 0;
+	Py_ssize_t rec;
+	size_t totlen = 0;
+	size_t viewsize = 0;
+	size_t cursorisize = 0;
+	Py_buffer *views = NULL;
+	dercursor *cursori = NULL;
+	PyObject *retval = NULL;
+	int err = 0;
+	int c;
+	//
+	// Pin the input buffers
+	if (concat) {
+		numviews = 1;
+	} else {
+		seq = PySequence_Fast (records, "unpack_batch() expects a buffer or a sequence of buffers");
+		if (seq == NULL) {
+			return NULL;
+		}
+		numviews = PySequence_Fast_GET_SIZE (seq);
+	}
+	viewsize = numviews * sizeof (Py_buffer);
+	views = quickder_scratch_alloc (viewsize);
+	if (views == NULL) {
+		goto done;
+	}
+	while (pinned < numviews) {
+		PyObject *rcd = concat? records: PySequence_Fast_GET_ITEM (seq, pinned);
+		if (PyObject_GetBuffer (rcd, &views [pinned], PyBUF_SIMPLE)) {
+			goto done;
+		}
+		totlen += views [pinned].len;
+		pinned++;
+	}
+	//
+	// A concatenated buffer cannot hold more records than elements
+	if (concat) {
+		QUICKDER_BEGIN_NOGIL (totlen)
+		err = quickder_count_elements ((uint8_t *) views [0].buf, views [0].len, &maxrecords);
+		QUICKDER_END_NOGIL
+		if (err) {
+			PyErr_SetFromErrno (PyExc_OSError);
+			goto done;
+		}
+	} else {
+		maxrecords = numviews;
+	}
+	if ((numcursori > 0) && (maxrecords > (Py_ssize_t) (PY_SSIZE_T_MAX / (2 * sizeof (int64_t) * numcursori)))) {
+		PyErr_NoMemory ();
+		goto done;
+	}
+	cursorisize = maxrecords * numcursori * sizeof (dercursor);
+	cursori = quickder_scratch_alloc (cursorisize);
+	if (cursori == NULL) {
+		goto done;
+	}
+	//
+	// Unpack all records into the dercursor array
+	QUICKDER_BEGIN_NOGIL (totlen)
+	if (concat) {
+		dercursor crs;
+		size_t before;
+		crs.derptr = (uint8_t *) views [0].buf;
+		crs.derlen = views [0].len;
+		while ((err == 0) && (crs.derlen > 0)) {
+			before = crs.derlen;
+			if ((numrecords == maxrecords) ||
+			    der_unpack (&crs, (const derwalk *) pck, cursori + numrecords * numcursori, 1)) {
+				err = -1;
+			} else if (crs.derlen == before) {
+				// A packer that consumes nothing would loop forever
+				errno = EBADMSG;
+				err = -1;
+			} else {
+				numrecords++;
+			}
+		}
+		if ((err != 0) && (numrecords == maxrecords)) {
+			errno = EBADMSG;
+		}
+	} else {
+		while ((err == 0) && (numrecords < numviews)) {
+			dercursor crs;
+			crs.derptr = (uint8_t *) views [numrecords].buf;
+			crs.derlen = views [numrecords].len;
+			if (der_unpack (&crs, (const derwalk *) pck, cursori + numrecords * numcursori, 1)) {
+				err = -1;
+			} else {
+				numrecords++;
+			}
+		}
+	}
+	QUICKDER_END_NOGIL
+	if (err) {
+		PyErr_SetFromErrno (PyExc_OSError);
+		goto done;
+	}
+	//
+	// Translate the cursors into offsets and lengths
+	retval = PyByteArray_FromStringAndSize (NULL, numrecords * numcursori * 2 * sizeof (int64_t));
+	if (retval == NULL) {
+		goto done;
+	}
+	int64_t *table = (int64_t *) PyByteArray_AS_STRING (retval);
+	for (rec = 0; rec < numrecords; rec++) {
+		uint8_t *base = (uint8_t *) views [concat? 0: rec].buf;
+		dercursor *crs = cursori + rec * numcursori;
+		for (c = 0; c < numcursori; c++) {
+			if (crs [c].derptr == NULL) {
+				*table++ = -1;
+				*table++ = 0;
+			} else {
+				*table++ = (int64_t) (crs [c].derptr - base);
+				*table++ = (int64_t) crs [c].derlen;
+			}
+		}
+	}
+	//
+	// Cleanup and return
+done:
+	quickder_scratch_free (cursori, cursorisize);
+	if (views != NULL) {
+		while (pinned-- > 0) {
+			PyBuffer_Release (&views [pinned]);
+		}
+	}
+	quickder_scratch_free (views, viewsize);
+	Py_XDECREF (seq);
+	return retval;
+}
+
+
+/* _quickder.der_unpack (pck, bin, numcursori [, mode]) -> cursori
+ *
+ * See quickder_unpack_core() for the handling of bin and mode.
+ */
 static PyObject *quickder_unpack (PyObject *self, PyObject *args) {
-	char *pck;
-	int pcklen;
-	char *bin;
-	int binlen;
+	Py_buffer pck;
+	PyObject *bin;
 	int numcursori;
+	int mode = QUICKDER_UNPACK_COPY;
+	PyObject *retval;
 	//
 	// Parse the arguments
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG "Oi|i", &pck, &bin, &numcursori, &mode)) {
+		return NULL;
+	}
+	retval = quickder_unpack_core ((uint8_t *) pck.buf, numcursori, bin, mode);
+	PyBuffer_Release (&pck);
+	return retval;
+}
+
+
+/* _quickder.der_pack (pck, crsvals) -> bin
+ *
+ * See quickder_pack_core() for the forms of crsvals.
+ */
+static PyObject *quickder_pack (PyObject *self, PyObject *args) {
+	Py_buffer pck;
+	PyObject *bins;
+	PyObject *retval;
+	//
+	// Parse arguments, generally
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG "O", &pck, &bins)) {
+		return NULL;
+	}
+	retval = quickder_pack_core ((uint8_t *) pck.buf, -1, bins);
+	PyBuffer_Release (&pck);
+	return retval;
+}
+
+
+/* _quickder.der_encode (pck, values) -> bin
+ *
+ * See quickder_encode_values() for the forms of values.
+ */
+static PyObject *quickder_encode (PyObject *self, PyObject *args) {
+	Py_buffer pck;
+	PyObject *values;
 	PyObject *retval = NULL;
-	if (!PyArg_ParseTuple (args, "s#s#i", &pck, &pcklen, &bin, &binlen, &numcursori)) {
+	uint8_t *bufend;
+	size_t enclen;
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG "O", &pck, &values)) {
+		return NULL;
+	}
+	//
+	// Measure, allocate and then fill the output from its end
+	enclen = quickder_encode_values ((uint8_t *) pck.buf, pck.len, values, NULL);
+	if (enclen == DER_DERLEN_ERROR) {
+		goto done;
+	}
+	retval = QUICKDER_BYTES_FROM (NULL, enclen);
+	if (retval == NULL) {
+		goto done;
+	}
+	bufend = (uint8_t *) QUICKDER_BYTES_AS (retval) + enclen;
+	if (quickder_encode_values ((uint8_t *) pck.buf, pck.len, values, &bufend) != enclen) {
+		if (!PyErr_Occurred ()) {
+			PyErr_SetString (PyExc_RuntimeError, "der_encode() values changed while encoding");
+		}
+		Py_CLEAR (retval);
+	}
+done:
+	PyBuffer_Release (&pck);
+	return retval;
+}
+
+
+/* _quickder.der_header (cursor) -> (tag, len, hlen) */
+static PyObject *quickder_header (PyObject *self, PyObject *args) {
+	Py_buffer buf;
+	dercursor crs;
+	PyObject *retval = NULL;
+	//
+	// Verify and obtain invocation arguments
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG, &buf)) {
+		return NULL;
+	}
+	//
+	// Retrieve header information
+	crs.derptr = (uint8_t *)buf.buf;
+	crs.derlen = buf.len;
+	uint8_t tag;
+	size_t len;
+	uint8_t hlen;
+	if (der_header (&crs, &tag, &len, &hlen)) {
+		PyErr_SetFromErrno (PyExc_OSError);
+		PyBuffer_Release (&buf);
+		return NULL;
+	}
+	PyBuffer_Release (&buf);
+	//
+	// Form a tuple with the values tag, len, hlen
+	retval = Py_BuildValue ("(ini)",
+			(int) tag,
+			(Py_ssize_t) len,
+			(int) hlen);
+	// "retval" is a new reference, or NULL
+	//
+	// Cleanup and return
+	return retval;
+}
+
+
+/* The Packer type holds a packer that was validated once, along with the
+ * number of cursors it produces.  Generated classes compile their packer
+ * into a Packer on first use and then call its unpack() and pack()
+ * methods, which skip the argument parsing and validation of der_unpack()
+ * and der_pack().  Where Python supports it, these methods are called
+ * through the METH_FASTCALL vectorcall protocol.
+ */
+#if PY_VERSION_HEX >= 0x03070000
+#  define QUICKDER_FASTCALL
+#endif
+
+typedef struct {
+	PyObject_HEAD
+	PyObject *packer;	/* binary string ending in DER_PACK_END */
+	int numcursori;		/* number of cursors stored by the packer */
+} QuickDERPacker;
+
+
+/* Validate one level of packer instructions, starting at *pos and up to
+ * the terminal of the level, which is DER_PACK_CHOICE_END for a CHOICE and
+ * DER_PACK_LEAVE (or DER_PACK_END at the outer level) otherwise.  This
+ * follows the structure that der_unpack() assumes: ENTER and LEAVE nest,
+ * CHOICE is not nested in CHOICE without an intermediate ENTER, and
+ * OPTIONAL prefixes exactly one element outside of a CHOICE.  Stored
+ * elements, including ANY, are counted in *numcursori.
+ *
+ * Returns 0 with *pos beyond the terminal, or -1 with a ValueError set.
+ */
+static int quickder_packer_check (const uint8_t *pck, Py_ssize_t pcklen,
+				Py_ssize_t *pos, bool choice, int *numcursori) {
+	uint8_t terminal = choice? DER_PACK_CHOICE_END: DER_PACK_LEAVE;
+	bool optional = false;
+	uint8_t cmd;
+	while ((*pos < pcklen) && (pck [*pos] != terminal)) {
+		cmd = pck [(*pos)++];
+		if (cmd == DER_PACK_OPTIONAL) {
+			if (optional || choice) {
+				PyErr_Format (PyExc_ValueError, "Packer has OPTIONAL %s at offset %zd",
+						choice? "inside CHOICE": "after OPTIONAL", *pos - 1);
+				return -1;
+			}
+			optional = true;
+			continue;
+		}
+		if (cmd == DER_PACK_CHOICE_BEGIN) {
+			if (quickder_packer_check (pck, pcklen, pos, true, numcursori)) {
+				return -1;
+			}
+		} else if (cmd == DER_PACK_LEAVE) {
+			// Only reached as a non-terminal inside a CHOICE
+			PyErr_Format (PyExc_ValueError, "Packer has LEAVE inside CHOICE at offset %zd", *pos - 1);
+			return -1;
+		} else if (cmd & DER_PACK_ENTER) {
+			if (quickder_packer_check (pck, pcklen, pos, false, numcursori)) {
+				return -1;
+			}
+		} else {
+			// DER_PACK_STORE and DER_PACK_ANY take one cursor
+			(*numcursori)++;
+		}
+		optional = false;
+	}
+	if (*pos >= pcklen) {
+		PyErr_SetString (PyExc_ValueError, choice
+				? "Packer has CHOICE without CHOICE_END"
+				: "Packer has ENTER without LEAVE, or lacks DER_PACK_END");
+		return -1;
+	}
+	if (optional) {
+		PyErr_Format (PyExc_ValueError, "Packer has OPTIONAL without element at offset %zd", *pos);
+		return -1;
+	}
+	(*pos)++;
+	return 0;
+}
+
+
+/* _quickder.Packer (pck) -> Packer */
+static PyObject *packer_new (PyTypeObject *type, PyObject *args, PyObject *kwargs) {
+	Py_buffer pck;
+	Py_ssize_t pos = 0;
+	int numcursori = 0;
+	QuickDERPacker *self;
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG ":Packer", &pck)) {
+		return NULL;
+	}
+	if (quickder_packer_check ((uint8_t *) pck.buf, pck.len, &pos, false, &numcursori)) {
+		PyBuffer_Release (&pck);
+		return NULL;
+	}
+	self = (QuickDERPacker *) type->tp_alloc (type, 0);
+	if (self != NULL) {
+		// Keep our own copy, up to and including DER_PACK_END
+		self->packer = QUICKDER_BYTES_FROM ((char *) pck.buf, pos);
+		self->numcursori = numcursori;
+		if (self->packer == NULL) {
+			Py_DECREF (self);
+			self = NULL;
+		}
+	}
+	PyBuffer_Release (&pck);
+	return (PyObject *) self;
+}
+
+
+static void packer_dealloc (QuickDERPacker *self) {
+	Py_XDECREF (self->packer);
+	Py_TYPE (self)->tp_free ((PyObject *) self);
+}
+
+
+/* Packer.unpack (bin [, mode]) -> cursori */
+#ifdef QUICKDER_FASTCALL
+static PyObject *packer_unpack (QuickDERPacker *self, PyObject *const *args, Py_ssize_t nargs) {
+	long mode = QUICKDER_UNPACK_COPY;
+	if ((nargs < 1) || (nargs > 2)) {
+		PyErr_SetString (PyExc_TypeError, "Packer.unpack() takes a DER blob and an optional mode");
+		return NULL;
+	}
+	if (nargs > 1) {
+		mode = PyLong_AsLong (args [1]);
+		if ((mode == -1) && PyErr_Occurred ()) {
+			return NULL;
+		}
+	}
+	return quickder_unpack_core ((uint8_t *) QUICKDER_BYTES_AS (self->packer),
+			self->numcursori, args [0], (int) mode);
+}
+#else
+static PyObject *packer_unpack (QuickDERPacker *self, PyObject *args) {
+	PyObject *bin;
+	int mode = QUICKDER_UNPACK_COPY;
+	if (!PyArg_ParseTuple (args, "O|i:unpack", &bin, &mode)) {
+		return NULL;
+	}
+	return quickder_unpack_core ((uint8_t *) QUICKDER_BYTES_AS (self->packer),
+			self->numcursori, bin, mode);
+}
+#endif
+
+
+/* Packer.unpack_each (bin [, mode]) -> list of cursori */
+static PyObject *packer_unpack_each (QuickDERPacker *self, PyObject *args) {
+	PyObject *bin;
+	int mode = QUICKDER_UNPACK_COPY;
+	if (!PyArg_ParseTuple (args, "O|i:unpack_each", &bin, &mode)) {
+		return NULL;
+	}
+	return quickder_unpack_each_core ((uint8_t *) QUICKDER_BYTES_AS (self->packer),
+			self->numcursori, bin, mode);
+}
+
+
+/* Packer.unpack_batch (records) -> bytearray */
+static PyObject *packer_unpack_batch (QuickDERPacker *self, PyObject *records) {
+	return quickder_unpack_batch_core ((uint8_t *) QUICKDER_BYTES_AS (self->packer),
+			self->numcursori, records);
+}
+
+
+/* Packer.pack (crsvals) -> bin */
+static PyObject *packer_pack (QuickDERPacker *self, PyObject *bins) {
+	return quickder_pack_core ((uint8_t *) QUICKDER_BYTES_AS (self->packer),
+			self->numcursori, bins);
+}
+
+
+static PyObject *packer_get_numcursori (QuickDERPacker *self, void *closure) {
+	return Py_BuildValue ("i", self->numcursori);
+}
+
+
+static PyObject *packer_get_packer (QuickDERPacker *self, void *closure) {
+	Py_INCREF (self->packer);
+	return self->packer;
+}
+
+
+static PyMethodDef packer_methods [] = {
+#ifdef QUICKDER_FASTCALL
+	{ "unpack", (PyCFunction) (void (*) (void)) packer_unpack, METH_FASTCALL, "Unpack from DER encoding with this packer" },
+#else
+	{ "unpack", (PyCFunction) packer_unpack, METH_VARARGS, "Unpack from DER encoding with this packer" },
+#endif
+	{ "unpack_each", (PyCFunction) packer_unpack_each, METH_VARARGS, "Split back-to-back elements and unpack each with this packer" },
+	{ "unpack_batch", (PyCFunction) packer_unpack_batch, METH_O, "Unpack a batch of records into a flat table of offsets and lengths" },
+	{ "pack",   (PyCFunction) packer_pack,   METH_O,       "Pack into DER encoding with this packer" },
+	{ NULL, NULL, 0, NULL }
+};
+
+
+static PyGetSetDef packer_getset [] = {
+	{ "numcursori", (getter) packer_get_numcursori, NULL, "Number of cursors stored by the packer", NULL },
+	{ "packer",     (getter) packer_get_packer,     NULL, "Packer instructions, ending in DER_PACK_END", NULL },
+	{ NULL, NULL, NULL, NULL, NULL }
+};
+
+
+static PyTypeObject QuickDERPackerType = {
+	PyVarObject_HEAD_INIT (NULL, 0)
+	.tp_name = "_quickder.Packer",
+	.tp_basicsize = sizeof (QuickDERPacker),
+	.tp_dealloc = (destructor) packer_dealloc,
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_doc = "Packer (pck) validates and holds DER_PACK_ instructions for repeated use",
+	.tp_methods = packer_methods,
+	.tp_getset = packer_getset,
+	.tp_new = packer_new,
+};
+
+
+/* The Walker type holds a der_walk() path, to pick a single value from DER
+ * data without unpacking anything else.  The path is split into one
+ * segment for every DER_WALK_ENTER step, so that an OPTIONAL prefix on an
+ * ENTER step can mark that level as absent rather than failing.  Plain
+ * der_walk() would skip the data instead, since it only uses OPTIONAL to
+ * skip over optional parts.
+ *
+ * The segments are stored as a flag byte that is 1 for an optional level,
+ * followed by the der_walk() path for the level, ending in DER_WALK_END.
+ */
+typedef struct {
+	PyObject_HEAD
+	PyObject *path;		/* der_walk() path as supplied */
+	PyObject *segments;	/* flag byte and path for each level */
+	int numsegments;
+} QuickDERWalker;
+
+
+static bool quickder_walk_isenter (uint8_t step) {
+	return (step != DER_WALK_OPTIONAL) && ((step & DER_WALK_ENTER) != 0);
+}
+
+
+/* _quickder.Walker (path) -> Walker */
+static PyObject *walker_new (PyTypeObject *type, PyObject *args, PyObject *kwargs) {
+	Py_buffer path;
+	const uint8_t *pth;
+	Py_ssize_t i;
+	uint8_t *seg = NULL;
+	size_t segsize = 0;
+	Py_ssize_t seglen = 0;
+	Py_ssize_t flagpos = 0;
+	int numsegments = 0;
+	QuickDERWalker *self = NULL;
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG ":Walker", &path)) {
 		return NULL;
 	}
+	pth = (const uint8_t *) path.buf;
 	//
-	// Allocate the dercursor array
-	dercursor cursori [numcursori];
-	dercursor binput;
-	binput.derptr = (uint8_t *)bin;
-	binput.derlen = binlen;
-	if (der_unpack (&binput, (derwalk *)pck, cursori, 1)) {
-		PyErr_SetFromErrno (PyExc_OSError);
+	// Every step lands in the segments once, plus the flag and the
+	// DER_WALK_END for each of at most path.len + 1 segments
+	segsize = 3 * path.len + 2;
+	seg = quickder_scratch_alloc (segsize);
+	if (seg == NULL) {
+		goto done;
+	}
+	seg [seglen++] = 0;
+	for (i = 0; (i < path.len) && (pth [i] != DER_WALK_END); i++) {
+		uint8_t next = (i + 1 < path.len)? pth [i + 1]: DER_WALK_END;
+		uint8_t after = (i + 2 < path.len)? pth [i + 2]: DER_WALK_END;
+		if (pth [i] == DER_WALK_OPTIONAL) {
+			if ((next == DER_WALK_END) || (next == DER_WALK_OPTIONAL)) {
+				PyErr_Format (PyExc_ValueError, "Walker path has OPTIONAL without element at offset %zd", i);
+				goto done;
+			}
+			if (quickder_walk_isenter (next)) {
+				// Absence of an entered level is reported as None
+				seg [flagpos] = 1;
+				continue;
+			}
+		} else if (pth [i] == DER_WALK_CHOICE) {
+			if ((next == DER_WALK_END) || (next == DER_WALK_CHOICE) ||
+			    ((next == DER_WALK_OPTIONAL) && !quickder_walk_isenter (after))) {
+				PyErr_Format (PyExc_ValueError, "Walker path has CHOICE without element at offset %zd", i);
+				goto done;
+			}
+		}
+		seg [seglen++] = pth [i];
+		if (quickder_walk_isenter (pth [i])) {
+			seg [seglen++] = DER_WALK_END;
+			numsegments++;
+			flagpos = seglen;
+			seg [seglen++] = 0;
+		}
+	}
+	if (i >= path.len) {
+		PyErr_SetString (PyExc_ValueError, "Walker path lacks DER_WALK_END");
+		goto done;
+	}
+	if ((seglen > flagpos + 1) || (numsegments == 0)) {
+		// Trailing steps without DER_WALK_ENTER form a last segment
+		seg [seglen++] = DER_WALK_END;
+		numsegments++;
+	} else {
+		seglen--;
+	}
+	self = (QuickDERWalker *) type->tp_alloc (type, 0);
+	if (self == NULL) {
+		goto done;
+	}
+	self->path = QUICKDER_BYTES_FROM ((char *) pth, i + 1);
+	self->segments = QUICKDER_BYTES_FROM ((char *) seg, seglen);
+	self->numsegments = numsegments;
+	if ((self->path == NULL) || (self->segments == NULL)) {
+		Py_DECREF (self);
+		self = NULL;
+	}
+done:
+	quickder_scratch_free (seg, segsize);
+	PyBuffer_Release (&path);
+	return (PyObject *) self;
+}
+
+
+static void walker_dealloc (QuickDERWalker *self) {
+	Py_XDECREF (self->path);
+	Py_XDECREF (self->segments);
+	Py_TYPE (self)->tp_free ((PyObject *) self);
+}
+
+
+/* Walk the DER data in binobj and return the value at the end of the path
+ * in the given mode, or None when an optional level is absent.
+ */
+static PyObject *quickder_walk_core (QuickDERWalker *self, PyObject *binobj, int mode) {
+	Py_buffer bin;
+	dercursor crs;
+	const uint8_t *seg = (const uint8_t *) QUICKDER_BYTES_AS (self->segments);
+	bool optional;
+	int walked;
+	int n;
+	PyObject *binview = NULL;
+	PyObject *retval = NULL;
+	if ((mode < QUICKDER_UNPACK_COPY) || (mode > QUICKDER_UNPACK_OFFSET)) {
+		PyErr_SetString (PyExc_ValueError, "Unknown der_walk() mode");
 		return NULL;
 	}
-	//
-	// Construct the structure of cursori to be returned
-	retval = PyList_New (numcursori);
-	if (retval == NULL) {
+	if (PyObject_GetBuffer (binobj, &bin, PyBUF_SIMPLE)) {
 		return NULL;
 	}
-	while (numcursori-- > 0) {
-		PyObject *elem;
-		if (cursori [numcursori].derptr == NULL) {
+	crs.derptr = (uint8_t *) bin.buf;
+	crs.derlen = bin.len;
+	for (n = 0; n < self->numsegments; n++) {
+		optional = (*seg++ != 0);
+		walked = der_walk (&crs, (const derwalk *) seg);
+		if ((walked != 0) && optional && ((walked > 0) || (errno == EBADMSG))) {
 			Py_INCREF (Py_None);
-			elem = Py_None;
-		} else {
+			retval = Py_None;
+			goto done;
+		}
+		if (walked != 0) {
+			if (walked > 0) {
+				// The data ended before the path did
+				errno = EBADMSG;
+			}
+			PyErr_SetFromErrno (PyExc_OSError);
+			goto done;
+		}
+		while (*seg++ != DER_WALK_END) {
+			;
+		}
+	}
+	if (mode == QUICKDER_UNPACK_VIEW) {
+		binview = PyMemoryView_FromObject (binobj);
+		if (binview == NULL) {
+			goto done;
+		}
+	}
+	retval = quickder_cursor2py (&crs, &bin, binview, mode);
+done:
+	Py_XDECREF (binview);
+	PyBuffer_Release (&bin);
+	return retval;
+}
+
+
+/* Walker.walk (bin [, mode]) -> value or None */
+#ifdef QUICKDER_FASTCALL
+static PyObject *walker_walk (QuickDERWalker *self, PyObject *const *args, Py_ssize_t nargs) {
+	long mode = QUICKDER_UNPACK_COPY;
+	if ((nargs < 1) || (nargs > 2)) {
+		PyErr_SetString (PyExc_TypeError, "Walker.walk() takes a DER blob and an optional mode");
+		return NULL;
+	}
+	if (nargs > 1) {
+		mode = PyLong_AsLong (args [1]);
+		if ((mode == -1) && PyErr_Occurred ()) {
+			return NULL;
+		}
+	}
+	return quickder_walk_core (self, args [0], (int) mode);
+}
+#else
+static PyObject *walker_walk (QuickDERWalker *self, PyObject *args) {
+	PyObject *bin;
+	int mode = QUICKDER_UNPACK_COPY;
+	if (!PyArg_ParseTuple (args, "O|i:walk", &bin, &mode)) {
+		return NULL;
+	}
+	return quickder_walk_core (self, bin, mode);
+}
+#endif
 
 
-			#if PY_MAJOR_VERSION >= 3
-			elem = PyUnicode_FromStringAndSize ((char *)cursori [numcursori].derptr, cursori [numcursori].derlen);
-			#else
-			elem = PyString_FromStringAndSize ((char *)cursori [numcursori].derptr, cursori [numcursori].derlen);
-			#endif
+static PyObject *walker_get_path (QuickDERWalker *self, void *closure) {
+	Py_INCREF (self->path);
+	return self->path;
+}
 
 
-			if (elem == NULL) {
-				Py_DECREF (retval); // not returned, so discard
-				return NULL;
-			}
+static PyMethodDef walker_methods [] = {
+#ifdef QUICKDER_FASTCALL
+	{ "walk", (PyCFunction) (void (*) (void)) walker_walk, METH_FASTCALL, "Walk DER encoding along this path and return the value found" },
+#else
+	{ "walk", (PyCFunction) walker_walk, METH_VARARGS, "Walk DER encoding along this path and return the value found" },
+#endif
+	{ NULL, NULL, 0, NULL }
+};
+
+
+static PyGetSetDef walker_getset [] = {
+	{ "path", (getter) walker_get_path, NULL, "Walk instructions, ending in DER_WALK_END", NULL },
+	{ NULL, NULL, NULL, NULL, NULL }
+};
+
+
+static PyTypeObject QuickDERWalkerType = {
+	PyVarObject_HEAD_INIT (NULL, 0)
+	.tp_name = "_quickder.Walker",
+	.tp_basicsize = sizeof (QuickDERWalker),
+	.tp_dealloc = (destructor) walker_dealloc,
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_doc = "Walker (path) validates and holds DER_WALK_ instructions for repeated use",
+	.tp_methods = walker_methods,
+	.tp_getset = walker_getset,
+	.tp_new = walker_new,
+};
+
+
+/* The ElementIterator type runs over the back-to-back DER elements in a
+ * buffer, such as the contents of a SEQUENCE OF or SET OF, and returns
+ * each whole element, including its header, in one of the unpack modes.
+ * It holds on to the buffer until it is deallocated.
+ */
+typedef struct {
+	PyObject_HEAD
+	Py_buffer bin;
+	PyObject *binview;	/* only used for QUICKDER_UNPACK_VIEW */
+	dercursor iter;
+	bool more;		/* another element starts at iter */
+	int mode;
+} QuickDERElementIterator;
+
+
+static void elemiter_dealloc (QuickDERElementIterator *self) {
+	Py_XDECREF (self->binview);
+	if (self->bin.obj != NULL) {
+		PyBuffer_Release (&self->bin);
+	}
+	Py_TYPE (self)->tp_free ((PyObject *) self);
+}
+
+
+static PyObject *elemiter_next (QuickDERElementIterator *self) {
+	dercursor elem;
+	if (!self->more) {
+		if (self->iter.derlen != 0) {
+			// Trailing bytes that cannot form an element
+			self->iter.derlen = 0;
+			errno = EBADMSG;
+			PyErr_SetFromErrno (PyExc_OSError);
 		}
-		if (PyList_SetItem (retval, numcursori, elem)) {
-			Py_DECREF (elem);	// not inserted, so discard
-			Py_DECREF (retval);	// not returned, so discard
+		return NULL;
+	}
+	elem.derptr = self->iter.derptr;
+	if (quickder_element_check (&self->iter, &elem.derlen)) {
+		self->more = false;
+		self->iter.derlen = 0;
+		PyErr_SetFromErrno (PyExc_OSError);
+		return NULL;
+	}
+	self->more = der_iterate_next (&self->iter);
+	return quickder_cursor2py (&elem, &self->bin, self->binview, self->mode);
+}
+
+
+static PyTypeObject QuickDERElementIteratorType = {
+	PyVarObject_HEAD_INIT (NULL, 0)
+	.tp_name = "_quickder.ElementIterator",
+	.tp_basicsize = sizeof (QuickDERElementIterator),
+	.tp_dealloc = (destructor) elemiter_dealloc,
+	.tp_flags = Py_TPFLAGS_DEFAULT,
+	.tp_doc = "Iterator over back-to-back DER elements, as returned by der_iterate()",
+	.tp_iter = PyObject_SelfIter,
+	.tp_iternext = (iternextfunc) elemiter_next,
+};
+
+
+/* _quickder.der_iterate (bin [, mode]) -> iterator over elements
+ *
+ * Elements are returned in the given unpack mode, default UNPACK_COPY.
+ */
+static PyObject *quickder_iterate (PyObject *self, PyObject *args) {
+	PyObject *binobj;
+	int mode = QUICKDER_UNPACK_COPY;
+	QuickDERElementIterator *it;
+	dercursor container;
+	if (!PyArg_ParseTuple (args, "O|i", &binobj, &mode)) {
+		return NULL;
+	}
+	if ((mode < QUICKDER_UNPACK_COPY) || (mode > QUICKDER_UNPACK_OFFSET)) {
+		PyErr_SetString (PyExc_ValueError, "Unknown der_iterate() mode");
+		return NULL;
+	}
+	it = PyObject_New (QuickDERElementIterator, &QuickDERElementIteratorType);
+	if (it == NULL) {
+		return NULL;
+	}
+	it->bin.obj = NULL;
+	it->binview = NULL;
+	it->mode = mode;
+	if (PyObject_GetBuffer (binobj, &it->bin, PyBUF_SIMPLE)) {
+		it->bin.obj = NULL;
+		Py_DECREF (it);
+		return NULL;
+	}
+	if (mode == QUICKDER_UNPACK_VIEW) {
+		it->binview = PyMemoryView_FromObject (binobj);
+		if (it->binview == NULL) {
+			Py_DECREF (it);
 			return NULL;
 		}
 	}
-	//
-	// Cleanup and return
-	return retval;
+	container.derptr = (uint8_t *) it->bin.buf;
+	container.derlen = it->bin.len;
+	it->more = der_iterate_first (&container, &it->iter);
+	return (PyObject *) it;
 }
 
 
-/* _quickder.der_pack (pck, crsvals) -> bin */
-static PyObject *quickder_pack (PyObject *self, PyObject *args) {
-	char *pck;
-	int pcklen;
-	PyObject *bins;
-	Py_ssize_t binslen;
-	PyObject *retval = NULL;
-	//
-	// Parse arguments, generally
-	if (!PyArg_ParseTuple (args, "s#O", &pck, &pcklen, &bins)) {
+/* _quickder.der_countelements (bin) -> count
+ *
+ * Count the back-to-back DER elements in bin, checking that they fit.
+ */
+static PyObject *quickder_countelements (PyObject *self, PyObject *args) {
+	Py_buffer bin;
+	Py_ssize_t count;
+	int err;
+	if (!PyArg_ParseTuple (args, QUICKDER_BUFARG, &bin)) {
 		return NULL;
 	}
-	// "bins" is refct'd by "args", which is held during this function call
-	if (!PyList_Check (bins)) {
+	QUICKDER_BEGIN_NOGIL (bin.len)
+	err = quickder_count_elements ((uint8_t *) bin.buf, bin.len, &count);
+	QUICKDER_END_NOGIL
+	PyBuffer_Release (&bin);
+	if (err) {
+		PyErr_SetFromErrno (PyExc_OSError);
 		return NULL;
 	}
-	binslen = PyList_Size (bins);
+	return Py_BuildValue ("n", count);
+}
+
+
+/* UTCTime and GeneralizedTime have a fixed layout of digits, so they are
+ * converted to seconds since the epoch by picking out the fields, rather
+ * than by matching a format with strptime() and then calling timegm().
+ */
+
+
+/* Parse num decimal digits; returns -1 if one is not a digit. */
+static int quickder_time_digits (const uint8_t *txt, int num) {
+	int val = 0;
+	while (num-- > 0) {
+		if ((*txt < '0') || (*txt > '9')) {
+			return -1;
+		}
+		val = val * 10 + (*txt++ - '0');
+	}
+	return val;
+}
+
+
+/* Count the days from 1970-01-01 to a date in the Gregorian calendar. */
+static int64_t quickder_days_from_civil (int64_t year, int month, int day) {
+	int64_t era, yoe, doy, doe;
+	year -= (month <= 2);
+	era = ((year >= 0)? year: (year - 399)) / 400;
+	yoe = year - era * 400;
+	doy = (153 * (month + ((month > 2)? -3: 9)) + 2) / 5 + day - 1;
+	doe = yoe * 365 + yoe / 4 - yoe / 100 + doy;
+	return era * 146097 + doe - 719468;
+}
+
+
+/* Parse the contents of a UTCTime (yearlen 2) or GeneralizedTime (yearlen 4)
+ * into seconds since the epoch.  Seconds are optional, and so are minutes
+ * in a GeneralizedTime, where a fraction of a second is accepted but
+ * dropped.  The time ends in Z or in an offset +hhmm or -hhmm.  A UTCTime
+ * year below 50 is in the 21st century, as in RFC 5280.  Returns -1 for
+ * a malformed time.
+ */
+static int quickder_time2epoch (const uint8_t *txt, Py_ssize_t len, int yearlen, int64_t *epoch) {
+	static const int mdays [12] = { 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31 };
+	Py_ssize_t digits = 0;
+	Py_ssize_t pos;
+	int year, month, day, hour;
+	int minute = 0;
+	int second = 0;
+	int offset = 0;
 	//
-	// Collect cursori, the dercursor array for der_pack()
-	dercursor cursori [binslen];
-	while (binslen-- > 0) {
-		PyObject *elem = PyList_GetItem (bins, binslen);
-		// "elem" is a borrowed reference; theory of race condition?!?
-		if (elem == Py_None) {
-			memset (&cursori [binslen], 0, sizeof (*cursori));
-
-		#if PY_MAJOR_VERSION >= 3
-		} else if (PyUnicode_Check (elem)) {
-		#else
-		} else if (PyString_Check (elem)) {
-		#endif
-			char *buf;
-			Py_ssize_t buflen;
-			//TODO// Retval from following call?  Can it go wrong?
-			#if PY_MAJOR_VERSION >= 3
-			PyBytes_AsStringAndSize (elem, &buf, &buflen);
-			#else
-			PyString_AsStringAndSize (elem, &buf, &buflen);
-			#endif
-
-			cursori [binslen].derptr = (uint8_t *)buf;
-			cursori [binslen].derlen = buflen;
-		} else {
-			return NULL;
+	// Check the layout of the digits
+	while ((digits < len) && (txt [digits] >= '0') && (txt [digits] <= '9')) {
+		digits++;
+	}
+	if ((digits != yearlen + 8) && (digits != yearlen + 10) &&
+			((yearlen == 2) || (digits != yearlen + 6))) {
+		return -1;
+	}
+	year = quickder_time_digits (txt, yearlen);
+	if (yearlen == 2) {
+		year += (year < 50)? 2000: 1900;
+	}
+	month  = quickder_time_digits (txt + yearlen,     2);
+	day    = quickder_time_digits (txt + yearlen + 2, 2);
+	hour   = quickder_time_digits (txt + yearlen + 4, 2);
+	if (digits >= yearlen + 8) {
+		minute = quickder_time_digits (txt + yearlen + 6, 2);
+	}
+	if (digits >= yearlen + 10) {
+		second = quickder_time_digits (txt + yearlen + 8, 2);
+	}
+	pos = digits;
+	//
+	// Skip a fraction of a second
+	if ((yearlen == 4) && (digits == 14) && (pos < len) &&
+			((txt [pos] == '.') || (txt [pos] == ','))) {
+		pos++;
+		if ((pos >= len) || (txt [pos] < '0') || (txt [pos] > '9')) {
+			return -1;
+		}
+		while ((pos < len) && (txt [pos] >= '0') && (txt [pos] <= '9')) {
+			pos++;
 		}
 	}
 	//
-	// Determine the length of the packed string
-	ssize_t packedlen = der_pack ((derwalk *)pck, cursori, NULL);
-	if (packedlen < 0) {
-		PyErr_SetFromErrno (PyExc_OSError);
+	// Parse the time zone
+	if ((pos + 1 == len) && (txt [pos] == 'Z')) {
+		offset = 0;
+	} else if ((pos + 5 == len) && ((txt [pos] == '+') || (txt [pos] == '-'))) {
+		int offhour = quickder_time_digits (txt + pos + 1, 2);
+		int offmin  = quickder_time_digits (txt + pos + 3, 2);
+		if ((offhour < 0) || (offhour > 23) || (offmin < 0) || (offmin > 59)) {
+			return -1;
+		}
+		offset = offhour * 3600 + offmin * 60;
+		if (txt [pos] == '-') {
+			offset = -offset;
+		}
+	} else {
+		return -1;
+	}
+	//
+	// Check the ranges of the fields
+	if ((month < 1) || (month > 12) || (day < 1) || (day > mdays [month - 1])) {
+		return -1;
+	}
+	if ((month == 2) && (day == 29) &&
+			((year % 4 != 0) || ((year % 100 == 0) && (year % 400 != 0)))) {
+		return -1;
+	}
+	if ((hour > 23) || (minute > 59) || (second > 60)) {
+		return -1;
+	}
+	*epoch = quickder_days_from_civil (year, month, day) * 86400
+		+ hour * 3600 + minute * 60 + second - offset;
+	return 0;
+}
+
+
+/* _quickder.der_epochs (values, yearlen) -> bytearray
+ *
+ * Convert a sequence of UTCTime (yearlen 2) or GeneralizedTime (yearlen 4)
+ * contents into a bytearray of native 64-bit seconds since the epoch.
+ */
+static PyObject *quickder_epochs (PyObject *self, PyObject *args) {
+	PyObject *values;
+	PyObject *seq;
+	PyObject *retval = NULL;
+	int64_t *epochs;
+	Py_ssize_t num;
+	Py_ssize_t i;
+	int yearlen;
+	if (!PyArg_ParseTuple (args, "Oi", &values, &yearlen)) {
+		return NULL;
+	}
+	if ((yearlen != 2) && (yearlen != 4)) {
+		PyErr_SetString (PyExc_ValueError, "der_epochs() takes a yearlen of 2 or 4");
+		return NULL;
+	}
+	seq = PySequence_Fast (values, "der_epochs() expects a sequence of buffers");
+	if (seq == NULL) {
 		return NULL;
 	}
-	uint8_t packed [packedlen];
-	der_pack ((derwalk *)pck, cursori, packed + packedlen);
+	num = PySequence_Fast_GET_SIZE (seq);
+	if (num > PY_SSIZE_T_MAX / (Py_ssize_t) sizeof (int64_t)) {
+		PyErr_NoMemory ();
+		goto done;
+	}
+	retval = PyByteArray_FromStringAndSize (NULL, num * sizeof (int64_t));
+	if (retval == NULL) {
+		goto done;
+	}
+	epochs = (int64_t *) PyByteArray_AS_STRING (retval);
+	for (i = 0; i < num; i++) {
+		Py_buffer view;
+		int err;
+		if (PyObject_GetBuffer (PySequence_Fast_GET_ITEM (seq, i), &view, PyBUF_SIMPLE)) {
+			Py_CLEAR (retval);
+			goto done;
+		}
+		err = quickder_time2epoch ((uint8_t *) view.buf, view.len, yearlen, &epochs [i]);
+		PyBuffer_Release (&view);
+		if (err) {
+			PyErr_Format (PyExc_ValueError, "Malformed %s at index %zd",
+				(yearlen == 2)? "UTCTime": "GeneralizedTime", i);
+			Py_CLEAR (retval);
+			goto done;
+		}
+	}
+done:
+	Py_DECREF (seq);
+	return retval;
+}
 
-	#if PY_MAJOR_VERSION >= 3
-	retval = PyUnicode_FromStringAndSize ((char *)packed, packedlen);
-	#else
-	retval = PyString_FromStringAndSize ((char *)packed, packedlen);
-	#endif
 
+/* The number of alternatives that der_column() takes for a column */
+#define QUICKDER_COLUMN_ALTERNATIVES 16
 
-	if (retval == NULL) {
+
+/* Convert the contents of an INTEGER, ENUMERATED or BOOLEAN into a native
+ * 64-bit value.  Returns -1 when the value is malformed, or -2 when it
+ * does not fit.
+ */
+static int quickder_content2int (const uint8_t *txt, Py_ssize_t len, uint8_t tag, int64_t *value) {
+	uint64_t val;
+	Py_ssize_t i;
+	if (tag == DER_TAG_BOOLEAN) {
+		if (len != 1) {
+			return -1;
+		}
+		*value = (txt [0] != 0x00);
+		return 0;
+	}
+	if (len == 0) {
+		return -1;
+	}
+	if (len > 8) {
+		return -2;
+	}
+	// Sign extend the first byte, then shift in the others
+	val = (txt [0] & 0x80)? ~ (uint64_t) 0: 0;
+	for (i = 0; i < len; i++) {
+		val = (val << 8) | txt [i];
+	}
+	*value = (int64_t) val;
+	return 0;
+}
+
+
+/* _quickder.der_column (records, table, numcursori, alternatives, missing)
+ *     -> bytearray
+ *
+ * Convert one column of the table of unpack_batch() into a bytearray of
+ * native 64-bit values, one for each record.  The records are the ones
+ * that were passed to unpack_batch().  The alternatives are a sequence of
+ * (cursor, tag) pairs, such as the alternatives of a CHOICE; the value of
+ * each record is taken from the first cursor that is present, or it is set
+ * to missing when none is.  The tag tells how the contents are converted:
+ * DER_TAG_INTEGER, DER_TAG_ENUMERATED and DER_TAG_BOOLEAN give their value,
+ * DER_TAG_UTCTIME and DER_TAG_GENERALIZEDTIME give seconds since the epoch.
+ */
+static PyObject *quickder_column (PyObject *self, PyObject *args) {
+	PyObject *records;
+	PyObject *alternatives;
+	PyObject *seq = NULL;
+	PyObject *altseq = NULL;
+	PyObject *retval = NULL;
+	Py_buffer table;
+	Py_buffer whole;
+	int numcursori;
+	long long missing;
+	bool concat;
+	Py_ssize_t numalts;
+	Py_ssize_t alt;
+	Py_ssize_t numrecords;
+	Py_ssize_t rec;
+	int cursors [QUICKDER_COLUMN_ALTERNATIVES];
+	int tags [QUICKDER_COLUMN_ALTERNATIVES];
+	int64_t *values;
+	if (!PyArg_ParseTuple (args, "O" QUICKDER_BUFARG "iOL", &records, &table, &numcursori, &alternatives, &missing)) {
 		return NULL;
 	}
-	// "retval" is a new reference, with a copy of packed
+	whole.obj = NULL;
+	if ((numcursori <= 0) || (table.len % (2 * sizeof (int64_t) * numcursori) != 0)) {
+		PyErr_SetString (PyExc_ValueError, "der_column() needs a table of unpack_batch()");
+		goto done;
+	}
+	numrecords = table.len / (2 * sizeof (int64_t) * numcursori);
+	//
+	// Check the alternatives
+	altseq = PySequence_Fast (alternatives, "der_column() expects a sequence of (cursor, tag) pairs");
+	if (altseq == NULL) {
+		goto done;
+	}
+	numalts = PySequence_Fast_GET_SIZE (altseq);
+	if ((numalts < 1) || (numalts > QUICKDER_COLUMN_ALTERNATIVES)) {
+		PyErr_SetString (PyExc_ValueError, "der_column() takes 1 to 16 alternatives");
+		goto done;
+	}
+	for (alt = 0; alt < numalts; alt++) {
+		if (!PyArg_ParseTuple (PySequence_Fast_GET_ITEM (altseq, alt), "ii", &cursors [alt], &tags [alt])) {
+			goto done;
+		}
+		if ((cursors [alt] < 0) || (cursors [alt] >= numcursori)) {
+			PyErr_SetString (PyExc_ValueError, "der_column() cursor out of range");
+			goto done;
+		}
+		if ((tags [alt] != DER_TAG_INTEGER) && (tags [alt] != DER_TAG_ENUMERATED) &&
+				(tags [alt] != DER_TAG_BOOLEAN) &&
+				(tags [alt] != DER_TAG_UTCTIME) && (tags [alt] != DER_TAG_GENERALIZEDTIME)) {
+			PyErr_SetString (PyExc_ValueError, "der_column() cannot convert values with this tag");
+			goto done;
+		}
+	}
+	//
+	// Pin the concatenated records, or find the sequence of records
+	concat = PyObject_CheckBuffer (records);
+	if (concat) {
+		if (PyObject_GetBuffer (records, &whole, PyBUF_SIMPLE)) {
+			whole.obj = NULL;
+			goto done;
+		}
+	} else {
+		seq = PySequence_Fast (records, "der_column() expects a buffer or a sequence of buffers");
+		if (seq == NULL) {
+			goto done;
+		}
+		if (PySequence_Fast_GET_SIZE (seq) != numrecords) {
+			PyErr_SetString (PyExc_ValueError, "der_column() needs as many records as the table holds");
+			goto done;
+		}
+	}
+	retval = PyByteArray_FromStringAndSize (NULL, numrecords * sizeof (int64_t));
+	if (retval == NULL) {
+		goto done;
+	}
+	values = (int64_t *) PyByteArray_AS_STRING (retval);
+	//
+	// Convert the first alternative that is present in each record
+	for (rec = 0; rec < numrecords; rec++) {
+		int64_t *entry = NULL;
+		Py_buffer single;
+		Py_buffer *view = &whole;
+		int err;
+		for (alt = 0; alt < numalts; alt++) {
+			entry = ((int64_t *) table.buf) + 2 * (rec * numcursori + cursors [alt]);
+			if (entry [0] >= 0) {
+				break;
+			}
+		}
+		if (alt == numalts) {
+			values [rec] = (int64_t) missing;
+			continue;
+		}
+		if (!concat) {
+			view = &single;
+			if (PyObject_GetBuffer (PySequence_Fast_GET_ITEM (seq, rec), view, PyBUF_SIMPLE)) {
+				Py_CLEAR (retval);
+				goto done;
+			}
+		}
+		if ((entry [1] < 0) || (entry [0] > view->len) || (entry [1] > view->len - entry [0])) {
+			err = -3;
+		} else if ((tags [alt] == DER_TAG_UTCTIME) || (tags [alt] == DER_TAG_GENERALIZEDTIME)) {
+			err = quickder_time2epoch (((uint8_t *) view->buf) + entry [0], entry [1],
+					(tags [alt] == DER_TAG_UTCTIME)? 2: 4, &values [rec]);
+		} else {
+			err = quickder_content2int (((uint8_t *) view->buf) + entry [0], entry [1],
+					tags [alt], &values [rec]);
+		}
+		if (!concat) {
+			PyBuffer_Release (view);
+		}
+		if (err == -2) {
+			PyErr_Format (PyExc_OverflowError, "Value in record %zd does not fit in 64 bits", rec);
+		} else if (err == -3) {
+			PyErr_Format (PyExc_ValueError, "Table entry of record %zd is out of range", rec);
+		} else if (err != 0) {
+			PyErr_Format (PyExc_ValueError, "Malformed value in record %zd", rec);
+		}
+		if (err != 0) {
+			Py_CLEAR (retval);
+			goto done;
+		}
+	}
 	//
 	// Cleanup and return
+done:
+	if (whole.obj != NULL) {
+		PyBuffer_Release (&whole);
+	}
+	Py_XDECREF (seq);
+	Py_XDECREF (altseq);
+	PyBuffer_Release (&table);
 	return retval;
 }
 
 
-/* _quickder.der_header (cursor) -> (tag, len, hlen) */
-static PyObject *quickder_header (PyObject *self, PyObject *args) {
-	char *buf;
-	Py_ssize_t buflen;
+/* An element that der_sort() orders, with its position in the input */
+typedef struct {
 	dercursor crs;
+	Py_ssize_t pos;
+} quickder_sortelem;
+
+/* Compare two elements as der_cmp() does, keeping the input order for
+ * equal ones, so the sort is stable.
+ */
+static int quickder_sortcmp (const void *a, const void *b) {
+	const quickder_sortelem *ea = (const quickder_sortelem *) a;
+	const quickder_sortelem *eb = (const quickder_sortelem *) b;
+	int cmp = der_cmp (ea->crs, eb->crs);
+	if (cmp != 0) {
+		return cmp;
+	}
+	return (ea->pos > eb->pos) - (ea->pos < eb->pos);
+}
+
+/* _quickder.der_sort (elements) -> list
+ *
+ * Return a list with the elements, which are buffers holding DER, in the
+ * order that DER prescribes for the elements of a SET OF.  The encodings
+ * are compared as octet strings with der_cmp(), where an encoding that is
+ * a prefix of another comes first.  Equal encodings keep their order.
+ */
+static PyObject *quickder_sort (PyObject *self, PyObject *args) {
+	PyObject *elements;
+	PyObject *seq;
 	PyObject *retval = NULL;
-	//
-	// Verify and obtain invocation arguments
-	if (!PyArg_ParseTuple (args, "s#", &buf, &buflen)) {
+	Py_buffer *views = NULL;
+	quickder_sortelem *order = NULL;
+	Py_ssize_t num;
+	Py_ssize_t numviews = 0;
+	Py_ssize_t i;
+	if (!PyArg_ParseTuple (args, "O", &elements)) {
 		return NULL;
 	}
-	//
-	// Retrieve header information
-	crs.derptr = (uint8_t *)buf;
-	crs.derlen = buflen;
-	uint8_t tag;
-	size_t len;
-	uint8_t hlen;
-	if (der_header (&crs, &tag, &len, &hlen)) {
-		PyErr_SetFromErrno (PyExc_OSError);
+	seq = PySequence_Fast (elements, "der_sort() expects a sequence of buffers");
+	if (seq == NULL) {
 		return NULL;
 	}
+	num = PySequence_Fast_GET_SIZE (seq);
+	views = quickder_scratch_alloc ((num + 1) * sizeof (Py_buffer));
+	order = quickder_scratch_alloc ((num + 1) * sizeof (quickder_sortelem));
+	if ((views == NULL) || (order == NULL)) {
+		goto done;
+	}
 	//
-	// Form a tuple with the values tag, len, hlen
-	retval = Py_BuildValue ("(iii)",
-			(int) tag,
-			(int) len,
-			(int) hlen);
+	// Pin the buffers of the elements while they are sorted
+	for (i = 0; i < num; i++) {
+		if (PyObject_GetBuffer (PySequence_Fast_GET_ITEM (seq, i), &views [i], PyBUF_SIMPLE)) {
+			goto done;
+		}
+		numviews++;
+		order [i].crs.derptr = (uint8_t *) views [i].buf;
+		order [i].crs.derlen = views [i].len;
+		order [i].pos = i;
+	}
+	Py_BEGIN_ALLOW_THREADS
+	qsort (order, num, sizeof (quickder_sortelem), quickder_sortcmp);
+	Py_END_ALLOW_THREADS
+	retval = PyList_New (num);
 	if (retval == NULL) {
-		return NULL;
+		goto done;
+	}
+	for (i = 0; i < num; i++) {
+		PyObject *elem = PySequence_Fast_GET_ITEM (seq, order [i].pos);
+		Py_INCREF (elem);
+		PyList_SET_ITEM (retval, i, elem);
 	}
-	// "retval" is a new reference
 	//
 	// Cleanup and return
+done:
+	for (i = 0; i < numviews; i++) {
+		PyBuffer_Release (&views [i]);
+	}
+	quickder_scratch_free (views, (num + 1) * sizeof (Py_buffer));
+	quickder_scratch_free (order, (num + 1) * sizeof (quickder_sortelem));
+	Py_DECREF (seq);
 	return retval;
 }
 
 
+/* _quickder.der_nogil_minsize ([minsize]) -> minsize
+ *
+ * Return the input or output size from which the GIL is released, after
+ * setting it to minsize when given.  Use 0 to always release the GIL.
+ */
+static PyObject *quickder_nogil (PyObject *self, PyObject *args) {
+	Py_ssize_t minsize = -1;
+	if (!PyArg_ParseTuple (args, "|n", &minsize)) {
+		return NULL;
+	}
+	if (minsize >= 0) {
+		quickder_nogil_minsize = minsize;
+	}
+	return PyLong_FromSsize_t (quickder_nogil_minsize);
+}
+
+
 static PyMethodDef der_methods [] = {
 	{ "der_unpack", quickder_unpack, METH_VARARGS, "Unpack from DER encoding with Quick DER" },
 	{ "der_pack",   quickder_pack,   METH_VARARGS, "Pack into DER encoding with Quick DER" },
+	{ "der_encode", quickder_encode, METH_VARARGS, "Encode a tree of values into DER in one pass" },
 	{ "der_header", quickder_header, METH_VARARGS, "Analyse a DER header with Quick DER" },
+	{ "der_iterate", quickder_iterate, METH_VARARGS, "Iterate over back-to-back DER elements" },
+	{ "der_countelements", quickder_countelements, METH_VARARGS, "Count back-to-back DER elements" },
+	{ "der_epochs", quickder_epochs, METH_VARARGS, "Convert DER time values to seconds since the epoch" },
+	{ "der_column", quickder_column, METH_VARARGS, "Convert a cursor of an unpack_batch() table to 64-bit values" },
+	{ "der_sort", quickder_sort, METH_VARARGS, "Sort DER elements into the canonical order of a SET OF" },
+	{ "der_nogil_minsize", quickder_nogil, METH_VARARGS, "Get or set the size from which the GIL is released" },
 	{ NULL, NULL, 0, NULL }
 };
 
@@ -232,6 +2020,20 @@ char module___doc__[] = "Quick `n' Easy DER library";
 #endif
 
 
+/* Ready a type and add it to the module; returns -1 on failure. */
+static int quickder_addtype (PyObject *m, const char *name, PyTypeObject *type) {
+	if (PyType_Ready (type) < 0) {
+		return -1;
+	}
+	Py_INCREF (type);
+	if (PyModule_AddObject (m, name, (PyObject *) type)) {
+		Py_DECREF (type);
+		return -1;
+	}
+	return 0;
+}
+
+
 static PyObject *
 moduleinit(void)
 {
@@ -246,6 +2048,24 @@ moduleinit(void)
 	if (m == NULL)
 		return NULL;
 
+	if (quickder_addtype (m, "Packer", &QuickDERPackerType) ||
+	    quickder_addtype (m, "Walker", &QuickDERWalkerType) ||
+	    quickder_addtype (m, "ElementIterator", &QuickDERElementIteratorType)) {
+#if PY_MAJOR_VERSION >= 3
+		Py_DECREF (m);
+#endif
+		return NULL;
+	}
+
+	if (PyModule_AddIntConstant (m, "UNPACK_COPY",   QUICKDER_UNPACK_COPY  ) ||
+	    PyModule_AddIntConstant (m, "UNPACK_VIEW",   QUICKDER_UNPACK_VIEW  ) ||
+	    PyModule_AddIntConstant (m, "UNPACK_OFFSET", QUICKDER_UNPACK_OFFSET)) {
+#if PY_MAJOR_VERSION >= 3
+		Py_DECREF (m);
+#endif
+		return NULL;
+	}
+
   return m;
 }
 
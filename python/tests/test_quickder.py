@@ -0,0 +1,907 @@
+import sys
+import unittest
+
+try:
+    import _quickder
+except ImportError:
+    _quickder = None
+
+from quick_der.packstx import *
+
+
+def packer(*cmds):
+    return bytes(bytearray(cmds))
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestPacker(unittest.TestCase):
+    # SEQUENCE { INTEGER, OCTET STRING OPTIONAL, CHOICE { BOOLEAN, NULL } }
+    pck = packer(DER_PACK_ENTER | DER_TAG_SEQUENCE,
+                 DER_PACK_STORE | DER_TAG_INTEGER,
+                 DER_PACK_OPTIONAL,
+                 DER_PACK_STORE | DER_TAG_OCTETSTRING,
+                 DER_PACK_CHOICE_BEGIN,
+                 DER_PACK_STORE | DER_TAG_BOOLEAN,
+                 DER_PACK_STORE | DER_TAG_NULL,
+                 DER_PACK_CHOICE_END,
+                 DER_PACK_LEAVE,
+                 DER_PACK_END)
+
+    def test_roundtrip(self):
+        cpk = _quickder.Packer(self.pck)
+        self.assertEqual(cpk.numcursori, 4)
+        self.assertEqual(cpk.packer, self.pck)
+        values = [b'\x2a', None, b'\xff', None]
+        derblob = cpk.pack(values)
+        self.assertEqual(derblob, _quickder.der_pack(self.pck, values))
+        self.assertEqual(cpk.unpack(derblob), values)
+        self.assertEqual(cpk.unpack(derblob), _quickder.der_unpack(self.pck, derblob, 4))
+
+    @unittest.skipUnless(sys.version_info >= (3,), 'memoryview.obj needs Python 3')
+    def test_unpack_modes(self):
+        import mmap
+        cpk = _quickder.Packer(self.pck)
+        derblob = cpk.pack([b'\x2a', b'ab', None, b''])
+        mapped = mmap.mmap(-1, len(derblob))
+        mapped.write(derblob)
+        for source in [derblob, bytearray(derblob), memoryview(derblob), mapped]:
+            exporter = source.obj if isinstance(source, memoryview) else source
+            for unpack in [cpk.unpack, lambda bin, mode: _quickder.der_unpack(self.pck, bin, 4, mode)]:
+                self.assertEqual(unpack(source, _quickder.UNPACK_COPY), [b'\x2a', b'ab', None, b''])
+                self.assertEqual(unpack(source, _quickder.UNPACK_OFFSET), [(4, 1), (7, 2), None, (11, 0)])
+                views = unpack(source, _quickder.UNPACK_VIEW)
+                self.assertEqual(views[2], None)
+                for view in [views[0], views[1], views[3]]:
+                    self.assertTrue(isinstance(view, memoryview))
+                    self.assertTrue(view.obj is exporter)
+                self.assertEqual([bytes(view) for view in [views[0], views[1], views[3]]], [b'\x2a', b'ab', b''])
+        # Views share the memory of mutable sources
+        for source in [bytearray(derblob), mapped]:
+            views = cpk.unpack(source, _quickder.UNPACK_VIEW)
+            source[7:9] = b'cd'
+            self.assertEqual(bytes(views[1]), b'cd')
+            del views
+        # Absent OPTIONAL values and CHOICE alternatives have no offset
+        other = bytearray(cpk.pack([b'\x07', None, b'\xff', None]))
+        self.assertEqual(cpk.unpack(other, _quickder.UNPACK_OFFSET), [(4, 1), None, (7, 1), None])
+        self.assertEqual(cpk.unpack(other, _quickder.UNPACK_VIEW)[1], None)
+        self.assertRaises(ValueError, cpk.unpack, derblob, 3)
+
+    def test_malformed(self):
+        for pck in [packer(DER_PACK_ENTER | DER_TAG_SEQUENCE, DER_PACK_END),
+                    packer(DER_PACK_OPTIONAL, DER_PACK_OPTIONAL, DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END),
+                    packer(DER_PACK_CHOICE_BEGIN, DER_PACK_OPTIONAL, DER_PACK_STORE | DER_TAG_INTEGER,
+                           DER_PACK_CHOICE_END, DER_PACK_END),
+                    packer(DER_PACK_OPTIONAL, DER_PACK_END)]:
+            self.assertRaises(ValueError, _quickder.Packer, pck)
+
+    def test_nogil(self):
+        saved = _quickder.der_nogil_minsize()
+        self.assertEqual(saved, 512)
+        values = [b'\x2a', b'x' * 1000, b'\xff', None]
+        try:
+            for minsize in [0, 100000]:
+                self.assertEqual(_quickder.der_nogil_minsize(minsize), minsize)
+                derblob = _quickder.der_pack(self.pck, values)
+                self.assertEqual(_quickder.der_unpack(self.pck, derblob, 4), values)
+        finally:
+            _quickder.der_nogil_minsize(saved)
+        self.assertEqual(_quickder.der_nogil_minsize(), saved)
+
+    def test_scratch_tiers(self):
+        # Cursor arrays of 16 bytes per cursor, around each scratch tier
+        # size and above the largest, in an order that reuses blocks
+        counts = []
+        for tiersize in [512, 4096, 32768, 262144]:
+            counts += [tiersize // 16 - 1, tiersize // 16, tiersize // 16 + 1]
+        counts.append(3 * 262144 // 16)
+        cpk = _quickder.Packer(packer(DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END))
+        for count in counts + counts[::-1] + counts:
+            values = [bytes(bytearray([(count + n) & 0x7f])) for n in range(count)]
+            elements = [b'\x02\x01' + value for value in values]
+            self.assertEqual(cpk.unpack_each(b''.join(elements)), [[value] for value in values])
+            pck = packer(*([DER_PACK_ENTER | DER_TAG_SEQUENCE] + [DER_PACK_STORE | DER_TAG_INTEGER] * count +
+                           [DER_PACK_LEAVE, DER_PACK_END]))
+            derblob = _quickder.der_pack(pck, values)
+            self.assertEqual(derblob[-3 * count:], b''.join(elements))
+            self.assertEqual(_quickder.der_unpack(pck, derblob, count), values)
+            self.assertEqual(_quickder.der_sort(elements), sorted(elements))
+
+    def test_wrong_count(self):
+        cpk = _quickder.Packer(self.pck)
+        self.assertRaises(ValueError, cpk.pack, [b'\x2a'])
+
+    def test_encode(self):
+        values = [b'\x2a', bytearray(b'x' * 200), None, b'']
+        self.assertEqual(_quickder.der_encode(self.pck, values), _quickder.der_pack(self.pck, values))
+        # SEQUENCE OF the record above, nested in another SEQUENCE OF
+        seqof = packer(DER_PACK_STORE | DER_TAG_SEQUENCE, DER_PACK_END)
+        records = [_quickder.der_pack(self.pck, [bytes(bytearray([n])), None, b'\xff', None]) for n in range(3)]
+        inner = [(self.pck, [bytes(bytearray([n])), None, b'\xff', None]) for n in range(2)] + records[2:]
+        derblob = _quickder.der_encode(seqof, [[(seqof, [inner])]])
+        self.assertEqual(derblob, _quickder.der_pack(seqof, [_quickder.der_pack(seqof, [b''.join(records)])]))
+        self.assertEqual(_quickder.der_encode(seqof, [[]]), b'\x30\x00')
+        self.assertRaises(ValueError, _quickder.der_encode, seqof, [])
+        self.assertRaises(ValueError, _quickder.der_encode, seqof, [[(self.pck, [b'\x2a'])]])
+        self.assertRaises(TypeError, _quickder.der_encode, seqof, [[(self.pck,)]])
+
+    def test_unpack_batch(self):
+        cpk = _quickder.Packer(self.pck)
+        records = [cpk.pack([bytes(bytearray([n])), None, b'\x00', None]) for n in range(3)]
+        table = cpk.unpack_batch(b''.join(records))
+        self.assertEqual(len(table), 3 * 4 * 2 * 8)
+        table = memoryview(table).cast('q').tolist()
+        derblob = b''.join(records)
+        for (rec, values) in enumerate([cpk.unpack(r) for r in records]):
+            for (crs, value) in enumerate(values):
+                (ofs, ln) = table[2 * (rec * 4 + crs): 2 * (rec * 4 + crs) + 2]
+                if value is None:
+                    self.assertEqual(ofs, -1)
+                else:
+                    self.assertEqual(derblob[ofs:ofs + ln], value)
+        self.assertEqual(cpk.unpack_batch(records), cpk.unpack_batch([bytearray(r) for r in records]))
+        self.assertRaises(OSError, cpk.unpack_batch, b''.join(records)[:-1])
+
+
+class RecordTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from quick_der import api
+
+        # Rec ::= SEQUENCE { num INTEGER, name OCTET STRING OPTIONAL,
+        #                    pick CHOICE { flag BOOLEAN, none NULL } }
+        class Rec(api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = TestPacker.pck
+            _recipe = ('_NAMED', {'num': 0, 'name': 1, 'pick': ('_NAMED', {'flag': 2, 'none': 3})})
+            _context = {}
+            _numcursori = 4
+
+        self.api = api
+        self.Rec = Rec
+        self.derblob = _quickder.der_pack(TestPacker.pck, [b'\x2a', b'ab', None, b''])
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestWalk(RecordTestCase):
+
+    def test_walk(self):
+        self.assertEqual(self.api.der_walk(self.Rec, 'num', self.derblob), b'\x2a')
+        self.assertEqual(self.api.der_walk(self.Rec, 'name', self.derblob), b'ab')
+        self.assertEqual(self.api.der_walk(self.Rec, 'pick.none', self.derblob), b'')
+        self.assertEqual(self.api.der_walk(self.Rec, 'pick.flag', self.derblob), None)
+        self.assertEqual(self.api.der_walk(self.Rec, 'name', self.derblob, _quickder.UNPACK_OFFSET), (7, 2))
+        derblob = _quickder.der_pack(TestPacker.pck, [b'\x2a', None, b'\xff', None])
+        self.assertEqual(self.api.der_walk(self.Rec, 'name', derblob), None)
+        self.assertEqual(self.api.der_walk(self.Rec, 'pick.flag', derblob), b'\xff')
+        self.assertRaises(ValueError, self.api.der_compile_path, self.Rec, 'pick')
+        self.assertRaises(ValueError, self.api.der_compile_path, self.Rec, 'nonesuch')
+
+    def test_explicit(self):
+        # Tagged ::= SEQUENCE { version [0] EXPLICIT INTEGER OPTIONAL, num INTEGER }
+        class Tagged(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(DER_PACK_ENTER | DER_TAG_SEQUENCE,
+                                 DER_PACK_OPTIONAL,
+                                 DER_PACK_ENTER | DER_TAG_CONTEXT(0),
+                                 DER_PACK_STORE | DER_TAG_INTEGER,
+                                 DER_PACK_LEAVE,
+                                 DER_PACK_STORE | DER_TAG_INTEGER,
+                                 DER_PACK_LEAVE,
+                                 DER_PACK_END)
+            _recipe = ('_NAMED', {'version': 0, 'num': 1})
+            _context = {}
+            _numcursori = 2
+
+        for version in [b'\x02', None]:
+            derblob = _quickder.der_pack(Tagged._der_packer, [version, b'\x2a'])
+            self.assertEqual(self.api.der_walk(Tagged, 'version', derblob), version)
+            self.assertEqual(self.api.der_walk(Tagged, 'version', derblob),
+                             self.api.der_project(Tagged, ['version'], derblob)[0])
+            self.assertEqual(self.api.der_walk(Tagged, 'num', derblob), b'\x2a')
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestIterate(unittest.TestCase):
+    elements = b'\x02\x01\x05\x04\x02ab\x05\x00'
+
+    def test_iterate(self):
+        self.assertEqual(list(_quickder.der_iterate(self.elements)), [b'\x02\x01\x05', b'\x04\x02ab', b'\x05\x00'])
+        self.assertEqual(list(_quickder.der_iterate(self.elements, _quickder.UNPACK_OFFSET)), [(0, 3), (3, 4), (7, 2)])
+        self.assertEqual(_quickder.der_countelements(self.elements), 3)
+        self.assertEqual(_quickder.der_countelements(b''), 0)
+        for bad in [self.elements + b'\x02', self.elements + b'\x02\x05\x01']:
+            self.assertRaises(OSError, list, _quickder.der_iterate(bad))
+            self.assertRaises(OSError, _quickder.der_countelements, bad)
+
+    def test_unpack_each(self):
+        cpk = _quickder.Packer(packer(DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END))
+        seqof = b''.join([cpk.pack([bytes(bytearray([n]))]) for n in range(5)])
+        self.assertEqual(cpk.unpack_each(seqof), [[bytes(bytearray([n]))] for n in range(5)])
+        self.assertEqual(cpk.unpack_each(b''), [])
+        self.assertRaises(OSError, cpk.unpack_each, self.elements)
+
+    def test_sort(self):
+        first = bytearray(b'\x02\x01\x05')
+        second = b'\x02\x01\x05'
+        ordered = _quickder.der_sort([b'\x05\x00', first, b'\x04\x02ab', b'\x02\x01\x85', second, b'\x02\x01'])
+        self.assertEqual(ordered, [b'\x02\x01', first, second, b'\x02\x01\x85', b'\x04\x02ab', b'\x05\x00'])
+        self.assertTrue(ordered[1] is first and ordered[2] is second)
+        self.assertEqual(_quickder.der_sort([]), [])
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestStream(unittest.TestCase):
+    # Short and long form lengths, and a BIT STRING that needs its contents
+    elements = [b'\x02\x01\x05', b'\x04\x81\x80' + b'a' * 128, b'\x04\x82\x01\x00' + b'b' * 256, b'\x03\x02\x00\xff']
+
+    def test_chunks(self):
+        from quick_der import stream
+        derblob = b''.join(self.elements)
+        for size in [1, 2, 3, 7, 130, len(derblob)]:
+            framer = stream.DERFramer()
+            found = []
+            for pos in range(0, len(derblob), size):
+                found += [elem.tobytes() for elem in framer.feed(derblob[pos:pos + size])]
+            framer.close()
+            self.assertEqual(found, self.elements)
+        # Whole elements in a chunk are views into that chunk
+        (elem,) = stream.DERFramer().feed(self.elements[1])
+        self.assertTrue(elem.obj is self.elements[1])
+
+    def test_limits(self):
+        from quick_der import stream
+        framer = stream.DERFramer(maxsize=200)
+        self.assertEqual(framer.feed(self.elements[0] + self.elements[1][:10]), [self.elements[0]])
+        self.assertEqual(framer.pending(), 10)
+        self.assertRaises(ValueError, framer.close)
+        self.assertRaises(ValueError, stream.DERFramer(maxsize=200).feed, self.elements[2][:4])
+        self.assertRaises(ValueError, stream.DERFramer().feed, b'\x30\x80')
+        self.assertRaises(ValueError, stream.DERFramer().feed, b'\x30\x89')
+
+    def test_read_stream(self):
+        import io
+        from quick_der import stream
+        found = stream.der_read_stream(io.BytesIO(b''.join(self.elements)), chunksize=100)
+        self.assertEqual([elem.tobytes() for elem in found], self.elements)
+        self.assertRaises(ValueError, list, stream.der_read_stream(io.BytesIO(self.elements[1][:-1])))
+
+
+@unittest.skipUnless(_quickder and sys.version_info >= (3, 5), 'needs _quickder and asyncio')
+class TestAio(RecordTestCase):
+
+    def test_echo(self):
+        import asyncio
+        import socket
+        from concurrent.futures import ThreadPoolExecutor
+        from quick_der import aio
+        received = []
+
+        class Echo(aio.DERProtocol):
+            def message_received(self, msg):
+                received.append(msg.name)
+                self.send(msg)
+
+        # The last record is large enough to be decoded by the executor
+        names = [b'a', b'b' * 300, b'c' * 5000, b'd']
+        records = [_quickder.der_pack(TestPacker.pck, [b'\x2a', name, None, b'']) for name in names]
+
+        loop = asyncio.new_event_loop()
+        (srvsock, clisock) = socket.socketpair()
+        try:
+            with ThreadPoolExecutor(1) as executor:
+                loop.run_until_complete(loop.connect_accepted_socket(
+                    lambda: Echo(self.Rec, executor=executor, offload_size=1000), srvsock))
+                (reader, writer) = loop.run_until_complete(asyncio.open_connection(sock=clisock))
+                stream = aio.DERStream(reader, writer, self.Rec, chunksize=7)
+                for rec in records:
+                    loop.run_until_complete(stream.write(rec))
+                echoed = [loop.run_until_complete(asyncio.wait_for(stream.__anext__(), 10))._der_pack()
+                          for _ in records]
+                loop.run_until_complete(stream.close())
+        finally:
+            loop.close()
+            srvsock.close()
+        self.assertEqual(received, names)
+        self.assertEqual(echoed, records)
+
+    def test_errors(self):
+        import asyncio
+        from quick_der import aio
+        loop = asyncio.new_event_loop()
+        try:
+            reader = asyncio.StreamReader(loop=loop)
+            reader.feed_data(self.derblob[:-1])
+            reader.feed_eof()
+            stream = aio.DERStream(reader, None, self.Rec)
+            self.assertRaises(ValueError, loop.run_until_complete, stream.read())
+        finally:
+            loop.close()
+        closed = []
+
+        class Transport(object):
+            def close(self):
+                closed.append(True)
+
+        proto = aio.DERProtocol(self.Rec, maxsize=8)
+        proto.connection_made(Transport())
+        proto.data_received(self.derblob + self.derblob)
+        self.assertEqual(closed, [True])
+
+
+if _quickder:
+    from quick_der import api as _api
+
+    # The worker processes of der_load_parallel() find the class and the
+    # projection by name, so these are defined at the top level
+    class ParallelRec(_api.ASN1ConstructedType):
+        __slots__ = ()
+        _der_packer = TestPacker.pck
+        _recipe = ('_NAMED', {'num': 0, 'name': 1, 'pick': ('_NAMED', {'flag': 2, 'none': 3})})
+        _context = {}
+        _numcursori = 4
+
+
+def parallel_projection(rec):
+    import os
+    return (rec.num, rec.name, rec.pick.none, rec, os.getpid())
+
+
+@unittest.skipUnless(_quickder and sys.version_info >= (3,), 'needs _quickder and Python 3')
+class TestLoader(RecordTestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        super(TestLoader, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.records = [_quickder.der_pack(TestPacker.pck, [b'\x2a', name, None, b''])
+                        for name in [b'a', b'b' * 300, b'c' * 5000]]
+
+    def write(self, name, data):
+        import os
+        with open(os.path.join(self.tmpdir, name), 'wb') as fileobj:
+            fileobj.write(data)
+
+    def test_der(self):
+        from quick_der import loader
+        self.write('recs.der', b''.join(self.records) * 3)
+        # Windows that cut through elements, and one that holds the file
+        for window in [16, 1000, 4096, None]:
+            found = [elem.tobytes() for elem in loader.der_map(self.tmpdir, window=window)]
+            self.assertEqual(found, self.records * 3)
+        recs = list(loader.der_load(self.Rec, self.tmpdir, window=1000))
+        self.assertEqual([rec.name for rec in recs], [b'a', b'b' * 300, b'c' * 5000] * 3)
+        self.assertTrue(all(isinstance(rec._bindata[0], memoryview) for rec in recs))
+        self.assertEqual(recs[2]._der_pack(), self.records[2])
+        self.write('recs.der', b''.join(self.records)[:-1])
+        self.assertRaises(ValueError, list, loader.der_map(self.tmpdir))
+        self.assertRaises(ValueError, list, loader.der_map(self.tmpdir, maxsize=1000))
+
+    def test_pem(self):
+        import base64
+        from quick_der import loader
+        pem = b''.join([b'-----BEGIN REC-----\n' + base64.encodebytes(rec) + b'-----END REC-----\n'
+                        for rec in self.records])
+        self.write('recs.pem', b'Some text\n' + pem)
+        self.write('more.pem', pem)
+        for window in [100, None]:
+            found = [elem.tobytes() for elem in loader.der_map(self.tmpdir, pem=True, window=window)]
+            self.assertEqual(found, self.records * 2)
+        recs = list(loader.der_load(self.Rec, self.tmpdir + '/more.pem'))
+        self.assertEqual([rec.name for rec in recs], [b'a', b'b' * 300, b'c' * 5000])
+
+    def test_str(self):
+        from quick_der import loader
+
+        # Name ::= SEQUENCE { cn PrintableString, org UTF8String }
+        class Name(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(DER_PACK_ENTER | DER_TAG_SEQUENCE,
+                                 DER_PACK_STORE | DER_TAG_PRINTABLESTRING,
+                                 DER_PACK_STORE | DER_TAG_UTF8STRING,
+                                 DER_PACK_LEAVE,
+                                 DER_PACK_END)
+            _recipe = ('_NAMED', {'cn': ('_TYPTR', ['_api.ASN1PrintableString'], 0),
+                                  'org': ('_TYPTR', ['_api.ASN1UTF8String'], 1)})
+            _context = {'_api': self.api}
+            _numcursori = 2
+
+        self.write('names.der', _quickder.der_pack(Name._der_packer, [b'ab', u'\xe9t\xe9'.encode('utf-8')]))
+        (name,) = loader.der_load(Name, self.tmpdir)
+        self.assertTrue(isinstance(name._bindata[0], memoryview))
+        self.assertEqual((str(name.cn), str(name.org)), ('"ab"', u'"\xe9t\xe9"'))
+        self.assertTrue('cn "ab"' in str(name))
+        self.assertEqual(str(self.api.ASN1PrintableString(bindata=[memoryview(b'ab')], context={})), '"ab"')
+
+
+    def test_parallel(self):
+        import os
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        from quick_der import parallel
+        self.write('recs.der', b''.join(self.records) * 3)
+        # Projections come back in order, without memoryviews or objects
+        with ThreadPoolExecutor(2) as executor:
+            found = list(parallel.der_load_parallel(self.Rec, self.tmpdir, lambda rec: (rec.num, [rec.name, rec.pick.none]),
+                                                    shard_size=1000, executor=executor))
+        self.assertEqual(found, [(b'\x2a', [name, b'']) for name in [b'a', b'b' * 300, b'c' * 5000]] * 3)
+        # Worker processes receive the class and projection by pickling
+        with ProcessPoolExecutor(2) as executor:
+            found = list(parallel.der_load_parallel(ParallelRec, self.tmpdir, parallel_projection,
+                                                    shard_size=1000, executor=executor))
+        self.assertEqual([result[:3] for result in found],
+                         [(b'\x2a', name, b'') for name in [b'a', b'b' * 300, b'c' * 5000]] * 3)
+        self.assertEqual([result[3] for result in found], self.records * 3)
+        for result in found:
+            self.assertEqual(type(result), tuple)
+            self.assertEqual([type(value) for value in result[:4]], [bytes] * 4)
+        self.assertFalse(os.getpid() in [result[4] for result in found])
+        # Shards end at the first element boundary past their size
+        filename = self.tmpdir + '/recs.der'
+        size = len(b''.join(self.records))
+        self.assertEqual(list(parallel._shards([filename], None, 10000, 1000)),
+                         [(filename, 0, size), (filename, size, 2 * size), (filename, 2 * size, None)])
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestLazy(RecordTestCase):
+
+    def test_lazy(self):
+        rec = self.Rec(derblob=self.derblob, lazy=True)
+        self.assertEqual(rec._fields, {})
+        self.assertEqual(rec.name, b'ab')
+        self.assertEqual(list(rec._fields), ['name'])
+        self.assertEqual(rec.pick.none, b'')
+        self.assertEqual(rec._der_pack(), self.derblob)
+        self.assertEqual(str(rec), str(self.Rec(derblob=self.derblob)))
+        self.assertRaises(AttributeError, getattr, rec, 'nonesuch')
+
+    def test_lazy_class(self):
+        class LazyRec(self.Rec):
+            _lazy = True
+
+        rec = LazyRec(derblob=self.derblob)
+        self.assertEqual(rec._fields, {})
+        self.assertEqual(rec.num, b'\x2a')
+        self.assertTrue(rec.pick._lazy)
+        self.assertEqual(self.Rec(derblob=self.derblob)._fields['num'], 0)
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestRecipePlan(RecordTestCase):
+
+    def test_field_plan(self):
+        from quick_der import builder
+        (entries, byname) = builder.field_plan(self.Rec._context, self.Rec._recipe)
+        self.assertIs(builder.field_plan(self.Rec._context, self.Rec._recipe)[0], entries)
+        self.assertEqual([entry[:2] for entry in entries], [('num', 0), ('name', 1), ('pick', None)])
+        self.assertIs(byname['pick'], entries[2])
+
+    def test_offset(self):
+        bindata = [None, None, b'\x2a', b'ab', None, b'']
+        rec = self.api.build_asn1(self.Rec._context, self.Rec._recipe, bindata, 2)
+        self.assertEqual(rec._fields['num'], 2)
+        self.assertEqual(rec.name, b'ab')
+        self.assertEqual(rec.pick._fields['none'], 5)
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestSlots(RecordTestCase):
+
+    def test_slots(self):
+        rec = self.Rec(derblob=self.derblob)
+        self.assertFalse(hasattr(rec, '__dict__'))
+        self.assertFalse(hasattr(rec.pick, '__dict__'))
+        self.assertEqual(rec.pick.__class__.__name__, 'ASN1ConstructedType')
+        self.assertIs(rec.pick.__class__._recipe, self.Rec._recipe[1]['pick'])
+        self.assertRaises(AttributeError, setattr, rec, '_other', 1)
+
+    def test_specialise(self):
+        recipe = self.Rec._recipe[1]['pick']
+        first = self.api.ASN1ConstructedType(bindata=[b'', None], recipe=recipe, context=self.Rec._context)
+        second = self.api.ASN1ConstructedType(bindata=[None, b''], recipe=recipe, context=self.Rec._context)
+        self.assertIs(first.__class__, second.__class__)
+        self.assertIs(first.__class__.__bases__[0], self.api.ASN1ConstructedType)
+        lazy = self.Rec(derblob=self.derblob, lazy=True)
+        self.assertIs(lazy.__class__.__bases__[0], self.Rec)
+        self.assertIs(self.Rec(derblob=self.derblob, lazy=True).__class__, lazy.__class__)
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestFieldDescriptors(RecordTestCase):
+
+    def setUp(self):
+        super(TestFieldDescriptors, self).setUp()
+
+        class FieldRec(self.Rec):
+            __slots__ = ()
+            num = self.api.ASN1FieldIndex(0)
+            name = self.api.ASN1FieldIndex(1)
+            pick = self.api.ASN1FieldObject('pick')
+
+        self.FieldRec = FieldRec
+
+    def test_fields(self):
+        rec = self.FieldRec(derblob=self.derblob)
+        self.assertEqual(rec.num, b'\x2a')
+        self.assertEqual(rec.name, b'ab')
+        self.assertIs(rec.pick, rec._fields['pick'])
+        rec.name = b'cd'
+        self.assertEqual(rec.name, b'cd')
+
+    def test_lazy(self):
+        rec = self.FieldRec(derblob=self.derblob, lazy=True)
+        self.assertEqual(rec.pick.none, b'')
+        self.assertEqual(list(rec._fields), ['pick'])
+
+    def test_specialised(self):
+        pick = self.Rec(derblob=self.derblob).pick
+        self.assertIsInstance(pick.__class__.__dict__['none'], self.api.ASN1FieldIndex)
+        self.assertEqual(pick.none, b'')
+        self.assertIs(pick.flag, None)
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestLazySequenceOf(unittest.TestCase):
+
+    def setUp(self):
+        from quick_der import api
+        self.api = api
+        self.content = b''.join([_quickder.der_pack(b'\x02\x00', [bytes(bytearray([n]))]) for n in range(1, 11)])
+        self.recipe = ('_SEQOF', 0, packer(DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END), 1,
+                       ('_TYPTR', ['ASN1Integer'], 0))
+
+    def build(self, lazy):
+        return self.api.build_asn1({'_api': self.api}, self.recipe, [self.content], 0, lazy=lazy)
+
+    def test_lazy(self):
+        seqof = self.build(True)
+        self.assertTrue(isinstance(seqof, self.api.ASN1LazySequenceOf))
+        self.assertEqual(len(seqof), 10)
+        self.assertEqual(len(seqof._cache), 0)
+        self.assertEqual(seqof[3].get(), 4)
+        self.assertEqual(seqof[-1].get(), 10)
+        self.assertRaises(IndexError, seqof.__getitem__, 10)
+        part = seqof[2:8:2]
+        self.assertEqual([elem.get() for elem in part], [3, 5, 7])
+        self.assertEqual(part._der_format(), b''.join([elem._der_pack() for elem in part]))
+        self.assertEqual(seqof._der_pack(), self.build(False)._der_pack())
+
+    def test_cache(self):
+        seqof = self.build(True)
+        seqof._cachesize = 3
+        for elem in seqof:
+            pass
+        self.assertEqual(list(seqof._cache), [7, 8, 9])
+        self.assertTrue(seqof[8] is seqof[8])
+        self.assertEqual(list(seqof._cache), [7, 9, 8])
+        seqof._cachesize = 0
+        self.assertFalse(seqof[0] is seqof[0])
+
+    def test_changes(self):
+        seqof = self.build(True)
+        seqof._cachesize = 2
+        changed = seqof[1]
+        changed.set(42)
+        seqof[8:][0].set(43)
+        # Changed elements stay after they are dropped from the cache
+        for elem in seqof:
+            pass
+        self.assertTrue(seqof[1] is changed)
+        self.assertEqual([elem.get() for elem in seqof[1:10:7]], [42, 43])
+        eager = self.build(False)
+        eager[1].set(42)
+        eager[8].set(43)
+        self.assertFalse(seqof._der_clean())
+        self.assertEqual(seqof._der_pack(), eager._der_pack())
+        # A SET OF is written in DER order
+        self.recipe = ('_SETOF',) + self.recipe[1:]
+        setof = self.build(True)
+        setof[0].set(300)
+        self.assertEqual(setof._der_format(), self.content[3:] + b'\x02\x02\x01\x2c')
+        if sys.version_info >= (3,):
+            self.assertEqual(seqof._starts.typecode, 'Q')
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestRepack(RecordTestCase):
+
+    def test_record(self):
+        rec = self.Rec(derblob=self.derblob)
+        self.assertTrue(rec._der_clean())
+        self.assertEqual(rec._der_pack(), self.derblob)
+        rec.name = b'cd'
+        self.assertFalse(rec._der_clean())
+        self.assertEqual(rec._der_pack(), _quickder.der_pack(TestPacker.pck, [b'\x2a', b'cd', None, b'']))
+
+    def test_nested(self):
+        # Outer ::= SEQUENCE { num INTEGER, rec Rec }
+        class Outer(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(*([DER_PACK_ENTER | DER_TAG_SEQUENCE, DER_PACK_STORE | DER_TAG_INTEGER] +
+                                   list(bytearray(TestPacker.pck[:-1])) + [DER_PACK_LEAVE, DER_PACK_END]))
+            _recipe = ('_NAMED', {'num': 0, 'rec': ('_NAMED', {'num': 1, 'name': 2,
+                                                               'pick': ('_NAMED', {'flag': 3, 'none': 4})})})
+            _context = {}
+            _numcursori = 5
+
+        # The nested Rec has a length that is not in its shortest form
+        body = b'\x02\x01\x07\x30\x81' + self.derblob[1:]
+        derblob = b'\x30' + bytes(bytearray([len(body)])) + body
+        for source in [derblob, memoryview(derblob)]:
+            outer = Outer(derblob=source)
+            self.assertEqual(outer._der_pack(), derblob)
+            # Unchanged parts are written as they were found
+            outer.num = b'\x08'
+            self.assertEqual(outer._der_pack(), derblob.replace(b'\x02\x01\x07', b'\x02\x01\x08'))
+            outer.rec.name = b'cd'
+            self.assertEqual(outer._der_pack(), _quickder.der_pack(Outer._der_packer, [b'\x08', b'\x2a', b'cd', None, b'']))
+
+    def test_sequence_of(self):
+        # The first INTEGER is not in its shortest form
+        content = b'\x02\x02\x00\x05\x02\x01\x06'
+        recipe = ('_SEQOF', 0, packer(DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END), 1,
+                  ('_TYPTR', ['ASN1Integer'], 0))
+        seqof = self.api.build_asn1({'_api': self.api}, recipe, [content], 0)
+        self.assertTrue(seqof._der_clean())
+        self.assertEqual(seqof._der_format(), content)
+        self.assertEqual(seqof._der_content(), content)
+        seqof[1].set(7)
+        self.assertFalse(seqof._der_clean())
+        self.assertEqual(seqof._der_content(), b'\x02\x02\x00\x05\x02\x01\x07')
+        seqof = self.api.build_asn1({'_api': self.api}, recipe, [content], 0)
+        del seqof[0]
+        self.assertEqual(seqof._der_content(), b'\x02\x01\x06')
+
+    def test_set_of(self):
+        # The elements are not in DER order
+        content = b'\x02\x01\x06\x02\x02\x01\x00\x02\x01\x05\x02\x01\x7f'
+        recipe = ('_SETOF', 0, packer(DER_PACK_STORE | DER_TAG_INTEGER, DER_PACK_END), 1,
+                  ('_TYPTR', ['ASN1Integer'], 0))
+        setof = self.api.build_asn1({'_api': self.api}, recipe, [content], 0)
+        self.assertEqual(setof._der_content(), content)
+        setof.discard(max(setof, key=lambda elem: elem.get()))
+        self.assertEqual(setof._der_content(), b'\x02\x01\x05\x02\x01\x06\x02\x01\x7f')
+        for elem in setof:
+            elem.set(300 - elem.get())
+        self.assertEqual(setof._der_content(), b'\x02\x02\x00\xad\x02\x02\x01\x26\x02\x02\x01\x27')
+
+    def test_sequence_of_records(self):
+        # Elements without a class of their own use the element packer
+        recipe = ('_SEQOF', 0, TestPacker.pck, 4, self.Rec._recipe)
+        seqof = self.api.build_asn1({'_api': self.api}, recipe, [self.derblob * 2], 0)
+        seqof[1].name = b'cd'
+        self.assertEqual(seqof._der_content(), self.derblob + _quickder.der_pack(TestPacker.pck, [b'\x2a', b'cd', None, b'']))
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestProjection(RecordTestCase):
+
+    def test_record(self):
+        proj = self.api.der_compile_projection(self.Rec, ['name', 'pick.flag', 'num', 'pick.none'])
+        self.assertTrue(self.api.der_compile_projection(self.Rec, ['name', 'pick.flag', 'num', 'pick.none']) is proj)
+        self.assertEqual(proj(self.derblob), (b'ab', None, b'\x2a', b''))
+        self.assertEqual(proj(self.derblob, _quickder.UNPACK_OFFSET), ((7, 2), None, (4, 1), (11, 0)))
+        self.assertEqual(self.api.der_project(self.Rec, ['num'], self.derblob), (b'\x2a',))
+        other = _quickder.der_pack(TestPacker.pck, [b'\x07', None, b'\xff', None])
+        self.assertEqual(proj.columns([self.derblob, other]),
+                         ([b'ab', None], [None, b'\xff'], [b'\x2a', b'\x07'], [b'', None]))
+        self.assertEqual(proj.columns([]), ([], [], [], []))
+        self.assertRaises(ValueError, self.api.der_compile_projection, self.Rec, ['num.sub'])
+        self.assertRaises(ValueError, self.api.der_compile_projection, self.Rec, ['nothing'])
+
+    def test_choice(self):
+        # Outer ::= SEQUENCE { rec Rec }
+        class Outer(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(*([DER_PACK_ENTER | DER_TAG_SEQUENCE] + list(bytearray(TestPacker.pck[:-1])) +
+                                   [DER_PACK_LEAVE, DER_PACK_END]))
+            _recipe = ('_NAMED', {'rec': ('_TYPTR', [self.Rec], 0)})
+            _context = {}
+            _numcursori = 4
+
+        # A CHOICE gives the value of the alternative that is present
+        other = _quickder.der_pack(TestPacker.pck, [b'\x07', None, b'\xff', None])
+        self.assertEqual(self.api.der_project(self.Rec, ['pick', 'num'], self.derblob), (b'', b'\x2a'))
+        self.assertEqual(self.api.der_project(self.Rec, ['pick'], other), (b'\xff',))
+        self.assertEqual(self.api.der_project(self.Rec, ['pick'], other, _quickder.UNPACK_OFFSET), ((7, 1),))
+        derblob = _quickder.der_pack(Outer._der_packer, [b'\x07', None, b'\xff', None])
+        self.assertEqual(self.api.der_project(Outer, ['rec.pick'], derblob), (b'\xff',))
+        self.assertRaises(ValueError, self.api.der_compile_projection, Outer, ['rec'])
+
+    def test_sequence_of(self):
+        # Recs ::= SEQUENCE { num INTEGER, recs SEQUENCE OF Rec }
+        class Recs(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(DER_PACK_ENTER | DER_TAG_SEQUENCE,
+                                 DER_PACK_STORE | DER_TAG_INTEGER,
+                                 DER_PACK_STORE | DER_TAG_SEQUENCE,
+                                 DER_PACK_LEAVE,
+                                 DER_PACK_END)
+            _recipe = ('_NAMED', {'num': 0, 'recs': ('_SEQOF', 1, TestPacker.pck, 4, self.Rec._recipe)})
+            _context = {}
+            _numcursori = 2
+
+        other = _quickder.der_pack(TestPacker.pck, [b'\x07', None, b'\xff', None])
+        derblob = _quickder.der_pack(Recs._der_packer, [b'\x01', self.derblob + other])
+        proj = self.api.der_compile_projection(Recs, ['recs.num', 'num', 'recs.pick.flag', 'recs'])
+        self.assertEqual(proj(derblob), ([b'\x2a', b'\x07'], b'\x01', [None, b'\xff'], self.derblob + other))
+        (nums, num, flags, recs) = proj(derblob, _quickder.UNPACK_VIEW)
+        self.assertEqual([bytes(val) for val in nums], [b'\x2a', b'\x07'])
+        self.assertRaises(ValueError, proj, derblob, _quickder.UNPACK_OFFSET)
+        empty = _quickder.der_pack(Recs._der_packer, [b'\x01', b''])
+        self.assertEqual(proj(empty), ([], b'\x01', [], b''))
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestColumns(RecordTestCase):
+
+    def test_columns(self):
+        other = _quickder.der_pack(TestPacker.pck, [b'\xf9', None, b'\xff', None])
+        for records in ([self.derblob, other], self.derblob + other):
+            cols = self.api.DERColumns(self.Rec, records)
+            self.assertEqual(len(cols), 2)
+            self.assertEqual(list(cols.integers('num')), [42, -7])
+            self.assertEqual(list(cols.integers(2, missing=-1)), [-1, 1])
+            self.assertEqual(cols.values('name'), [b'ab', None])
+            self.assertEqual(list(cols.lengths('name')), [2, 0])
+            self.assertEqual(cols.offsets('name')[1], -1)
+            self.assertRaises(ValueError, cols.epochs, 'num')
+            self.assertRaises(ValueError, cols.cursor, 'pick')
+        self.assertEqual(list(cols.offsets('num')), [4, len(self.derblob) + 4])
+        huge = _quickder.der_pack(TestPacker.pck, [b'\x01' * 9, None, b'\x00', None])
+        self.assertRaises(OverflowError, self.api.DERColumns(self.Rec, [huge]).integers, 'num')
+
+    def test_sequence_of(self):
+        # Dates ::= SEQUENCE OF CHOICE { utcTime UTCTime, generalTime GeneralizedTime }
+        class Dates(self.api.ASN1ConstructedType):
+            __slots__ = ()
+            _der_packer = packer(DER_PACK_STORE | DER_TAG_SEQUENCE,
+                                 DER_PACK_END)
+            _recipe = ('_NAMED', {'dates': ('_SEQOF', 0, packer(DER_PACK_CHOICE_BEGIN,
+                                                                DER_PACK_STORE | DER_TAG_UTCTIME,
+                                                                DER_PACK_STORE | DER_TAG_GENERALIZEDTIME,
+                                                                DER_PACK_CHOICE_END,
+                                                                DER_PACK_END),
+                                            2, ('_NAMED', {'utc': 0, 'general': 1}))})
+            _context = {}
+            _numcursori = 1
+
+        dates = (_quickder.der_pack(bytes(bytearray([DER_TAG_UTCTIME, DER_PACK_END])), [b'700101000001Z']) +
+                 _quickder.der_pack(bytes(bytearray([DER_TAG_GENERALIZEDTIME, DER_PACK_END])), [b'20000101000000Z']))
+        cols = self.api.DERColumns(Dates, dates, 'dates')
+        self.assertEqual(list(cols.epochs('')), [1, 946684800])
+        self.assertEqual(list(cols.epochs('utc', missing=-1)), [1, -1])
+        self.assertRaises(ValueError, self.api.DERColumns, Dates, dates, 'dates.utc')
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestFormat(unittest.TestCase):
+    string_tags = {'IA5': DER_TAG_IA5STRING, 'ASCII': DER_TAG_IA5STRING, 'OCTET': DER_TAG_OCTETSTRING,
+                   'GENERALIZED': DER_TAG_GENERALSTRING, 'GENERAL': DER_TAG_GENERALSTRING,
+                   'PRINTABLE': DER_TAG_PRINTABLESTRING}
+
+    def test_prefixhead(self):
+        from quick_der import primitive
+        self.assertEqual(primitive.der_prefixhead(DER_TAG_NULL, b''), b'\x05\x00')
+        for (size, head) in [(127, b'\x04\x7f'), (128, b'\x04\x81\x80'), (255, b'\x04\x81\xff'),
+                             (256, b'\x04\x82\x01\x00'), (65536, b'\x04\x83\x01\x00\x00')]:
+            body = b'x' * size
+            derblob = primitive.der_prefixhead(DER_TAG_OCTETSTRING, body)
+            self.assertEqual(derblob, head + body)
+            self.assertEqual(_quickder.der_header(derblob), (DER_TAG_OCTETSTRING, size, len(head)))
+
+    def test_strings(self):
+        from quick_der import format
+        for (hint, tag) in self.string_tags.items():
+            for value in [u'ab', b'ab']:
+                self.assertEqual(format.der_format(value, hint), b'ab')
+                self.assertEqual(format.der_pack(value, hint), bytes(bytearray([tag, 2])) + b'ab')
+        self.assertEqual(format.der_pack(u'\u00e9', 'UTF8'), b'\x0c\x02\xc3\xa9')
+        self.assertRaises(Exception, format.der_pack, u'ab')
+        self.assertRaises(Exception, format.der_pack, b'ab')
+
+    def test_oid(self):
+        from quick_der import format
+        for value in [u'1.2.840.113549', b'1.2.840.113549']:
+            self.assertEqual(format.der_format(value, 'OID'), b'\x2a\x86\x48\x86\xf7\x0d')
+            self.assertEqual(format.der_pack(value, 'OID'), b'\x06\x06\x2a\x86\x48\x86\xf7\x0d')
+
+    def test_bytes_required(self):
+        pck = packer(DER_PACK_STORE | DER_TAG_OCTETSTRING, DER_PACK_END)
+        self.assertEqual(_quickder.der_pack(pck, [bytearray(b'ab')]), b'\x04\x02ab')
+        if sys.version_info >= (3,):
+            self.assertRaises(TypeError, _quickder.der_pack, pck, [u'ab'])
+            self.assertRaises(TypeError, _quickder.der_unpack, pck, u'\x04\x02ab', 1)
+            self.assertRaises(TypeError, _quickder.Packer, u'\x04\x00')
+
+    def test_generated_oid(self):
+        import os
+        import shutil
+        import tempfile
+        try:
+            from quick_der.main import main
+        except ImportError:
+            raise unittest.SkipTest('asn1ate is not installed')
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        with open(os.path.join(tmpdir, 'oidref.asn1'), 'w') as asn1file:
+            asn1file.write('OidRef DEFINITIONS IMPLICIT TAGS ::= BEGIN\n'
+                           'id-base OBJECT IDENTIFIER ::= { 1 3 6 1 4 1 44469 }\n'
+                           'id-leaf OBJECT IDENTIFIER ::= { id-base 666 7 }\n'
+                           'Pair ::= SEQUENCE { name IA5String, num INTEGER }\n'
+                           'END\n')
+        cwd = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            main(script_name='asn2quickder', script_args=['-l', 'python', 'oidref.asn1'])
+        finally:
+            os.chdir(cwd)
+        sys.path.insert(0, tmpdir)
+        self.addCleanup(sys.path.remove, tmpdir)
+        self.addCleanup(sys.modules.pop, 'oidref', None)
+        import oidref
+        # OID references use the dotted form of the referenced value
+        self.assertEqual(oidref.id_leaf.get(), '1.3.6.1.4.1.44469.666.7')
+        self.assertEqual(type(oidref.Pair._der_packer), bytes)
+        pair = oidref.Pair(derblob=b'\x30\x07\x16\x02ab\x02\x01\x05')
+        self.assertEqual((pair.name.get(), pair.num.get()), (b'ab', 5))
+
+
+@unittest.skipUnless(_quickder, 'the _quickder extension is not built')
+class TestPrimitive(unittest.TestCase):
+
+    def test_integer(self):
+        from quick_der import primitive
+        self.assertEqual(primitive.der_format_INTEGER(0), b'\x00')
+        self.assertEqual(primitive.der_format_INTEGER(128), b'\x00\x80')
+        self.assertEqual(primitive.der_format_INTEGER(-129), b'\xff\x7f')
+        modulus = (1 << 4095) | 12345
+        self.assertEqual(primitive.der_parse_INTEGER(primitive.der_format_INTEGER(modulus)), modulus)
+        self.assertEqual(primitive.der_parse_INTEGER(b''), 0)
+
+    def test_bitstring(self):
+        from quick_der import primitive
+        self.assertEqual(primitive.der_parse_BITSTRING(b'\x03\xa8'), 0x15)
+        self.assertEqual(primitive.der_format_BITSTRING(0x15, 5), b'\x03\xa8')
+        self.assertEqual(primitive.der_format_BITSTRING(0x80), b'\x00\x80')
+        self.assertEqual(primitive.der_parse_BITSTRING(b'\x00\x80'), 0x80)
+        self.assertRaises(ValueError, primitive.der_parse_BITSTRING, b'\x08\x00')
+        self.assertRaises(ValueError, primitive.der_format_BITSTRING, 0x15, 4)
+
+    def test_oid(self):
+        from quick_der import primitive
+        enc = primitive.der_seed_OID('1.2.840.113549.1.1.11')
+        self.assertEqual(enc, b'\x2a\x86\x48\x86\xf7\x0d\x01\x01\x0b')
+        before = primitive.der_cacheinfo_OID()
+        self.assertEqual(primitive.der_parse_OID(bytearray(enc)), '1.2.840.113549.1.1.11')
+        self.assertEqual(primitive.der_format_OID('1.2.840.113549.1.1.11'), enc)
+        after = primitive.der_cacheinfo_OID()
+        self.assertEqual(after['parse_hits'], before['parse_hits'] + 1)
+        self.assertEqual(after['format_hits'], before['format_hits'] + 1)
+
+    def test_time(self):
+        import time
+        from quick_der import format, primitive
+        self.assertEqual(primitive.der_parse_UTCTIME(b'970630123456Z'),
+                         time.strptime('970630123456Z', '%y%m%d%H%M%SZ'))
+        self.assertEqual(primitive.der_epoch_UTCTIME(b'970630123456Z'), 867674096)
+        self.assertEqual(primitive.der_epoch_UTCTIME(b'4912312359Z'), 2524607940)
+        self.assertEqual(primitive.der_epoch_UTCTIME(b'500101000000Z'), -631152000)
+        self.assertEqual(primitive.der_epoch_GENERALIZEDTIME(b'19991231235959.25+0100'), 946681199.25)
+        stamp = primitive.der_datetime_GENERALIZEDTIME(b'19991231235959.25+0100')
+        self.assertEqual((stamp.hour, stamp.second, stamp.microsecond), (22, 59, 250000))
+        self.assertEqual(primitive.der_format_GENERALIZEDTIME(stamp), b'19991231225959.25Z')
+        self.assertEqual(primitive.der_datetime_GENERALIZEDTIME(b'19991231225959.25Z'), stamp)
+        whole = stamp.replace(microsecond=0)
+        self.assertEqual(primitive.der_format_GENERALIZEDTIME(whole), b'19991231225959Z')
+        self.assertEqual(primitive.der_format_GENERALIZEDTIME(whole.timetuple()), b'19991231225959Z')
+        self.assertEqual(primitive.der_format_UTCTIME(whole), b'991231225959Z')
+        self.assertRaises(ValueError, primitive.der_format_UTCTIME, stamp)
+        self.assertEqual(format.der_format(stamp), b'19991231225959.25Z')
+        epochs = primitive.der_epochs_GENERALIZEDTIME([b'19991231235959.25+0100', b'00010101000000Z'])
+        self.assertEqual(list(epochs), [946681199, -62135596800])
+        for bad in [b'970229123456Z', b'970630243456Z', b'970630123456', b'97063012345Z']:
+            self.assertRaises(ValueError, primitive.der_epoch_UTCTIME, bad)
+            self.assertRaises(ValueError, primitive.der_epochs_UTCTIME, [bad])
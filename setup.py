@@ -45,7 +45,11 @@ extension = Extension(name='_quickder',
                           path.join(here, 'python', 'src', '_quickder.c'),
                           path.join(here, 'lib', 'der_header.c'),
                           path.join(here, 'lib', 'der_unpack.c'),
-                          path.join(here, 'lib', 'der_pack.c')],
+                          path.join(here, 'lib', 'der_pack.c'),
+                          path.join(here, 'lib', 'der_walk.c'),
+                          path.join(here, 'lib', 'der_iterate.c'),
+                          path.join(here, 'lib', 'der_skipenter.c'),
+                          path.join(here, 'lib', 'der_cmp.c')],
                       include_dirs=[path.join(here, 'include')],
                       )
 
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 
 import sys
+from binascii import hexlify
 # ../../python is (once this test is being run) the source-dir python,
 #    ../python is inside the build-directory
 sys.path = [ '../../python/testing', '../python/testing' ] + sys.path
@@ -10,7 +11,7 @@ sys.path = [ '../../python/testing', '../python/testing' ] + sys.path
 from rfc5280 import Certificate
 from quick_der.format import der_pack
 
-der_in = open (sys.argv [1]).read ()
+der_in = open (sys.argv [1], 'rb').read ()
 crt = Certificate (derblob=der_in)
 
 print('WHOLE CERT:')
@@ -20,14 +21,29 @@ print()
 der_out = der_pack (crt)
 if der_out != der_in:
 	print('DIFFERENT DER BLOBS IN AND OUT!!!')
-	print('der_in  =', der_in [:30].encode ('hex'), '...')
-	print('der_out =', der_out[:30].encode ('hex'), '...')
-	of = open ('/tmp/verisign.out', 'w')
+	print('der_in  =', hexlify (der_in [:30]), '...')
+	print('der_out =', hexlify (der_out[:30]), '...')
+	of = open ('/tmp/verisign.out', 'wb')
 	of.write (der_out)
 	of.close ()
 	print('der_out written to /tmp/verisign.out -- perhaps compare with derdump')
 	sys.exit (1)
 
+# Explicitly tagged fields are walked into, just as they are projected
+from quick_der.walk import der_walk
+from quick_der.projection import der_project
+for path in [ 'tbsCertificate.version', 'tbsCertificate.extensions' ]:
+	if der_walk (Certificate, path, der_in) != der_project (Certificate, [path], der_in) [0]:
+		print('DIFFERENT VALUES FROM der_walk() AND der_project() AT', path)
+		sys.exit (1)
+
+# A CHOICE is projected as the alternative that is present
+for (path, alternative) in [ ('tbsCertificate.issuer', 'tbsCertificate.issuer.rdnSequence'),
+				('tbsCertificate.validity.notAfter', 'tbsCertificate.validity.notAfter.utcTime') ]:
+	if der_project (Certificate, [path], der_in) [0] != der_walk (Certificate, alternative, der_in):
+		print('DIFFERENT VALUES FROM der_project() AT', path, 'AND der_walk() AT', alternative)
+		sys.exit (1)
+
 print('TBSCERTIFICATE:')
 print('type is' + str (type (crt.tbsCertificate)))
 print()
@@ -23,7 +23,7 @@ def hexily(s):
     everywhere. This avoids some cases like 0xa1 failing on US-ASCII
     output.
     """
-    return "".join([hexily_d(ord(x)) for x in f_v])
+    return "".join([hexily_d(x) for x in bytearray(s)])
 
 # Names of types, which have corresponding der_pack_<name> functions
 # in the Quick-DER API.
@@ -59,9 +59,9 @@ for typename, value in (
 	(BIT, 0),
 	(BIT, 4194304),
 	(BIT, 3802951800684688204490109616128),
-	(STR, "cow"),
-	(STR, ""),
-	(STR, chr(0) + "cow"),
+	(STR, b"cow"),
+	(STR, b""),
+	(STR, b"\x00cow"),
 	(STR, None),  # TODO: is a non-string distinguishable from an empty one?
 	# (OID, "1"),  # Invalid
 	(OID, "1.2"),
@@ -0,0 +1,62 @@
+/* Test der_cmp() on the octet string order that DER prescribes
+ * for the elements of a SET OF.
+ */
+
+
+#include <stdlib.h>
+#include <stdio.h>
+
+
+#include <arpa2/quick-der.h>
+
+
+/* climbers[] represents (derptr,derlen) pairs in what should be
+ * monotonically climbing order.  Every possible pair is compared,
+ * even in both directions.  The position in the list is used to
+ * decide what would be the proper order.
+ */
+
+#define NUM_CLIMBERS 11
+dercursor climbers [NUM_CLIMBERS] = {
+	{ "", 0 },
+	{ "\x00", 1 },
+	{ "\x00\x00", 2 },
+	{ "\x00\xff", 2 },
+	{ "\x02\x01", 2 },
+	{ "\x02\x01\x05", 3 },
+	{ "\x02\x01\x06", 3 },
+	{ "\x02\x01\x85", 3 },
+	{ "\x02\x02\x00\x80", 4 },
+	{ "\x7f", 1 },
+	{ "\xff", 1 },
+};
+
+
+int sign (int a) {
+	if (a < 0) {
+		return -1;
+	} else if (a > 0) {
+		return +1;
+	} else {
+		return 0;
+	}
+}
+
+
+int main (int argc, char *argv []) {
+	int exitval = 0;
+	int i, j;
+
+	for (i=0; i < NUM_CLIMBERS; i++) {
+		for (j=0; j < NUM_CLIMBERS; j++) {
+			int soll = sign (i - j);
+			int ist  = sign (der_cmp (climbers [i], climbers [j]));
+			if (ist != soll) {
+				fprintf (stderr, "Unexpected comparison result %d (expected %d) between #%d and #%d\n", ist, soll, i, j);
+				exitval = 1;
+			}
+		}
+	}
+
+	exit (exitval);
+}
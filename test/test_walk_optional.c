@@ -0,0 +1,86 @@
+/* Test der_walk() past OPTIONAL elements that are absent.
+ *
+ * An OPTIONAL path element that does not match the data means that the
+ * element is absent, so the data belongs to the path element after it.
+ * Older versions of der_walk() skipped that data along with the OPTIONAL
+ * path element, so that a following field was only found when the
+ * OPTIONAL element was present.  Without it, the walk ran out of data
+ * and returned the remaining path length instead of the field.
+ */
+
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <errno.h>
+
+
+#include <arpa2/quick-der.h>
+
+
+/* SEQUENCE { flag [0] BOOLEAN OPTIONAL, num INTEGER } */
+uint8_t with_flag [] = { 0x30, 0x08, 0xa0, 0x03, 0x01, 0x01, 0xff, 0x02, 0x01, 0x05 };
+uint8_t without_flag [] = { 0x30, 0x03, 0x02, 0x01, 0x05 };
+
+/* The path to num, skipping the optional flag */
+derwalk path_num [] = {
+	DER_WALK_ENTER | DER_TAG_SEQUENCE,
+	DER_WALK_OPTIONAL,
+	DER_WALK_SKIP  | DER_TAG_CONTEXT (0),
+	DER_WALK_ENTER | DER_TAG_INTEGER,
+	DER_WALK_END
+};
+
+/* The path to a num of the wrong type */
+derwalk path_wrong [] = {
+	DER_WALK_ENTER | DER_TAG_SEQUENCE,
+	DER_WALK_OPTIONAL,
+	DER_WALK_SKIP  | DER_TAG_CONTEXT (0),
+	DER_WALK_ENTER | DER_TAG_OCTETSTRING,
+	DER_WALK_END
+};
+
+/* The path to num, with the flag as an unknown CHOICE */
+derwalk path_choice [] = {
+	DER_WALK_ENTER | DER_TAG_SEQUENCE,
+	DER_WALK_CHOICE,
+	DER_WALK_ENTER | DER_TAG_INTEGER,
+	DER_WALK_END
+};
+
+
+int walk (char *name, uint8_t *der, size_t derlen, derwalk *path, int soll) {
+	dercursor crs;
+	int ist;
+	crs.derptr = der;
+	crs.derlen = derlen;
+	ist = der_walk (&crs, path);
+	if (ist != soll) {
+		fprintf (stderr, "%s: der_walk() returned %d (expected %d)\n", name, ist, soll);
+		return 1;
+	}
+	if ((soll == 0) && ((crs.derlen != 1) || (*crs.derptr != 0x05))) {
+		fprintf (stderr, "%s: der_walk() did not find num\n", name);
+		return 1;
+	}
+	if ((soll == -1) && (errno != EBADMSG)) {
+		fprintf (stderr, "%s: der_walk() failed with errno %d (expected EBADMSG)\n", name, errno);
+		return 1;
+	}
+	return 0;
+}
+
+
+int main (int argc, char *argv []) {
+	int exitval = 0;
+
+	// The OPTIONAL element is present and skipped
+	exitval |= walk ("with flag", with_flag, sizeof (with_flag), path_num, 0);
+	// The OPTIONAL element is absent; this returned 1 in the old code
+	exitval |= walk ("without flag", without_flag, sizeof (without_flag), path_num, 0);
+	// A field of the wrong type is an error; this returned 1 in the old code
+	exitval |= walk ("wrong type", without_flag, sizeof (without_flag), path_wrong, -1);
+	// An unknown CHOICE is still skipped without looking at it
+	exitval |= walk ("choice", with_flag, sizeof (with_flag), path_choice, 0);
+
+	exit (exitval);
+}